@@ -1,13 +1,26 @@
 from pathlib import Path
+import asyncio
+import json
 import traceback
 
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
 
-from backend_logic.main_runner import run_analysis_for_city
+# .env は各モジュールが環境変数を読む前に一度だけ読み込む
+from backend_logic.settings import get_settings
+settings = get_settings()
+
+from backend_logic.result_cache import analyze_city, result_cache_stats
+from backend_logic import metrics
+from backend_logic.findings_store import findings_store
+from backend_logic.fetcher import fetcher
+from backend_logic.boilerplate import site_chrome
+from backend_logic.ai_filter import verdict_cache_stats
+from backend_logic.jobs import job_manager, QueueFullError
+from backend_logic.batch import run_batch, batch_id_for, load_checkpoint, load_city_result
 
 # 固定パス (app.py と同じディレクトリを基準に絶対パス化)
 ROOT_DIR = Path(__file__).resolve().parent          # /app
@@ -29,6 +42,13 @@ templates = Jinja2Templates(directory=templates_dir)
 
 class AnalysisRequest(BaseModel):
     city: str
+    force_refresh: bool = False
+
+class BatchRequest(BaseModel):
+    cities: list[str]
+    batch_id: str | None = None
+    city_workers: int | None = None
+    force_refresh: bool = False
 
 @app.get("/", response_class=HTMLResponse)
 def read_root(request: Request):
@@ -76,14 +96,14 @@ def read_root(request: Request):
 def run_analysis_post(req: AnalysisRequest):
     try:
         print(f"🏙️ [POST] Processing request for city: {req.city}")
-        return run_analysis_for_city(city=req.city)
+        return analyze_city(city=req.city, force_refresh=req.force_refresh)
     except Exception as e:
         print(traceback.format_exc())  
         raise HTTPException(status_code=500, detail=str(e))
 
 # 🔧 添加 GET 路由以处理意外的 GET 请求
 @app.get("/api/run-analysis")
-def run_analysis_get(city: str = None):
+def run_analysis_get(city: str = None, force_refresh: bool = False):
     try:
         if not city:
             return JSONResponse(
@@ -95,11 +115,133 @@ def run_analysis_get(city: str = None):
                 }
             )
         print(f"🏙️ [GET] Processing request for city: {city}")
-        return run_analysis_for_city(city=city)
+        return analyze_city(city=city, force_refresh=force_refresh)
     except Exception as e:
         print(traceback.format_exc())  
         raise HTTPException(status_code=500, detail=str(e))
 
+# 🔧 后台任务 API：提交后立即返回 job_id，通过轮询或 SSE 获取进度与结果
+def _get_job_or_404(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="指定されたジョブが見つかりません。")
+    return job
+
+@app.post("/api/jobs", status_code=202)
+def submit_job(req: AnalysisRequest):
+    try:
+        job = job_manager.submit("analysis", analyze_city,
+                                 {"city": req.city, "force_refresh": req.force_refresh})
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    print(f"🏙️ [JOB {job.id}] Queued analysis for city: {req.city}")
+    return {"job_id": job.id, "status": job.status}
+
+@app.get("/api/jobs/{job_id}")
+def job_status(job_id: str):
+    return _get_job_or_404(job_id).to_dict()
+
+@app.get("/api/jobs/{job_id}/result")
+def job_result(job_id: str):
+    job = _get_job_or_404(job_id)
+    if job.status == "error":
+        raise HTTPException(status_code=500, detail=job.error)
+    if not job.finished:
+        return JSONResponse(status_code=202, content=job.to_dict())
+    return job.result
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    job = _get_job_or_404(job_id)
+
+    async def stream():
+        seq = 0
+        idle = 0.0
+        while True:
+            for ev in job.events_since(seq):
+                seq = ev["seq"] + 1
+                idle = 0.0
+                yield f"id: {ev['seq']}\nevent: {ev['event']}\ndata: {json.dumps(ev['data'], ensure_ascii=False)}\n\n"
+            if job.finished and seq >= len(job.events):
+                break
+            # 轮询新事件（不占用线程）；空闲时定期发送心跳，防止代理断开连接
+            await asyncio.sleep(0.5)
+            idle += 0.5
+            if idle >= 15:
+                idle = 0.0
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# 🔧 批量任务：多个城市共用一个调度器，结果按城市写入文件，可用相同的 batch_id 续跑
+@app.post("/api/batches", status_code=202)
+def submit_batch(req: BatchRequest):
+    cities = list(dict.fromkeys(c.strip() for c in req.cities if c.strip()))
+    if not cities:
+        raise HTTPException(status_code=400, detail="都市のリストが空です。")
+    batch_id = req.batch_id or batch_id_for(cities)
+    params = {"cities": cities, "batch_id": batch_id, "force_refresh": req.force_refresh}
+    if req.city_workers:
+        params["city_workers"] = req.city_workers
+    try:
+        load_checkpoint(batch_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        job = job_manager.submit("batch", run_batch, params)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    print(f"🗂️ [JOB {job.id}] Queued batch {batch_id} for {len(cities)} cities")
+    return {"job_id": job.id, "batch_id": batch_id, "status": job.status}
+
+@app.get("/api/batches/{batch_id}")
+def batch_status(batch_id: str):
+    try:
+        checkpoint = load_checkpoint(batch_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if checkpoint is None:
+        raise HTTPException(status_code=404, detail="指定されたバッチが見つかりません。")
+    return checkpoint
+
+@app.get("/api/batches/{batch_id}/results/{city}")
+def batch_city_result(batch_id: str, city: str):
+    try:
+        result = load_city_result(batch_id, city)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if result is None:
+        raise HTTPException(status_code=404, detail="この都市の結果はまだありません。")
+    return result
+
+# 🔧 抽出結果ストアの検索（再実行せずに都市横断で問い合わせ、出典 URL / PDF 付き）
+@app.get("/api/findings")
+def list_findings(city: str = None, zone: str = None, regulation_type: str = None, source: str = None,
+                  limit: int = 100, offset: int = 0):
+    limit = max(1, min(limit, 1000))
+    findings = findings_store.query(city=city, zone=zone, regulation_type=regulation_type, source=source,
+                                    limit=limit, offset=max(0, offset))
+    return {"count": len(findings), "limit": limit, "offset": offset, "findings": findings}
+
+@app.get("/api/findings/compare")
+def compare_findings(regulation_type: str, zone: str = None):
+    by_city = findings_store.compare(regulation_type, zone=zone)
+    return {"regulation_type": regulation_type, "zone": zone, "city_count": len(by_city), "cities": by_city}
+
+@app.get("/api/cities")
+def list_cities():
+    return {"cities": findings_store.cities()}
+
+@app.get("/api/cities/{city}/documents")
+def city_documents(city: str):
+    return {"city": city, "documents": findings_store.documents(city)}
+
+# 🔧 Prometheus 形式の指標（各段階・外部呼び出しの所要時間、ダウンロード量、キャッシュ、トークン数）
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # 🔧 添加调试路由
 @app.get("/debug/status")
 def debug_status():
@@ -107,7 +249,26 @@ def debug_status():
         "status": "API is running", 
         "endpoints": {
             "POST /api/run-analysis": "正常方式（推奨）",
-            "GET /api/run-analysis?city=xxx": "緊急対応用"
+            "GET /api/run-analysis?city=xxx": "緊急対応用",
+            "POST /api/jobs": "バックグラウンドジョブ投入（job_id を返す）",
+            "GET /api/jobs/{job_id}": "ジョブ状態",
+            "GET /api/jobs/{job_id}/events": "進捗ストリーム (SSE)",
+            "GET /api/jobs/{job_id}/result": "最終結果",
+            "POST /api/batches": "複数都市のバッチ投入（job_id と batch_id を返す）",
+            "GET /api/batches/{batch_id}": "バッチの進捗（チェックポイント）",
+            "GET /api/batches/{batch_id}/results/{city}": "都市ごとの結果",
+            "GET /api/findings?city=&zone=&regulation_type=&source=": "抽出結果の検索（出典付き）",
+            "GET /api/findings/compare?regulation_type=&zone=": "規制値の都市間比較",
+            "GET /api/cities": "保存済みの都市一覧",
+            "GET /api/cities/{city}/documents": "都市ごとの関連文書",
+            "GET /metrics": "Prometheus 形式の指標"
         },
-        "version": "improved_filter_v1"
+        "version": "improved_filter_v1",
+        "settings": settings.to_dict(),
+        "verdict_cache": verdict_cache_stats(),
+        "result_cache": result_cache_stats(),
+        "findings_store": findings_store.stats(),
+        "fetch_store": fetcher.stats(),
+        "site_chrome": site_chrome.stats(),
+        "jobs": job_manager.stats()
     }
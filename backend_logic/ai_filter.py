@@ -1,7 +1,17 @@
-import tldextract
-import httpx
+import os
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
 import urllib3
-from openai import OpenAI
+from urllib.parse import urlsplit, urlunsplit
+
+from . import metrics
+from .disk_cache import DiskCache, CACHE_DIR
+from .domains import same_registered_domain
+from .openai_client import get_client
+from .rate_limit import openai_limiter
+from .tokens import count_tokens
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -27,53 +37,175 @@ _SYS = (
     "❌ サイトポリシー・プライバシー（policy、privacy）\n\n"
     
     "迷った場合は、建築・都市計画に少しでも関連がありそうなら『はい』と判定してください。\n"
-    "具体的な数値規制を含む資料なら『はい』、明らかに上記除外項目なら『いいえ』とだけ返答してください。"
+    "具体的な数値規制を含む資料なら『はい』、明らかに上記除外項目なら『いいえ』と判定してください。"
 )
 
+# 批量判定时追加的输出格式说明（逐条给出判定结果）
+_BATCH_INSTRUCTION = (
+    "以下に番号付きのURLが複数あります。各URLについて上記の判定基準で個別に判定し、"
+    "番号(index)ごとに relevant を true（はい）または false（いいえ）で返してください。"
+)
+
+_VERDICT_SCHEMA = {
+    "name": "link_verdicts",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "verdicts": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "index": {"type": "integer"},
+                        "relevant": {"type": "boolean"},
+                    },
+                    "required": ["index", "relevant"],
+                    "additionalProperties": False,
+                },
+            }
+        },
+        "required": ["verdicts"],
+        "additionalProperties": False,
+    },
+}
+
+# 明确排除的关键词
+EXCLUSION_PATTERNS = [
+    'kosodate', 'yoyaku', 'reservation', 'enquete', 'event',
+    'kanko', 'sports', 'bunka', 'form.php', 'search.php',
+    'line', 'twitter', 'facebook', 'policy', 'privacy'
+]
+
+DEFAULT_MODEL = "gpt-4o-mini"
+DEFAULT_BATCH_SIZE = 20
+DEFAULT_MAX_WORKERS = 4
+
+# 判定结果缓存：键为 (city, 规范化 URL, model, 提示词哈希)，修改提示词后旧结果自动失效
+VERDICT_CACHE_TTL = float(os.getenv("VERDICT_CACHE_TTL", 30 * 24 * 3600))
+VERDICT_CACHE_MAX = int(os.getenv("VERDICT_CACHE_MAX", 50000))
+PROMPT_HASH = hashlib.sha256(
+    (_SYS + _BATCH_INSTRUCTION + json.dumps(_VERDICT_SCHEMA, sort_keys=True)).encode("utf-8")
+).hexdigest()[:16]
+
+verdict_cache = DiskCache(CACHE_DIR / "verdicts.sqlite3", table="verdicts",
+                          ttl=VERDICT_CACHE_TTL, max_entries=VERDICT_CACHE_MAX)
+
 def _same_reg_domain(url, base):
-    return tldextract.extract(url).registered_domain == tldextract.extract(base).registered_domain
+    return same_registered_domain(url, base)
 
-def is_link_relevant(url: str, city: str, base_domain: str, key: str) -> bool:
+
+def _quick_reject(url: str, base_domain: str) -> bool:
+    """不需要调用 GPT 就能判定为无关的 URL 返回 True。"""
     if not _same_reg_domain(url, base_domain):
-        return False
-    
+        return True
+
     # 🔧 快速排除明显不相关的URL模式
     url_lower = url.lower()
-    
-    # 明确排除的关键词
-    exclusion_patterns = [
-        'kosodate', 'yoyaku', 'reservation', 'enquete', 'event', 
-        'kanko', 'sports', 'bunka', 'form.php', 'search.php',
-        'line', 'twitter', 'facebook', 'policy', 'privacy'
-    ]
-    
-    if any(pattern in url_lower for pattern in exclusion_patterns):
+
+    if any(pattern in url_lower for pattern in EXCLUSION_PATTERNS):
         print(f"⚡ [Quick Filter] 除外: {url}")
-        return False
-    
+        return True
+
     # 排除純数字カテゴリページ（如 category/14-15-0-0-0-0-0-0-0-0.html）
     if 'category/' in url_lower and url_lower.count('-') > 5:
         print(f"⚡ [Quick Filter] カテゴリ除外: {url}")
-        return False
-    
+        return True
+
+    return False
+
+
+def _normalize_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = parts.netloc.lower()
+    if (scheme, host[-3:]) == ("http", ":80") or (scheme, host[-4:]) == ("https", ":443"):
+        host = host.rsplit(":", 1)[0]
+    path = parts.path or "/"
+    return urlunsplit((scheme, host, path, parts.query, ""))
+
+
+def _cache_key(url: str, city: str, model: str) -> str:
+    raw = json.dumps([city, _normalize_url(url), model, PROMPT_HASH], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def verdict_cache_stats() -> dict:
+    return verdict_cache.stats()
+
+
+def _classify_batch(urls: list, city: str, key: str, model: str) -> dict:
+    """一次请求判定多条 URL，返回 {url: bool}。失败时整批判定为 False（不写入缓存）。"""
+    listing = "\n".join(f"{i}. {u}" for i, u in enumerate(urls))
+    messages = [
+        {"role": "system", "content": _SYS},
+        {"role": "user", "content": f"{_BATCH_INSTRUCTION}\n\n市: {city}\n{listing}"}
+    ]
+    # 每条判定约 12 个输出 token，留出余量作为 max_tokens；按 输入 + max_tokens 预约，响应后按实际用量结算
+    max_tokens = 20 * len(urls) + 50
+    reserved = count_tokens(_SYS + messages[1]["content"], model) + max_tokens
+    openai_limiter.acquire(reserved)
+    rsp = None
     try:
-        cli = OpenAI(api_key=key, http_client=httpx.Client(verify=False))
-        rsp = cli.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": _SYS},
-                {"role": "user", "content": f"市: {city}\nURL: {url}"}
-            ]
-            # 🔧 去掉 temperature 参数，使用默认值
-        )
-        result = "はい" in rsp.choices[0].message.content.strip()
-        
-        # 调试输出
-        if result:
-            print(f"🤖 [AI判定] 関連と判定: {url}")
-        
-        return result
-        
+        with metrics.span("openai"):
+            rsp = get_client(key).chat.completions.create(
+                model=model,
+                messages=messages,
+                response_format={"type": "json_schema", "json_schema": _VERDICT_SCHEMA},
+                max_tokens=max_tokens,
+            )
+        metrics.record_usage(rsp, model)
+        data = json.loads(rsp.choices[0].message.content)
     except Exception as e:
-        print(f"GPT filter error for {url}: {e}")
-        return False
+        print(f"GPT filter error for batch of {len(urls)} URLs: {e}")
+        return {u: False for u in urls}
+    finally:
+        openai_limiter.settle(reserved, rsp)
+
+    result = {u: False for u in urls}
+    answered = {}
+    for v in data.get("verdicts", []):
+        idx = v.get("index")
+        if isinstance(idx, int) and 0 <= idx < len(urls):
+            result[urls[idx]] = answered[urls[idx]] = bool(v.get("relevant"))
+
+    for u in urls:
+        if result[u]:
+            print(f"🤖 [AI判定] 関連と判定: {u}")
+    # 只缓存模型明确给出判定的 URL
+    verdict_cache.set_many({_cache_key(u, city, model): v for u, v in answered.items()})
+    return result
+
+
+def classify_links(urls: list, city: str, base_domain: str, key: str,
+                   model: str = DEFAULT_MODEL, batch_size: int = DEFAULT_BATCH_SIZE,
+                   max_workers: int = DEFAULT_MAX_WORKERS) -> dict:
+    """
+    批量判定 URL 是否与建筑规制相关，返回 {url: bool}。
+    先做快速过滤和缓存查找，剩余 URL 按 batch_size 打包成一次结构化输出请求，多个批次并行发送。
+    """
+    verdicts = {}
+    pending = []
+    for url in dict.fromkeys(urls):
+        if _quick_reject(url, base_domain):
+            verdicts[url] = False
+            continue
+        cached = verdict_cache.get(_cache_key(url, city, model))
+        if cached is None:
+            pending.append(url)
+        else:
+            verdicts[url] = cached
+
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+    if len(batches) == 1:
+        verdicts.update(_classify_batch(batches[0], city, key, model))
+    elif batches:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as pool:
+            futures = [metrics.submit(pool, _classify_batch, b, city, key, model) for b in batches]
+            for future in futures:
+                verdicts.update(future.result())
+    return verdicts
+
+
+def is_link_relevant(url: str, city: str, base_domain: str, key: str) -> bool:
+    return classify_links([url], city, base_domain, key).get(url, False)
@@ -0,0 +1,220 @@
+"""
+多城市批量模式：一次处理一个县内的所有市町村。
+
+- 所有城市共用一个调度器：城市级线程池 + 进程内共享的 OpenAI / Serper 限流器（rate_limit），
+  爬取时各城市共用同一个按主机的最小请求间隔，下载共用 download_limiter
+- 每个城市完成后立即写出结果文件 <out>/<batch_id>/<city>.json
+- checkpoint.json 记录各城市的状态，崩溃后用相同的 batch_id 重新运行会跳过已完成的城市
+- 经由 result_cache：缓存期内已分析过的城市直接使用缓存结果（force_refresh 时重新执行）
+
+命令行：
+    python -m backend_logic.batch 愛知県名古屋市 愛知県あま市 ...
+    python -m backend_logic.batch --file aichi.txt --workers 3
+"""
+
+from __future__ import annotations
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+# .env 在各模块于 import 时读取环境变量之前加载一次（与 app.py 相同）；命令行运行时也生效
+from .settings import get_settings
+get_settings()
+
+from .result_cache import analyze_city
+from .jobs import emit_progress
+from .rate_limit import HostLimiter
+from .link_crawler import DEFAULT_PER_HOST
+
+BATCH_DIR = Path(os.getenv("BATCH_DIR", "batch_results"))
+BATCH_CITY_WORKERS = int(os.getenv("BATCH_CITY_WORKERS", 3))
+# 批量爬取时同一主机两次请求的最小间隔（秒），所有城市共享
+BATCH_CRAWL_MIN_INTERVAL = float(os.getenv("BATCH_CRAWL_MIN_INTERVAL", 0.25))
+
+_BATCH_ID_RE = re.compile(r"^[\w-]{1,64}$")
+_UNSAFE_FILENAME_RE = re.compile(r'[\\/:*?"<>|\s]+')
+
+_running = set()
+_running_lock = threading.Lock()
+
+
+class BatchRunningError(RuntimeError):
+    pass
+
+
+def batch_id_for(cities: list) -> str:
+    """同一份城市列表得到同一个 batch_id，重新运行即可续跑。"""
+    return hashlib.sha256("\n".join(cities).encode("utf-8")).hexdigest()[:12]
+
+
+def batch_path(batch_id: str, out_dir: Path = BATCH_DIR) -> Path:
+    if not _BATCH_ID_RE.match(batch_id):
+        raise ValueError(f"invalid batch_id: {batch_id!r}")
+    return Path(out_dir) / batch_id
+
+
+def result_filename(city: str) -> str:
+    return _UNSAFE_FILENAME_RE.sub("_", city).strip("._") or "city"
+
+
+def _write_json(path: Path, data) -> None:
+    """先写临时文件再 rename，进程中途退出也不会留下写了一半的文件。"""
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def load_checkpoint(batch_id: str, out_dir: Path = BATCH_DIR) -> dict | None:
+    path = batch_path(batch_id, out_dir) / "checkpoint.json"
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def load_city_result(batch_id: str, city: str, out_dir: Path = BATCH_DIR) -> dict | None:
+    entry = ((load_checkpoint(batch_id, out_dir) or {}).get("cities") or {}).get(city) or {}
+    if entry.get("status") != "done":
+        return None
+    path = batch_path(batch_id, out_dir) / entry["file"]
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def run_batch(cities: list, batch_id: str | None = None, out_dir: Path = BATCH_DIR,
+              city_workers: int = BATCH_CITY_WORKERS, crawl_min_interval: float = BATCH_CRAWL_MIN_INTERVAL,
+              force_refresh: bool = False, progress=None) -> dict:
+    """
+    并发处理多个城市，返回 checkpoint 的内容。
+    progress(event, **data) 可选：batch_started / city_started / city_done / city_error，
+    以及各城市流水线内部的事件（附带 city 字段，不转发高频的 crawl 事件）。
+    """
+    cities = list(dict.fromkeys(c.strip() for c in cities if c and c.strip()))
+    if not cities:
+        raise ValueError("都市のリストが空です。")
+    batch_id = batch_id or batch_id_for(cities)
+    directory = batch_path(batch_id, out_dir)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    with _running_lock:
+        if batch_id in _running:
+            raise BatchRunningError(f"バッチ {batch_id} は既に実行中です。")
+        _running.add(batch_id)
+
+    try:
+        checkpoint = load_checkpoint(batch_id, out_dir) or {
+            "batch_id": batch_id,
+            "created_at": time.time(),
+            "cities": {},
+        }
+        for city in cities:
+            checkpoint["cities"].setdefault(city, {"status": "pending"})
+        # 续跑：结果文件存在的已完成城市跳过，失败或中断的城市重新执行
+        todo = [
+            c for c in cities
+            if not (checkpoint["cities"][c]["status"] == "done"
+                    and (directory / checkpoint["cities"][c].get("file", "")).is_file())
+        ]
+        lock = threading.Lock()
+
+        def save() -> None:
+            checkpoint["updated_at"] = time.time()
+            _write_json(directory / "checkpoint.json", checkpoint)
+
+        with lock:
+            save()
+        print(f"🗂️ [Batch {batch_id}] {len(cities)} cities, {len(cities) - len(todo)} already done, "
+              f"{len(todo)} to run")
+        emit_progress(progress, "batch_started", batch_id=batch_id, total=len(cities), todo=len(todo))
+
+        # 所有城市的爬取共用同一个按主机的请求间隔（不同城市的种子常落在同一个县的网站上）
+        politeness = HostLimiter(per_host=DEFAULT_PER_HOST, min_interval=crawl_min_interval)
+
+        def run_city(city: str) -> dict:
+            with lock:
+                checkpoint["cities"][city] = {"status": "running", "started_at": time.time()}
+                save()
+            emit_progress(progress, "city_started", city=city)
+
+            def city_progress(event, **data):
+                if event != "crawl":
+                    emit_progress(progress, event, city=city, **data)
+
+            return analyze_city(city, force_refresh=force_refresh, progress=city_progress, politeness=politeness)
+
+        with ThreadPoolExecutor(max_workers=max(1, city_workers), thread_name_prefix="batch") as pool:
+            futures = {pool.submit(run_city, city): city for city in todo}
+            for future in as_completed(futures):
+                city = futures[future]
+                entry = dict(checkpoint["cities"][city], finished_at=time.time())
+                try:
+                    result = future.result()
+                    error = result.get("error")
+                except Exception as e:
+                    result, error = None, str(e)
+                if error is not None:
+                    # 异常或检索失败等错误结果（不会被缓存）：记为失败，续跑时重新执行
+                    print(f"❌ [Batch {batch_id}] {city}: {error}")
+                    entry.update(status="error", error=error)
+                    emit_progress(progress, "city_error", city=city, error=error)
+                else:
+                    filename = f"{result_filename(city)}.json"
+                    _write_json(directory / filename, {"city": city, **result})
+                    entry.update(status="done", file=filename, summary=result.get("summary"),
+                                 statistics=result.get("statistics"))
+                    print(f"✅ [Batch {batch_id}] {city} → {directory / filename}")
+                    emit_progress(progress, "city_done", city=city, file=filename)
+                with lock:
+                    checkpoint["cities"][city] = entry
+                    save()
+
+        counts = {}
+        for entry in checkpoint["cities"].values():
+            counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+        checkpoint["counts"] = counts
+        with lock:
+            save()
+        return checkpoint
+    finally:
+        with _running_lock:
+            _running.discard(batch_id)
+
+
+def _read_city_file(path: str) -> list:
+    lines = Path(path).read_text(encoding="utf-8").splitlines()
+    return [line.strip() for line in lines if line.strip() and not line.lstrip().startswith("#")]
+
+
+def main(argv: list | None = None) -> int:
+    ap = argparse.ArgumentParser(description="複数の市区町村をまとめて解析する")
+    ap.add_argument("cities", nargs="*", help="都市名（例: 愛知県あま市）")
+    ap.add_argument("--file", help="1 行に 1 都市のリストファイル（# で始まる行は無視）")
+    ap.add_argument("--batch-id", help="続きから再開するバッチ ID（省略時は都市リストから決まる）")
+    ap.add_argument("--out", default=str(BATCH_DIR), help="結果の出力ディレクトリ")
+    ap.add_argument("--workers", type=int, default=BATCH_CITY_WORKERS, help="同時に処理する都市数")
+    ap.add_argument("--crawl-interval", type=float, default=BATCH_CRAWL_MIN_INTERVAL,
+                    help="同一ホストへのクロール間隔（秒）")
+    ap.add_argument("--force-refresh", action="store_true", help="キャッシュ済みの結果を使わずに再解析する")
+    args = ap.parse_args(argv)
+
+    cities = list(args.cities)
+    if args.file:
+        cities += _read_city_file(args.file)
+    if not cities:
+        ap.error("都市を指定してください。")
+
+    checkpoint = run_batch(cities, batch_id=args.batch_id, out_dir=Path(args.out), city_workers=args.workers,
+                           crawl_min_interval=args.crawl_interval, force_refresh=args.force_refresh)
+    print(f"🏁 [Batch {checkpoint['batch_id']}] {checkpoint['counts']}")
+    return 0 if checkpoint["counts"].get("error", 0) == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,302 @@
+"""
+送给 LLM 之前去掉页面的站点公共部分（导航、页眉页脚、面包屑、侧栏）。
+
+- extract_page()：一次扫描把 HTML 分成块（标题 / 段落 / 表格 / 列表项），
+  <nav> <header> <footer> <aside> 以及 id / class 像菜单、面包屑的元素整体跳过；
+  有 <main> / <article> / id="main" 等正文区域时只保留其中的块。表格按行输出为 "| a | b |"
+- SiteChrome：按主机统计各块（和各链接）出现在多少个页面上，超过 CHROME_MIN_RATIO 的视为站点公共部分。
+  main_runner 在判定前用爬虫已抓取的页面学习，summarizer 抽取时去掉这些块
+- 链接按 URL 去重，公共链接和指向自身的链接不再列出
+"""
+
+from __future__ import annotations
+import os
+import re
+import hashlib
+import threading
+import html as html_lib
+from typing import NamedTuple
+from urllib.parse import urlparse
+
+from .link_extract import _TOKEN_RE, _HREF_RE, _RAW_TEXT_END, normalize_link, parse_page
+
+BOILERPLATE_ENABLED = os.getenv("BOILERPLATE_ENABLED", "1") == "1"
+# 同一主机下至少在这么多个页面、且在已观察页面的这个比例以上出现的块视为公共部分
+CHROME_MIN_PAGES = int(os.getenv("CHROME_MIN_PAGES", 3))
+CHROME_MIN_RATIO = float(os.getenv("CHROME_MIN_RATIO", 0.5))
+# 每个主机学习的页面数上限 / 保留的主机数上限
+CHROME_MAX_PAGES = int(os.getenv("CHROME_MAX_PAGES", 500))
+CHROME_MAX_HOSTS = int(os.getenv("CHROME_MAX_HOSTS", 256))
+
+_CHROME_TAGS = {"nav", "header", "footer", "aside", "noscript", "form", "button", "select"}
+_CHROME_HINT_RE = re.compile(
+    r"(?:^|[\s_-])(?:g?nav\w*|s?menu\w*|breadcrumbs?|pankuzu|topicpath|footer|header|side\w*|"
+    r"skip\w*|banner|sns|share|pagetop|lnav|rnav|localnav|globalnav)(?:$|[\s_-])", re.I)
+_MAIN_HINT_RE = re.compile(r"^(?:main|contents?|main[_-]?contents?|tmp_contents|article|honbun)$", re.I)
+_ATTR_RE = re.compile(r"""(?:^|\s)(id|class|role)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))""", re.I)
+_VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param",
+              "source", "track", "wbr"}
+_BLOCK_TAGS = {"p", "div", "li", "ul", "ol", "dl", "dd", "dt", "section", "article", "main", "br",
+               "pre", "blockquote", "caption", "figure", "figcaption", "h1", "h2", "h3", "h4", "h5", "h6",
+               "table", "tr", "hr", "body"}
+_HEADINGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+_SPACE_RE = re.compile(r"\s+")
+
+
+class Block(NamedTuple):
+    kind: str              # "heading" | "table" | "text"
+    text: str              # 已输出格式（标题带 "#"，表格为 "| a | b |" 行）
+    links: tuple           # 块内的 (url, anchor_text)
+    in_main: bool          # 位于正文区域（<main> 等）内
+
+
+class Page(NamedTuple):
+    blocks: list
+    skipped_links: int     # 导航等结构性公共部分中被跳过的链接数
+
+
+def _attr_hints(attrs: str) -> tuple[bool, bool]:
+    """(像导航 / 页脚等公共部分, 像正文区域)"""
+    chrome = main = False
+    for m in _ATTR_RE.finditer(attrs or ""):
+        value = next((g for g in m.group(2, 3, 4) if g is not None), "")
+        if m.group(1).lower() == "role":
+            chrome |= value.lower() in ("navigation", "banner", "contentinfo", "complementary")
+            main |= value.lower() == "main"
+            continue
+        chrome |= bool(_CHROME_HINT_RE.search(value))
+        main |= any(_MAIN_HINT_RE.match(v) for v in value.split())
+    return chrome, main
+
+
+def _clean(text: str) -> str:
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+def extract_page(doc: str, base_url: str) -> Page:
+    """HTML -> Page。结构性的公共部分（导航、页眉页脚等）在这里就被丢弃。"""
+    blocks = []
+    stack = []                   # (tag, is_chrome, is_main)
+    chrome_depth = main_depth = 0
+    skipped_links = 0
+    buf, links = [], []
+    rows, row, cell = [], None, None      # 表格：行列表、当前行、当前单元格
+    table_depth = heading = 0
+    anchor_href, anchor_text = None, []
+
+    def flush() -> None:
+        nonlocal heading
+        text = _clean("".join(buf))
+        if text:
+            kind, text = ("heading", "#" * heading + " " + text) if heading else ("text", text)
+            blocks.append(Block(kind, text, tuple(links), main_depth > 0))
+        buf.clear()
+        links.clear()
+        heading = 0
+
+    def end_cell() -> None:
+        nonlocal cell
+        if cell is not None and row is not None:
+            row.append(_clean("".join(cell)))
+        cell = None
+
+    def end_row() -> None:
+        nonlocal row
+        end_cell()
+        if row and any(row):
+            rows.append("| " + " | ".join(row) + " |")
+        row = None
+
+    def close_anchor() -> None:
+        nonlocal anchor_href
+        if anchor_href is not None:
+            (links if table_depth == 0 else table_links).append((anchor_href, _clean("".join(anchor_text))))
+        anchor_href = None
+
+    table_links = []
+    pos, n = 0, len(doc)
+    while pos < n:
+        m = _TOKEN_RE.search(doc, pos)
+        end_text = m.start() if m else n
+        if end_text > pos and chrome_depth == 0:
+            chunk = doc[pos:end_text]
+            if "&" in chunk:
+                chunk = html_lib.unescape(chunk)
+            if table_depth and cell is not None:
+                cell.append(chunk)
+            elif not table_depth:
+                buf.append(chunk)
+            if anchor_href is not None:
+                anchor_text.append(chunk)
+        if not m:
+            break
+        pos = m.end()
+        name = m.group(2)
+        if not name:
+            continue
+        name = name.lower()
+        closing = m.group(1) == "/"
+
+        if not closing and name in _RAW_TEXT_END:
+            end = _RAW_TEXT_END[name].search(doc, pos)
+            pos = end.end() if end else n
+            continue
+
+        # 块边界在更新元素栈之前处理：闭合标签前的文字仍属于该元素（正文区域 / 公共部分）
+        if chrome_depth == 0:
+            if name == "table":
+                if not closing:
+                    if table_depth == 0:
+                        flush()
+                        rows.clear()
+                        table_links.clear()
+                    table_depth += 1
+                elif table_depth:
+                    table_depth -= 1
+                    if table_depth == 0:
+                        end_row()
+                        if rows:
+                            blocks.append(Block("table", "\n".join(rows), tuple(table_links), main_depth > 0))
+                        rows.clear()
+                        table_links.clear()
+            elif table_depth:
+                if name == "tr":
+                    end_row()
+                    if not closing:
+                        row = []
+                elif name in ("td", "th"):
+                    end_cell()
+                    if not closing:
+                        if row is None:
+                            row = []
+                        cell = []
+                elif name == "br" and cell is not None:
+                    cell.append(" ")
+            elif name in _BLOCK_TAGS:
+                flush()
+                if name in _HEADINGS and not closing:
+                    heading = int(name[1])
+
+        if closing:
+            if any(tag == name for tag, _, _ in stack):
+                # 未闭合的元素一并弹出（容忍不规范的 HTML）
+                while stack:
+                    tag, is_chrome, is_main = stack.pop()
+                    chrome_depth -= is_chrome
+                    main_depth -= is_main
+                    if tag == name:
+                        break
+        elif name not in _VOID_TAGS and not (m.group(3) or "").rstrip().endswith("/"):
+            is_chrome, is_main = _attr_hints(m.group(3))
+            is_chrome = is_chrome or name in _CHROME_TAGS
+            is_main = (is_main or name in ("main", "article")) and not is_chrome
+            stack.append((name, is_chrome, is_main))
+            chrome_depth += is_chrome
+            main_depth += is_main
+
+        if name == "a":
+            close_anchor()
+            if not closing:
+                h = _HREF_RE.search(m.group(3) or "")
+                if h and chrome_depth == 0:
+                    href = html_lib.unescape(next(g for g in h.groups() if g is not None))
+                    anchor_href, anchor_text = normalize_link(base_url, href), []
+                elif h:
+                    skipped_links += 1
+    close_anchor()
+    flush()
+    return Page(blocks, skipped_links)
+
+
+def _key(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class _HostStats:
+    def __init__(self):
+        self.pages = 0
+        self.seen = set()
+        self.blocks = {}         # block key -> 出现的页面数
+        self.links = {}          # url -> 出现的页面数
+
+
+class SiteChrome:
+    """按主机学习重复出现的块和链接（线程安全，只在内存中）。"""
+
+    def __init__(self, min_pages: int = CHROME_MIN_PAGES, min_ratio: float = CHROME_MIN_RATIO):
+        self.min_pages = min_pages
+        self.min_ratio = min_ratio
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def observe(self, url: str, page: Page) -> None:
+        """把一个页面计入其主机的统计（同一 URL 只计一次）。"""
+        host = urlparse(url).netloc
+        block_keys = {_key(b.text) for b in page.blocks}
+        link_urls = {u for b in page.blocks for u, _ in b.links}
+        with self._lock:
+            stats = self._hosts.get(host)
+            if stats is None:
+                if len(self._hosts) >= CHROME_MAX_HOSTS:
+                    self._hosts.pop(next(iter(self._hosts)))
+                stats = self._hosts[host] = _HostStats()
+            if url in stats.seen or stats.pages >= CHROME_MAX_PAGES:
+                return
+            stats.seen.add(url)
+            stats.pages += 1
+            for k in block_keys:
+                stats.blocks[k] = stats.blocks.get(k, 0) + 1
+            for u in link_urls:
+                stats.links[u] = stats.links.get(u, 0) + 1
+
+    def _threshold(self, stats: _HostStats) -> float:
+        return max(self.min_pages, stats.pages * self.min_ratio)
+
+    def strip(self, url: str, page: Page) -> tuple[list, int]:
+        """去掉学到的公共块，返回 (保留的块, 去掉的块数)。正文区域存在时只保留区域内的块。"""
+        blocks = page.blocks
+        if any(b.in_main for b in blocks):
+            blocks = [b for b in blocks if b.in_main]
+        with self._lock:
+            stats = self._hosts.get(urlparse(url).netloc)
+            if stats is None or stats.pages < self.min_pages:
+                return blocks, len(page.blocks) - len(blocks)
+            threshold = self._threshold(stats)
+            kept = [b for b in blocks if stats.blocks.get(_key(b.text), 0) < threshold]
+        return kept, len(page.blocks) - len(kept)
+
+    def links(self, url: str, blocks: list) -> list:
+        """块内的链接按 URL 去重，去掉公共链接和指向自身的链接。"""
+        with self._lock:
+            stats = self._hosts.get(urlparse(url).netloc)
+            threshold = self._threshold(stats) if stats and stats.pages >= self.min_pages else None
+            common = {u for u, c in stats.links.items() if c >= threshold} if threshold else set()
+        seen = {url}
+        result = []
+        for b in blocks:
+            for link_url, text in b.links:
+                if link_url in seen or link_url in common or not text:
+                    continue
+                seen.add(link_url)
+                result.append((link_url, text))
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hosts": len(self._hosts), "pages": sum(s.pages for s in self._hosts.values())}
+
+
+site_chrome = SiteChrome()
+
+
+def main_content(doc: str, url: str, learn: bool = True) -> tuple[str, list, int]:
+    """(正文文本, 去重后的链接, 去掉的块数)。learn=True 时先把本页计入站点统计。"""
+    page = extract_page(doc, url)
+    if learn:
+        site_chrome.observe(url, page)
+    blocks, dropped = site_chrome.strip(url, page)
+    if not blocks:
+        # 整页都被判为公共部分（例如 <body class="side-...">）时退回到全文
+        text, anchors = parse_page(doc, url)
+        return _clean(text), list(dict.fromkeys((u, t) for u, t in anchors if t and u != url)), 0
+    return "\n".join(b.text for b in blocks), site_chrome.links(url, blocks), dropped
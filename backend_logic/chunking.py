@@ -0,0 +1,73 @@
+"""
+把长文档按页 / 章节边界切成不超过 token 预算的块，供分块抽取（map-reduce）使用。
+"""
+
+from __future__ import annotations
+import re
+
+from .tokens import count_tokens
+
+# "--- Page N ---" 是 pdf_text 输出的页分隔
+_PAGE_RE = re.compile(r"(?=\n--- Page \d+ ---\n)")
+# 章节标题：第○章 / 第○条 / （１）/ １． / ■ など
+_SECTION_RE = re.compile(
+    r"\n(?=\s*(?:第[0-9０-９一二三四五六七八九十百]+[章節条款項]"
+    r"|[（(][0-9０-９一二三四五六七八九十]+[)）]"
+    r"|[0-9０-９]+[.．、]\s*\S"
+    r"|[■□●◆◇【]))"
+)
+
+
+def _split_hard(text: str, max_tokens: int, model: str) -> list:
+    """按行切分，单行过长时再按字符切分。块的 token 数按行累加（不反复重数整个块）。"""
+    pieces, current, current_tokens = [], "", 0
+    for line in text.splitlines(keepends=True):
+        tokens = count_tokens(line, model)
+        while tokens > max_tokens:
+            # 按比例估算能放下的字符数
+            cut = max(1, int(len(line) * max_tokens / tokens * 0.9))
+            if current:
+                pieces.append(current)
+                current, current_tokens = "", 0
+            pieces.append(line[:cut])
+            line = line[cut:]
+            tokens = count_tokens(line, model)
+        if current and current_tokens + tokens > max_tokens:
+            pieces.append(current)
+            current, current_tokens = "", 0
+        current += line
+        current_tokens += tokens
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def _sections(text: str, max_tokens: int, model: str) -> list:
+    out = []
+    for page in _PAGE_RE.split(text):
+        if not page.strip():
+            continue
+        if count_tokens(page, model) <= max_tokens:
+            out.append(page)
+            continue
+        for section in _SECTION_RE.split(page):
+            if count_tokens(section, model) <= max_tokens:
+                out.append(section)
+            else:
+                out.extend(_split_hard(section, max_tokens, model))
+    return out
+
+
+def split_into_chunks(text: str, max_tokens: int, model: str = "gpt-4o-mini") -> list:
+    """尽量在页 / 章节边界处切分，并把相邻的小段合并到预算以内。"""
+    chunks, current, current_tokens = [], "", 0
+    for section in _sections(text, max_tokens, model):
+        tokens = count_tokens(section, model)
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(current)
+            current, current_tokens = "", 0
+        current += section
+        current_tokens += tokens
+    if current.strip():
+        chunks.append(current)
+    return chunks
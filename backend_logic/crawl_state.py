@@ -0,0 +1,107 @@
+"""
+按注册域名持久化的爬取状态：已发现的 URL、深度、ETag / Last-Modified、内容哈希与外链。
+再次爬取同一城市时用来发条件请求，并且只重新解析内容有变化的页面。
+fetched_at 超过 CRAWL_STATE_RETENTION 的行（站点改版后消失的 URL、不再爬取的城市）在打开数据库时
+以及每写入 CRAWL_STATE_PRUNE_EVERY 行时删除，表不会无限增长。
+"""
+
+from __future__ import annotations
+import os
+import json
+import time
+import sqlite3
+import threading
+from pathlib import Path
+
+from .disk_cache import CACHE_DIR
+
+# 保留期远长于重访间隔（CRAWL_STATE_MAX_AGE），过期的行只是失去条件请求的机会
+CRAWL_STATE_RETENTION = float(os.getenv("CRAWL_STATE_RETENTION", 30 * 24 * 3600))
+CRAWL_STATE_PRUNE_EVERY = int(os.getenv("CRAWL_STATE_PRUNE_EVERY", 5000))
+
+
+class CrawlState:
+    def __init__(self, path: str | Path = CACHE_DIR / "crawl_state.sqlite3",
+                 retention: float = CRAWL_STATE_RETENTION, prune_every: int = CRAWL_STATE_PRUNE_EVERY):
+        self.path = Path(path)
+        self.retention = retention
+        self.prune_every = prune_every
+        self._lock = threading.Lock()
+        self._conn = None
+        self._writes = 0
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "domain TEXT NOT NULL, url TEXT NOT NULL, depth INTEGER NOT NULL, "
+                "etag TEXT, last_modified TEXT, content_hash TEXT, content_type TEXT, "
+                "outlinks TEXT NOT NULL, fetched_at REAL NOT NULL, "
+                "PRIMARY KEY (domain, url))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS pages_fetched_at ON pages(fetched_at)")
+            self._conn = conn
+            self._prune(conn)
+        return self._conn
+
+    def _prune(self, db: sqlite3.Connection) -> int:
+        if self.retention <= 0:
+            return 0
+        n = db.execute("DELETE FROM pages WHERE fetched_at < ?", (time.time() - self.retention,)).rowcount
+        db.commit()
+        return n
+
+    def prune(self) -> int:
+        """删除超过保留期的行，返回删除的行数。"""
+        with self._lock:
+            return self._prune(self._db())
+
+    def load(self, domain: str) -> dict:
+        """返回 {url: page_dict}。"""
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT url, depth, etag, last_modified, content_hash, content_type, outlinks, fetched_at "
+                "FROM pages WHERE domain = ?", (domain,)
+            ).fetchall()
+        return {
+            r[0]: {
+                "url": r[0], "depth": r[1], "etag": r[2], "last_modified": r[3],
+                "content_hash": r[4], "content_type": r[5], "outlinks": json.loads(r[6]),
+                "fetched_at": r[7],
+            }
+            for r in rows
+        }
+
+    def save_many(self, domain: str, pages: list) -> None:
+        if not pages:
+            return
+        with self._lock:
+            db = self._db()
+            db.executemany(
+                "INSERT OR REPLACE INTO pages "
+                "(domain, url, depth, etag, last_modified, content_hash, content_type, outlinks, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (domain, p["url"], p["depth"], p.get("etag"), p.get("last_modified"),
+                     p.get("content_hash"), p.get("content_type"),
+                     json.dumps(p.get("outlinks", []), ensure_ascii=False), p.get("fetched_at", time.time()))
+                    for p in pages
+                ],
+            )
+            db.commit()
+            self._writes += len(pages)
+            if self.prune_every and self._writes >= self.prune_every:
+                self._writes = 0
+                self._prune(db)
+
+    def forget(self, domain: str) -> None:
+        with self._lock:
+            db = self._db()
+            db.execute("DELETE FROM pages WHERE domain = ?", (domain,))
+            db.commit()
+
+
+crawl_state = CrawlState()
@@ -0,0 +1,124 @@
+"""
+近似重复文档检测（MinHash 的 bottom-k 草图）。
+
+同一条例常以 HTML 页面、印刷用页面、手机版页面、PDF 以及存档镜像等多个 URL 出现。
+对规范化后的正文取字符 n-gram，保留哈希值最小的 DEDUPE_SKETCH_SIZE 个作为草图，
+用草图估计 Jaccard 相似度，不低于 DEDUPE_JACCARD 的视为同一文档。
+规制页面常用同一模板、只有数值不同（建蔽率 60% / 80% 等），所以还要求正文中出现的数值集合一致。
+summarizer 附加的链接列表（导航等站点公共部分）不计入指纹。
+
+（SimHash 对几百字的短页面方差太大，印刷版与原页面的距离和模板相同、内容不同的两页相差无几。）
+"""
+
+from __future__ import annotations
+import os
+import re
+import heapq
+import hashlib
+import threading
+import unicodedata
+from typing import NamedTuple
+
+DEDUPE_ENABLED = os.getenv("DEDUPE_ENABLED", "1") == "1"
+# 估计的 Jaccard 相似度不低于此值时合并（印刷版 / 手机版通常在 0.95 以上）
+DEDUPE_JACCARD = float(os.getenv("DEDUPE_JACCARD", 0.9))
+DEDUPE_SKETCH_SIZE = int(os.getenv("DEDUPE_SKETCH_SIZE", 128))
+# 正文太短（导航页、空白页）时不参与判定，避免误合并
+DEDUPE_MIN_CHARS = int(os.getenv("DEDUPE_MIN_CHARS", 200))
+# 只对开头的这些字符取指纹（限制超长文档的计算量）
+DEDUPE_MAX_CHARS = int(os.getenv("DEDUPE_MAX_CHARS", 100000))
+SHINGLE_SIZE = 5
+
+_LINKS_MARKER = "--- Document Links ---"
+_PAGE_MARKER_RE = re.compile(r"--- Page \d+ ---")
+_SPACE_RE = re.compile(r"\s+")
+_NUMBER_RE = re.compile(r"[0-9]+(?:\.[0-9]+)?")
+
+
+class Fingerprint(NamedTuple):
+    sketch: frozenset      # 最小的 DEDUPE_SKETCH_SIZE 个 shingle 哈希
+    numbers: str           # 正文中数值集合的哈希
+
+
+def main_text(text: str) -> str:
+    """NFKC 规范化，去掉 summarizer 附加的链接列表和 PDF 的页码分隔符。"""
+    text = unicodedata.normalize("NFKC", text or "").split(_LINKS_MARKER, 1)[0]
+    return _PAGE_MARKER_RE.sub(" ", text)
+
+
+def fingerprint(text: str, k: int = SHINGLE_SIZE, size: int = DEDUPE_SKETCH_SIZE) -> Fingerprint | None:
+    """正文的指纹；正文短于 DEDUPE_MIN_CHARS 时返回 None（不参与判定）。"""
+    body = main_text(text)
+    normalized = _SPACE_RE.sub(" ", body.lower()).strip()[:DEDUPE_MAX_CHARS]
+    if len(normalized) < DEDUPE_MIN_CHARS:
+        return None
+    shingles = {normalized[i:i + k] for i in range(len(normalized) - k + 1)}
+    hashes = (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+              for s in shingles)
+    numbers = " ".join(sorted(set(_NUMBER_RE.findall(body))))
+    return Fingerprint(frozenset(heapq.nsmallest(size, hashes)),
+                       hashlib.blake2b(numbers.encode("ascii"), digest_size=8).hexdigest())
+
+
+def jaccard(a: frozenset, b: frozenset, size: int = DEDUPE_SKETCH_SIZE) -> float:
+    """bottom-k 估计：并集中最小的 size 个哈希里同时属于两者的比例。"""
+    union = heapq.nsmallest(size, a | b)
+    if not union:
+        return 0.0
+    return sum(1 for h in union if h in a and h in b) / len(union)
+
+
+class NearDuplicateIndex:
+    """
+    add(key, fingerprint) 返回已登记的近似重复文档（canonical）的 key，没有时登记为新文档并返回 None。
+    近似重复：草图估计的 Jaccard >= threshold 且数值集合相同。
+    候选来自草图哈希的倒排表（共享哈希多的先比较），不必与所有文档两两比较。
+    先登记的文档是 canonical，duplicates[canonical] 记录被合并的 key。线程安全。
+    """
+
+    def __init__(self, threshold: float = DEDUPE_JACCARD):
+        self.threshold = threshold
+        self._postings = {}          # sketch hash -> [canonical key, ...]
+        self._fingerprints = {}      # canonical key -> fingerprint
+        self._canonical = {}         # key -> canonical key（canonical 自身也登记）
+        self.duplicates = {}         # canonical key -> [duplicate key, ...]
+        self.checked = 0
+        self._lock = threading.Lock()
+
+    def add(self, key: str, fingerprint: Fingerprint | None) -> str | None:
+        with self._lock:
+            if key in self._canonical:
+                canonical = self._canonical[key]
+                return None if canonical == key else canonical
+            if fingerprint is None:
+                return None
+            self.checked += 1
+            shared = {}
+            for h in fingerprint.sketch:
+                for candidate in self._postings.get(h, ()):
+                    shared[candidate] = shared.get(candidate, 0) + 1
+            for candidate in sorted(shared, key=shared.get, reverse=True):
+                other = self._fingerprints[candidate]
+                if other.numbers == fingerprint.numbers and \
+                        jaccard(fingerprint.sketch, other.sketch) >= self.threshold:
+                    self._canonical[key] = candidate
+                    self.duplicates.setdefault(candidate, []).append(key)
+                    return candidate
+            self._canonical[key] = key
+            self._fingerprints[key] = fingerprint
+            for h in fingerprint.sketch:
+                self._postings.setdefault(h, []).append(key)
+            return None
+
+    def canonical_of(self, key: str) -> str:
+        with self._lock:
+            return self._canonical.get(key, key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            collapsed = sum(len(v) for v in self.duplicates.values())
+            return {
+                "fingerprinted": self.checked,
+                "collapsed": collapsed,
+                "duplicate_rate": round(collapsed / self.checked, 3) if self.checked else 0.0,
+            }
@@ -0,0 +1,120 @@
+"""
+SQLite 上的简单 KV 缓存：值以 JSON 保存，支持 TTL 和按最近访问时间的 LRU 淘汰。
+多个缓存可以共用同一个数据库文件（不同的表）。
+"""
+
+from __future__ import annotations
+import os
+import json
+import time
+import sqlite3
+import threading
+from pathlib import Path
+
+from . import metrics
+
+CACHE_DIR = Path(os.getenv("CACHE_DIR", "cache"))
+
+
+class DiskCache:
+    def __init__(self, path: str | Path, table: str = "cache", ttl: float | None = None,
+                 max_entries: int | None = None):
+        self.path = Path(path)
+        self.table = table
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_accessed ON {self.table}(accessed_at)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str):
+        """命中返回值，未命中或已过期返回 None。"""
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            row = db.execute(f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+                db.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                db.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                metrics.cache_misses.inc(cache=self.table)
+                return None
+            db.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+            db.commit()
+            self.hits += 1
+            metrics.cache_hits.inc(cache=self.table)
+            return json.loads(row[0])
+
+    def get_many(self, keys: list) -> dict:
+        return {k: v for k in keys if (v := self.get(k)) is not None}
+
+    def set(self, key: str, value) -> None:
+        self.set_many({key: value})
+
+    def set_many(self, items: dict) -> None:
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                [(k, json.dumps(v, ensure_ascii=False), now, now) for k, v in items.items()],
+            )
+            self._evict(db)
+            db.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            db = self._db()
+            db.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            db.commit()
+
+    def _evict(self, db: sqlite3.Connection) -> None:
+        if self.ttl is not None:
+            db.execute(f"DELETE FROM {self.table} WHERE created_at < ?", (time.time() - self.ttl,))
+        if self.max_entries is not None:
+            count = db.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+            if count > self.max_entries:
+                db.execute(
+                    f"DELETE FROM {self.table} WHERE key IN ("
+                    f"SELECT key FROM {self.table} ORDER BY accessed_at ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+
+    def values(self) -> list:
+        """全部未过期的值（不更新访问时间，不计入命中率）。"""
+        with self._lock:
+            rows = self._db().execute(f"SELECT value, created_at FROM {self.table}").fetchall()
+        now = time.time()
+        return [json.loads(v) for v, created in rows if self.ttl is None or now - created <= self.ttl]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "entries": len(self),
+        }
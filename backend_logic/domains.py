@@ -0,0 +1,70 @@
+"""
+注册域名（eTLD+1）解析，供爬虫和链接过滤的热路径共用。
+
+- 只使用 tldextract 自带的 Public Suffix List 快照，完全不访问网络
+  （PUBLIC_SUFFIX_LIST 指向一个 .dat 文件时改用该快照）
+- 按主机名缓存结果（有界 LRU）
+"""
+
+from __future__ import annotations
+import os
+import threading
+from functools import lru_cache
+from pathlib import Path
+
+DOMAIN_CACHE_SIZE = int(os.getenv("DOMAIN_CACHE_SIZE", 65536))
+PUBLIC_SUFFIX_LIST = os.getenv("PUBLIC_SUFFIX_LIST")
+
+_extractor = None
+_extractor_lock = threading.Lock()
+
+
+def _get_extractor():
+    global _extractor
+    with _extractor_lock:
+        if _extractor is None:
+            import tldextract   # 首次解析时才导入（约 0.1 秒）
+            urls = (Path(PUBLIC_SUFFIX_LIST).resolve().as_uri(),) if PUBLIC_SUFFIX_LIST else ()
+            # suffix_list_urls=() 且 cache_dir=None：只用内置快照，也不写磁盘缓存
+            _extractor = tldextract.TLDExtract(suffix_list_urls=urls, cache_dir=None,
+                                               fallback_to_snapshot=True)
+        return _extractor
+
+
+def _host_of(url: str) -> str:
+    """从 URL 或不带 scheme 的主机名中取出主机部分。"""
+    rest = url.strip().lower()
+    if "://" in rest:
+        rest = rest.split("://", 1)[1]
+    elif rest.startswith("//"):
+        rest = rest[2:]
+    for sep in "/?#":
+        rest = rest.split(sep, 1)[0]
+    rest = rest.rsplit("@", 1)[-1]
+    if rest.startswith("["):          # IPv6
+        return rest.split("]", 1)[0] + "]"
+    return rest.split(":", 1)[0].rstrip(".")
+
+
+@lru_cache(maxsize=DOMAIN_CACHE_SIZE)
+def registered_domain_for_host(host: str) -> str:
+    result = _get_extractor().extract_str(host)
+    top = getattr(result, "top_domain_under_public_suffix", None)
+    if top is None:
+        top = result.registered_domain
+    return top
+
+
+def registered_domain(url: str) -> str:
+    """IP 地址或无效主机与 tldextract 一样返回空字符串。"""
+    host = _host_of(url)
+    return registered_domain_for_host(host) if host else ""
+
+
+def same_registered_domain(url: str, other: str) -> bool:
+    return registered_domain(url) == registered_domain(other)
+
+
+def cache_info() -> dict:
+    info = registered_domain_for_host.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "maxsize": info.maxsize}
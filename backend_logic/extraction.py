@@ -0,0 +1,119 @@
+"""
+run_analysis_for_city 的规制抽取阶段，与相关性判定 / PDF 下载重叠执行。
+
+- HTML 链接一被判定为相关就提交抽取，PDF 在下载完成的回调里提交（有界线程池）
+- 每个文档抽取完成时发出 document_extracted 进度事件（附带该文档的 findings）
+- 传入 NearDuplicateIndex 时，正文与已提交文档近似重复的不再调用 LLM，结果中记 duplicate_of
+- HTML 文档的结果中记 input_tokens（整页 / 实际送出 / 节省的 token 数）
+- results() 等待全部文档，aggregate_by_zone() 把 findings 按用途地域 / 规制种类汇总
+"""
+
+from __future__ import annotations
+import os
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from . import metrics
+from .jobs import emit_progress
+from .dedupe import NearDuplicateIndex, fingerprint
+from .summarizer import load_document, summarize_text_from_url_or_pdf
+
+EXTRACT_ENABLED = os.getenv("EXTRACT_ENABLED", "1") == "1"
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", 4))
+EXTRACT_MODEL = os.getenv("EXTRACT_MODEL", "gpt-4o-mini")
+
+
+class ExtractionStage:
+    def __init__(self, city: str, key: str, model: str = EXTRACT_MODEL, workers: int = EXTRACT_WORKERS,
+                 progress=None, index: NearDuplicateIndex | None = None):
+        self.city = city
+        self.key = key
+        self.model = model
+        self.progress = progress
+        self.index = index
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="extract")
+        # 下载回调在下载线程里提交抽取，任务仍需计入本次运行的 metrics
+        self._context = contextvars.copy_context()
+        self._futures = {}      # url -> Future
+        self._lock = threading.Lock()
+        self._done = 0
+
+    def submit(self, url: str, doc_identifier: str) -> None:
+        """提交一个文档（HTML 为 URL，PDF 为本地路径）；同一 URL 只抽取一次。"""
+        with self._lock:
+            if url in self._futures:
+                return
+            self._futures[url] = self._pool.submit(self._context.copy().run, self._extract, url, doc_identifier)
+
+    def submit_after_download(self, download_future, url: str, pdf_dir: Path) -> None:
+        """PDF 下载完成后立即提交抽取（下载失败则跳过）。"""
+        def on_done(future):
+            try:
+                info = future.result()
+            except Exception:
+                return
+            if info.get("downloaded"):
+                self.submit(url, str(pdf_dir / Path(info["local_path"]).name))
+
+        download_future.add_done_callback(on_done)
+
+    def _extract(self, url: str, doc_identifier: str) -> dict:
+        input_tokens = {}
+        try:
+            with metrics.span("extract_document"):
+                body = load_document(doc_identifier, stats=input_tokens)
+                canonical = self.index.add(url, fingerprint(body)) if self.index is not None else None
+                if canonical is not None:
+                    print(f"♊ [Dedupe] {url} is a near-duplicate of {canonical}, skipping extraction")
+                    data = {"findings": [], "external_links": [], "duplicate_of": canonical}
+                else:
+                    data = summarize_text_from_url_or_pdf(doc_identifier, self.city, self.key, self.model,
+                                                          body=body)
+        except Exception as e:
+            print(f"⚠️ [Extract Error] {url}: {e}")
+            data = {"findings": [], "external_links": [], "error": str(e)}
+        if input_tokens:
+            data["input_tokens"] = input_tokens
+        with self._lock:
+            self._done += 1
+            done = self._done
+        emit_progress(self.progress, "document_extracted", url=url, index=done,
+                      count=len(data.get("findings", [])), findings=data.get("findings", []),
+                      duplicate_of=data.get("duplicate_of"))
+        return data
+
+    def results(self) -> dict:
+        """等待已提交的全部抽取，返回 {url: {"findings": [...], "external_links": [...]}}。"""
+        with self._lock:
+            futures = dict(self._futures)
+        return {url: future.result() for url, future in futures.items()}
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True)
+
+
+def aggregate_by_zone(extracted: dict) -> dict:
+    """
+    {zone: {regulation_type: [{"value", "condition", "district_plan_name", "sources": [url, ...]}]}}
+    相同 (value, condition, district_plan_name) 的项目合并，sources 记录出现过的文档 URL。
+    """
+    zones = {}
+    for url, data in extracted.items():
+        for f in data.get("findings") or []:
+            if not isinstance(f, dict) or not f.get("regulation_type"):
+                continue
+            zone = str(f.get("zone") or "general").strip()
+            items = zones.setdefault(zone, {}).setdefault(str(f["regulation_type"]).strip(), [])
+            value = str(f.get("value") or "").strip()
+            for item in items:
+                if (item["value"], item["condition"], item["district_plan_name"]) == (
+                        value, f.get("condition"), f.get("district_plan_name")):
+                    if url not in item["sources"]:
+                        item["sources"].append(url)
+                    break
+            else:
+                items.append({"value": value, "condition": f.get("condition"),
+                              "district_plan_name": f.get("district_plan_name"), "sources": [url]})
+    return zones
@@ -0,0 +1,364 @@
+"""
+爬虫、PDF 下载、summarizer 共用的抓取层。
+
+- 一个共享的 httpx 连接池（同样的 User-Agent / 超时 / 重定向设置）
+- 响应正文按 sha256 保存在 CACHE_DIR/bodies/ 下（内容寻址，相同内容只存一份），
+  URL -> 元数据（sha256、Content-Type、ETag、Last-Modified、抓取时间）记在 fetch_index 中
+- FETCH_MAX_AGE 秒内抓取过的 URL 直接读本地正文；过期的带 ETag / Last-Modified 做条件请求
+- 同一 URL 的并发 fetch() 只发一次请求，其余调用等待并共享结果
+- 正文存储总量超过 FETCH_STORE_MAX_BYTES 时回收：先删没有索引引用的正文，再按最近使用时间删最旧的
+
+爬虫是 asyncio 的，用 async_client() 取得同样配置的 AsyncClient（连接池与事件循环绑定），
+抓到的 HTML 用 put() 写入同一个正文存储，之后 summarizer 不再重复下载。
+"""
+
+from __future__ import annotations
+import os
+import re
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from typing import NamedTuple
+
+import httpx
+
+from . import metrics
+from .disk_cache import DiskCache, CACHE_DIR
+
+FETCH_STORE_DIR = Path(os.getenv("FETCH_STORE_DIR", CACHE_DIR / "bodies"))
+# 在此时间内抓取过的正文直接复用，不再访问网络（秒）
+FETCH_MAX_AGE = float(os.getenv("FETCH_MAX_AGE", 3600))
+FETCH_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", 20))
+# 单个响应的上限；正文存储整体的上限见 FETCH_STORE_MAX_BYTES
+FETCH_MAX_BYTES = int(os.getenv("FETCH_MAX_BYTES", 100 * 1024 * 1024))
+# 正文存储（CACHE_DIR/bodies）的总大小上限：超过时回收到上限的 80%。
+# fetch_index 的行被淘汰或被新内容替换后，留下的正文也在回收时删除
+FETCH_STORE_MAX_BYTES = int(os.getenv("FETCH_STORE_MAX_BYTES", 2 * 1024 * 1024 * 1024))
+# 最近这么多秒内写入或读取过的正文不回收（可能正被读取或硬链接）
+FETCH_GC_MIN_AGE = float(os.getenv("FETCH_GC_MIN_AGE", 600))
+FETCH_MAX_CONNECTIONS = int(os.getenv("FETCH_MAX_CONNECTIONS", 32))
+FETCH_INDEX_MAX = int(os.getenv("FETCH_INDEX_MAX", 100000))
+FETCH_USER_AGENT = os.getenv("FETCH_USER_AGENT", "Mozilla/5.0")
+CHUNK_SIZE = 64 * 1024
+
+_CHARSET_RE = re.compile(rb"""<meta[^>]+charset=["']?([\w-]+)""", re.I)
+
+
+class Fetched(NamedTuple):
+    url: str
+    status: int
+    content_type: str
+    sha256: str
+    size: int
+    path: Path              # 存储中的正文文件
+    etag: str | None
+    last_modified: str | None
+    fetched_at: float
+    from_store: bool        # True：未经网络（新鲜命中、304 或与并发请求合并）
+
+    def read(self) -> bytes:
+        return self.path.read_bytes()
+
+    def text(self) -> str:
+        body = self.read()
+        return body.decode(charset_of(self.content_type, body), errors="replace")
+
+
+def charset_of(content_type: str, body: bytes = b"") -> str:
+    """Content-Type 的 charset，其次是 <meta charset>，都没有时为 utf-8。"""
+    m = re.search(r"charset=([\w-]+)", content_type or "", re.I)
+    if m is None:
+        m = _CHARSET_RE.search(body[:4096])
+    name = m.group(1) if m else "utf-8"
+    name = name.decode("ascii", "ignore") if isinstance(name, bytes) else name
+    try:
+        "".encode(name)
+        return name
+    except LookupError:
+        return "utf-8"
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Fetcher:
+    def __init__(self, store_dir: str | Path = FETCH_STORE_DIR, max_age: float = FETCH_MAX_AGE,
+                 timeout: float = FETCH_TIMEOUT, max_connections: int = FETCH_MAX_CONNECTIONS,
+                 index: DiskCache | None = None, max_store_bytes: int = FETCH_STORE_MAX_BYTES):
+        self.store_dir = Path(store_dir)
+        self.max_store_bytes = max_store_bytes
+        self.max_age = max_age
+        self.timeout = timeout
+        self.max_connections = max_connections
+        # DiskCache 定义了 __len__，空索引为假值，不能写成 index or DiskCache(...)
+        if index is None:
+            index = DiskCache(CACHE_DIR / "fetch_index.sqlite3", table="fetch_index", max_entries=FETCH_INDEX_MAX)
+        self.index = index
+        self._client = None
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._store_bytes = None        # 正文存储的总大小（首次写入时扫描一次，之后累加）
+        self._gc_lock = threading.Lock()
+        self.counts = {"network": 0, "not_modified": 0, "store": 0, "coalesced": 0, "put": 0, "gc_removed": 0}
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.counts[key] += 1
+
+    # ---- 连接池 ----
+    def _client_options(self, max_connections: int) -> dict:
+        return dict(
+            verify=False,
+            timeout=self.timeout,
+            follow_redirects=True,
+            headers={"User-Agent": FETCH_USER_AGENT},
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections),
+        )
+
+    def client(self) -> httpx.Client:
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(**self._client_options(self.max_connections))
+            return self._client
+
+    def async_client(self, max_connections: int | None = None, timeout: float | None = None) -> httpx.AsyncClient:
+        """与 client() 配置相同的 AsyncClient；调用方负责在自己的事件循环里关闭。"""
+        options = self._client_options(max_connections or self.max_connections)
+        if timeout is not None:
+            options["timeout"] = timeout
+        return httpx.AsyncClient(**options)
+
+    # ---- 正文存储 ----
+    def blob_path(self, sha: str) -> Path:
+        return self.store_dir / sha[:2] / sha
+
+    def _write_blob(self, chunks, max_bytes: int) -> tuple[str, int]:
+        """把正文分块写入临时文件并计算 sha256，完成后原子地移动到 bodies/<sha[:2]>/<sha>。"""
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.store_dir, prefix=".part-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise ValueError(f"response too large (> {max_bytes} bytes)")
+                    digest.update(chunk)
+                    f.write(chunk)
+            sha = digest.hexdigest()
+            final = self.blob_path(sha)
+            if final.exists():
+                os.remove(tmp_path)       # 相同内容已存在（其他 URL 抓取过）
+                self._touch(final)
+            else:
+                final.parent.mkdir(exist_ok=True)
+                os.replace(tmp_path, final)
+                self._account(size)
+            return sha, size
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    # ---- 回收 ----
+    @staticmethod
+    def _touch(path: Path) -> None:
+        """用 mtime 记录最近使用时间（回收时按它排序）。"""
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _blobs(self) -> list:
+        """[(path, size, mtime), ...]，包括崩溃残留的 .part- 临时文件。"""
+        blobs = []
+        for path in list(self.store_dir.glob("??/*")) + list(self.store_dir.glob(".part-*")):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            blobs.append((path, st.st_size, st.st_mtime))
+        return blobs
+
+    def _account(self, size: int) -> None:
+        if self._store_bytes is None:
+            total = sum(s for _, s, _ in self._blobs())      # 已包含刚写入的正文
+            with self._lock:
+                if self._store_bytes is None:
+                    self._store_bytes = total
+                else:
+                    self._store_bytes += size
+        else:
+            with self._lock:
+                self._store_bytes += size
+        if self._store_bytes > self.max_store_bytes:
+            self.collect()
+
+    def collect(self, target: int | None = None) -> dict:
+        """
+        回收正文存储：删除没有索引引用的正文，再按最近使用时间从旧到新删除，直到总大小不超过 target
+        （默认为上限的 80%）。FETCH_GC_MIN_AGE 内使用过的不删。已有回收在进行时直接返回。
+        """
+        if not self._gc_lock.acquire(blocking=False):
+            return {}
+        try:
+            target = int(self.max_store_bytes * 0.8) if target is None else target
+            blobs = self._blobs()
+            total = sum(size for _, size, _ in blobs)
+            referenced = {entry["sha256"] for entry in self.index.values() if entry.get("sha256")}
+            now = time.time()
+            removed = freed = 0
+            # 未引用的（含临时文件）在前，其余按 mtime 从旧到新
+            for path, size, mtime in sorted(blobs, key=lambda b: (b[0].name in referenced, b[2])):
+                if now - mtime < FETCH_GC_MIN_AGE:
+                    continue
+                if path.name in referenced and total <= target:
+                    break
+                try:
+                    path.unlink()
+                except OSError:
+                    continue
+                total -= size
+                freed += size
+                removed += 1
+            with self._lock:
+                self._store_bytes = total
+                self.counts["gc_removed"] += removed
+            if removed:
+                print(f"🧹 [Fetch store] removed {removed} bodies ({freed / 1024 / 1024:.1f} MB), "
+                      f"{total / 1024 / 1024:.1f} MB left")
+            return {"removed": removed, "freed_bytes": freed, "store_bytes": total}
+        finally:
+            self._gc_lock.release()
+
+    def _to_fetched(self, url: str, entry: dict, from_store: bool) -> Fetched:
+        if from_store:
+            self._touch(self.blob_path(entry["sha256"]))
+        return Fetched(url, entry["status"], entry.get("content_type") or "", entry["sha256"], entry["size"],
+                       self.blob_path(entry["sha256"]), entry.get("etag"), entry.get("last_modified"),
+                       entry["fetched_at"], from_store)
+
+    def _entry(self, url: str) -> dict | None:
+        entry = self.index.get(url)
+        if entry and not self.blob_path(entry["sha256"]).exists():
+            return None           # 正文被删除，重新完整下载
+        return entry
+
+    def _save(self, url: str, status: int, headers, sha: str, size: int) -> dict:
+        entry = {
+            "status": status,
+            "content_type": headers.get("Content-Type", ""),
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "sha256": sha,
+            "size": size,
+            "fetched_at": time.time(),
+        }
+        self.index.set(url, entry)
+        return entry
+
+    def lookup(self, url: str, max_age: float | None = None) -> Fetched | None:
+        """max_age 秒内抓取过的正文（不访问网络）；没有时返回 None。"""
+        entry = self._entry(url)
+        max_age = self.max_age if max_age is None else max_age
+        if entry and time.time() - entry["fetched_at"] < max_age:
+            self._count("store")
+            return self._to_fetched(url, entry, True)
+        return None
+
+    def put(self, url: str, status: int, headers, body: bytes) -> Fetched:
+        """写入调用方已读取的完整正文（爬虫用）。"""
+        sha, size = self._write_blob([body], max(len(body), 1))
+        self._count("put")
+        return self._to_fetched(url, self._save(url, status, headers, sha, size), False)
+
+    def materialize(self, fetched: Fetched, directory: str | Path, suffix: str = "") -> str:
+        """把正文放到 directory/<sha256><suffix>（优先硬链接，不行时复制），返回路径。"""
+        os.makedirs(directory, exist_ok=True)
+        target = Path(directory) / f"{fetched.sha256}{suffix}"
+        if not target.exists():
+            tmp = target.with_name(f".part-{fetched.sha256}-{threading.get_ident()}{suffix}")
+            try:
+                os.link(fetched.path, tmp)
+            except OSError:
+                shutil.copyfile(fetched.path, tmp)
+            os.replace(tmp, target)
+        return str(target)
+
+    # ---- 抓取 ----
+    def fetch(self, url: str, max_age: float | None = None, max_bytes: int = FETCH_MAX_BYTES,
+              source: str = "fetch") -> Fetched:
+        """
+        返回 URL 的正文（Fetched）。新鲜的存储直接返回；否则发（条件）请求，
+        同一 URL 的并发调用合并为一次。HTTP 错误抛出 httpx.HTTPError，超过 max_bytes 抛出 ValueError。
+        """
+        entry = self._entry(url)
+        max_age = self.max_age if max_age is None else max_age
+        if entry and time.time() - entry["fetched_at"] < max_age:
+            self._count("store")
+            return self._to_fetched(url, entry, True)
+
+        with self._lock:
+            flight = self._flights.get(url)
+            leader = flight is None
+            if leader:
+                flight = self._flights[url] = _Flight()
+            else:
+                self.counts["coalesced"] += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result._replace(from_store=True)
+
+        try:
+            flight.result = self._download(url, entry, max_bytes, source)
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[url]
+            flight.done.set()
+        return flight.result
+
+    def _download(self, url: str, entry: dict | None, max_bytes: int, source: str) -> Fetched:
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        with metrics.span("http_fetch"), self.client().stream("GET", url, headers=headers) as res:
+            if res.status_code == 304 and entry:
+                self._count("not_modified")
+                entry = dict(entry, fetched_at=time.time())
+                self.index.set(url, entry)
+                return self._to_fetched(url, entry, True)
+            res.raise_for_status()
+            declared = res.headers.get("Content-Length")
+            if declared and declared.isdigit() and int(declared) > max_bytes:
+                raise ValueError(f"response too large ({declared} bytes > {max_bytes})")
+            sha, size = self._write_blob(res.iter_bytes(CHUNK_SIZE), max_bytes)
+        self._count("network")
+        metrics.bytes_downloaded.inc(size, source=source)
+        return self._to_fetched(url, self._save(url, res.status_code, res.headers, sha, size), False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self.counts, in_flight=len(self._flights), store_bytes=self._store_bytes,
+                          max_store_bytes=self.max_store_bytes)
+        return dict(counts, index=self.index.stats())
+
+
+fetcher = Fetcher()
@@ -0,0 +1,243 @@
+"""
+抽出结果的持久化存储（SQLite），用于跨城市查询，不必重新运行流水线。
+
+- documents：相关链接（城市、原始 URL、本地 PDF、类型、分数），findings 通过 source_key 关联回原始文档
+- findings：summarizer 抽取的规制项目，按 city / zone / regulation_type / source_key 建索引
+- 同一文档的 findings 每次整体替换（先删除该 (city, source_key) 的旧行，同一事务内写入新行）
+- 写入经由后台线程批量提交（攒够 FINDINGS_BATCH_SIZE 条或每 FINDINGS_FLUSH_INTERVAL 秒一次事务），
+  调用方不等待磁盘
+"""
+
+from __future__ import annotations
+import os
+import time
+import queue
+import sqlite3
+import threading
+from pathlib import Path
+
+FINDINGS_DB = Path(os.getenv("FINDINGS_DB", "data/findings.sqlite3"))
+FINDINGS_BATCH_SIZE = int(os.getenv("FINDINGS_BATCH_SIZE", 200))
+FINDINGS_FLUSH_INTERVAL = float(os.getenv("FINDINGS_FLUSH_INTERVAL", 0.5))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    city TEXT NOT NULL,
+    source_key TEXT NOT NULL,
+    url TEXT NOT NULL,
+    local_path TEXT,
+    type TEXT,
+    score REAL,
+    seen_at REAL NOT NULL,
+    PRIMARY KEY (city, source_key)
+);
+CREATE INDEX IF NOT EXISTS documents_url ON documents(url);
+
+CREATE TABLE IF NOT EXISTS findings (
+    id INTEGER PRIMARY KEY,
+    city TEXT NOT NULL,
+    regulation_type TEXT NOT NULL,
+    zone TEXT NOT NULL,
+    district_plan_name TEXT NOT NULL DEFAULT '',
+    value TEXT NOT NULL,
+    condition TEXT,
+    source_key TEXT NOT NULL,
+    extracted_at REAL NOT NULL,
+    UNIQUE (city, source_key, regulation_type, zone, district_plan_name, value)
+);
+CREATE INDEX IF NOT EXISTS findings_city ON findings(city, regulation_type);
+CREATE INDEX IF NOT EXISTS findings_zone ON findings(zone, regulation_type);
+CREATE INDEX IF NOT EXISTS findings_type ON findings(regulation_type, city);
+CREATE INDEX IF NOT EXISTS findings_source ON findings(source_key);
+"""
+
+# 查询返回的列：finding 本身 + 来源文档（provenance）
+_SELECT = (
+    "SELECT f.city, f.regulation_type, f.zone, f.district_plan_name, f.value, f.condition, "
+    "f.source_key, f.extracted_at, d.url, d.local_path, d.type "
+    "FROM findings f LEFT JOIN documents d ON d.city = f.city AND d.source_key = f.source_key"
+)
+
+
+def document_key(identifier: str) -> str:
+    """本地 PDF（downloaded_pdfs/<sha>.pdf 或 /files/<sha>.pdf）取文件名，URL 原样使用。"""
+    if identifier.lower().endswith(".pdf") and "://" not in identifier:
+        return Path(identifier).name
+    return identifier
+
+
+def _row_to_dict(r) -> dict:
+    return {
+        "city": r[0],
+        "regulation_type": r[1],
+        "zone": r[2],
+        "district_plan_name": r[3] or None,
+        "value": r[4],
+        "condition": r[5],
+        "extracted_at": r[7],
+        "source": {
+            "key": r[6],
+            "url": r[8] or (r[6] if "://" in r[6] else None),
+            "local_path": r[9] or (f"/files/{r[6]}" if r[6].lower().endswith(".pdf") else None),
+            "type": r[10],
+        },
+    }
+
+
+class FindingsStore:
+    def __init__(self, path: str | Path = FINDINGS_DB, batch_size: int = FINDINGS_BATCH_SIZE,
+                 flush_interval: float = FINDINGS_FLUSH_INTERVAL):
+        self.path = Path(path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._writer = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    # ---- 写入（批量、后台） ----
+    def _ensure_writer(self) -> None:
+        with self._lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop, name="findings-writer", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self) -> None:
+        while True:
+            items = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(items) < self.batch_size:
+                try:
+                    items.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                self._write(items)
+            except Exception as e:
+                print(f"⚠️ findings store write failed ({len(items)} rows): {e}")
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+
+    def _write(self, items: list) -> None:
+        docs = [row for kind, row in items if kind == "document"]
+        batches = [row for kind, row in items if kind == "findings"]
+        with self._lock:
+            db = self._db()
+            with db:
+                db.executemany(
+                    "INSERT INTO documents (city, source_key, url, local_path, type, score, seen_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (city, source_key) DO UPDATE SET url = excluded.url, "
+                    "local_path = COALESCE(excluded.local_path, local_path), type = excluded.type, "
+                    "score = COALESCE(excluded.score, score), seen_at = excluded.seen_at",
+                    docs,
+                )
+                # 同一文档重新抽取时整体替换：旧的取值不再与新结果并存
+                for city, key, rows in batches:
+                    db.execute("DELETE FROM findings WHERE city = ? AND source_key = ?", (city, key))
+                    db.executemany(
+                        "INSERT INTO findings (city, regulation_type, zone, district_plan_name, value, condition, "
+                        "source_key, extracted_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                        "ON CONFLICT (city, source_key, regulation_type, zone, district_plan_name, value) "
+                        "DO UPDATE SET condition = excluded.condition, extracted_at = excluded.extracted_at",
+                        rows,
+                    )
+
+    def record_links(self, city: str, links: list) -> None:
+        """run_analysis_for_city 的 relevant_links：下载成功的 PDF 以本地文件为 source_key。"""
+        now = time.time()
+        for link in links:
+            local = link.get("local_path") if link.get("downloaded") else None
+            key = document_key(local) if local else link["url"]
+            self._queue.put(("document", (city, key, link["url"], local, link.get("type"), link.get("score"), now)))
+        self._ensure_writer()
+
+    def record_findings(self, city: str, doc_identifier: str, findings: list) -> None:
+        """替换该文档在 city 下的全部 findings（findings 为空时清除旧结果）。"""
+        now = time.time()
+        key = document_key(doc_identifier)
+        rows = [
+            (
+                city,
+                str(f["regulation_type"]).strip(),
+                str(f.get("zone") or "general").strip(),
+                str(f.get("district_plan_name") or "").strip(),
+                str(f.get("value") or "").strip(),
+                f.get("condition"),
+                key,
+                now,
+            )
+            for f in findings
+            if isinstance(f, dict) and f.get("regulation_type")
+        ]
+        self._queue.put(("findings", (city, key, rows)))
+        self._ensure_writer()
+
+    def flush(self) -> None:
+        """等待已提交的写入全部落盘。"""
+        self._queue.join()
+
+    # ---- 查询 ----
+    def query(self, city: str | None = None, zone: str | None = None, regulation_type: str | None = None,
+              source: str | None = None, limit: int = 100, offset: int = 0) -> list:
+        where, params = [], []
+        for column, value in (("f.city", city), ("f.zone", zone), ("f.regulation_type", regulation_type)):
+            if value:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if source:
+            where.append("(f.source_key = ? OR d.url = ?)")
+            params += [document_key(source), source]
+        sql = _SELECT + (" WHERE " + " AND ".join(where) if where else "")
+        sql += " ORDER BY f.city, f.regulation_type, f.zone, f.id LIMIT ? OFFSET ?"
+        with self._lock:
+            rows = self._db().execute(sql, params + [limit, offset]).fetchall()
+        return [_row_to_dict(r) for r in rows]
+
+    def compare(self, regulation_type: str, zone: str | None = None) -> dict:
+        """某一规制在各城市的取值：{city: [finding, ...]}。"""
+        out = {}
+        for f in self.query(zone=zone, regulation_type=regulation_type, limit=100000):
+            out.setdefault(f["city"], []).append(f)
+        return out
+
+    def cities(self) -> list:
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT c.city, "
+                "(SELECT COUNT(*) FROM findings f WHERE f.city = c.city), "
+                "(SELECT COUNT(*) FROM documents d WHERE d.city = c.city), "
+                "(SELECT MAX(extracted_at) FROM findings f WHERE f.city = c.city) "
+                "FROM (SELECT city FROM findings UNION SELECT city FROM documents) c ORDER BY c.city"
+            ).fetchall()
+        return [{"city": r[0], "findings": r[1], "documents": r[2], "last_extracted_at": r[3]} for r in rows]
+
+    def documents(self, city: str) -> list:
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT source_key, url, local_path, type, score, seen_at FROM documents "
+                "WHERE city = ? ORDER BY score DESC, url", (city,)
+            ).fetchall()
+        return [{"key": r[0], "url": r[1], "local_path": r[2], "type": r[3], "score": r[4], "seen_at": r[5]}
+                for r in rows]
+
+    def stats(self) -> dict:
+        with self._lock:
+            db = self._db()
+            findings = db.execute("SELECT COUNT(*) FROM findings").fetchone()[0]
+            documents = db.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+        return {"findings": findings, "documents": documents, "pending_writes": self._queue.unfinished_tasks}
+
+
+findings_store = FindingsStore()
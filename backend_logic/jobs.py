@@ -0,0 +1,140 @@
+"""
+后台任务子系统：把 run_analysis_for_city 放到有界线程池中执行，
+请求线程只负责提交 / 查询 / 订阅进度，不再被整个流水线占用几分钟。
+"""
+
+from __future__ import annotations
+import os
+import time
+import uuid
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", 10))   # 排队 + 运行中的上限
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", 3600))   # 完成后保留秒数
+
+
+class QueueFullError(RuntimeError):
+    pass
+
+
+def emit_progress(progress, event: str, **data) -> None:
+    """调用进度回调 progress(event, **data)；progress 为 None 时什么都不做，回调出错只打印不中断流水线。"""
+    if progress is None:
+        return
+    try:
+        progress(event, **data)
+    except Exception as e:
+        print(f"⚠️ progress callback error: {e}")
+
+
+class Job:
+    def __init__(self, kind: str, params: dict):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.status = "queued"        # queued / running / done / error
+        self.created_at = time.time()
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.events = []
+        self._cond = threading.Condition()
+
+    def emit(self, event: str, **data) -> None:
+        with self._cond:
+            self.events.append({"seq": len(self.events), "event": event, "time": time.time(), "data": data})
+            self._cond.notify_all()
+
+    def finish(self, status: str, result=None, error: str | None = None) -> None:
+        # 状态与最终事件在同一把锁内更新，订阅方不会在看到 finished 后漏掉最后一条事件
+        with self._cond:
+            self.result = result
+            self.error = error
+            self.status = status
+            self.finished_at = time.time()
+            self.emit(status, error=error)
+
+    def events_since(self, seq: int) -> list:
+        with self._cond:
+            return self.events[seq:]
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """阻塞等待任务结束，返回是否已结束。"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.finished, timeout=timeout)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "error")
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+            "events": len(self.events),
+            "last_event": self.events[-1] if self.events else None,
+        }
+
+
+class JobManager:
+    def __init__(self, max_workers: int = JOB_WORKERS, max_pending: int = JOB_MAX_PENDING,
+                 retention: float = JOB_RETENTION):
+        self.max_pending = max_pending
+        self.retention = retention
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _gc(self) -> None:
+        now = time.time()
+        for job_id in [j.id for j in self._jobs.values()
+                       if j.finished and now - j.finished_at > self.retention]:
+            del self._jobs[job_id]
+
+    def submit(self, kind: str, fn, params: dict) -> Job:
+        """
+        fn(progress=callback, **params) 在后台执行。
+        排队 + 运行中的任务数达到 max_pending 时抛出 QueueFullError。
+        """
+        with self._lock:
+            self._gc()
+            if sum(1 for j in self._jobs.values() if not j.finished) >= self.max_pending:
+                raise QueueFullError("処理待ちのジョブが多すぎます。しばらくしてから再試行してください。")
+            job = Job(kind, params)
+            self._jobs[job.id] = job
+        job.emit("queued")
+        self._pool.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job: Job, fn) -> None:
+        job.status = "running"
+        job.emit("started")
+        try:
+            result = fn(progress=job.emit, **job.params)
+        except Exception as e:
+            print(traceback.format_exc())
+            job.finish("error", error=str(e))
+        else:
+            job.finish("done", result=result)
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = {}
+            for j in self._jobs.values():
+                counts[j.status] = counts.get(j.status, 0) + 1
+            return {"max_pending": self.max_pending, "jobs": counts}
+
+
+job_manager = JobManager()
@@ -0,0 +1,13 @@
+"""
+検索・クロール優先度付けで共有するキーワード。
+"""
+
+# 与本地版本完全一致的关键词
+KEYWORDS = [
+    "都市計画図",
+    "用途地域",
+    "建蔽率",
+    "容積率",
+    "開発指導要綱",
+    "建築基準法"
+]
@@ -1,47 +1,129 @@
+import os
 import re
+import html
+import time
+import heapq
+import asyncio
+import hashlib
 import requests
 import urllib3
-import tldextract
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urldefrag
-from collections import deque
+import httpx
+from urllib.parse import urldefrag, urlparse
+from collections import Counter, deque
+from typing import NamedTuple
+
+from . import metrics
+from .crawl_state import CrawlState, crawl_state
+from .fetcher import Fetcher, fetcher, charset_of
+from .rate_limit import HostLimiter
+from .domains import registered_domain
+from .link_extract import extract_links, extract_anchors
+from .link_scoring import score_link
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# 并发爬虫的默认限制
+DEFAULT_CONCURRENCY = 16        # 全局同时请求数
+DEFAULT_PER_HOST = 4            # 每个主机同时请求数
+DEFAULT_TIMEOUT = 8
+# 在此时间内抓取过的页面直接复用已保存的外链（秒）
+CRAWL_STATE_MAX_AGE = float(os.getenv("CRAWL_STATE_MAX_AGE", 3600))
+# HTML 本文的读取上限（超出部分截断后再解析）
+CRAWL_MAX_HTML_BYTES = int(os.getenv("CRAWL_MAX_HTML_BYTES", 5 * 1024 * 1024))
+# 对没有扩展名线索的 URL 先发 HEAD 确认类型（服务器不支持 HEAD 时退回流式 GET）
+CRAWL_HEAD_PROBE = os.getenv("CRAWL_HEAD_PROBE", "0") == "1"
+
+class CrawledLink(NamedTuple):
+    url: str
+    score: float
+    depth: int
+    kind: str = "HTML"      # HTML / PDF / IMAGE / OFFICE / OTHER
+
+
+_LOC_RE = re.compile(r"<loc>\s*(.*?)\s*</loc>", re.I | re.S)
+
+# 扩展名即可判定的叶子（不抓取正文，也不展开）
+_LEAF_EXTENSIONS = {
+    "PDF": (".pdf",),
+    "IMAGE": (".jpg", ".jpeg", ".png", ".gif", ".bmp", ".svg", ".webp", ".tif", ".tiff"),
+    "OFFICE": (".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx", ".odt", ".ods", ".odp", ".csv",
+               ".rtf", ".jtd"),
+    "OTHER": (".zip", ".lzh", ".7z", ".mp3", ".mp4", ".wmv", ".mov", ".dxf", ".dwg", ".exe"),
+}
+_OFFICE_TYPES = ("msword", "officedocument", "ms-excel", "ms-powerpoint", "opendocument", "text/csv",
+                 "rtf", "ichitaro")
+
+
+def leaf_kind_from_url(url: str) -> str | None:
+    """按路径扩展名判定叶子类型；无法判定（可能是 HTML）时返回 None。"""
+    path = urlparse(url).path.lower()
+    for kind, extensions in _LEAF_EXTENSIONS.items():
+        if path.endswith(extensions):
+            return kind
+    return None
+
+
+def leaf_kind_from_type(content_type: str) -> str | None:
+    """按 Content-Type 判定叶子类型；HTML 返回 None。"""
+    ct = (content_type or "").lower()
+    if "html" in ct:
+        return None
+    if "pdf" in ct:
+        return "PDF"
+    if ct.startswith("image/"):
+        return "IMAGE"
+    if any(t in ct for t in _OFFICE_TYPES):
+        return "OFFICE"
+    return "OTHER"
+
 def _get_domain(url):
-    return tldextract.extract(url).registered_domain
+    return registered_domain(url)
 
 def _clean_link(link):
     return urldefrag(link)[0]
 
-def bfs(seed_urls: list, base_domain_str: str, max_depth: int = 2, max_total: int = 120):
-    q = deque([(url, 0) for url in seed_urls])
-    seen = {_clean_link(url) for url in seed_urls}
-    
+def _host(url):
+    return urlparse(url).netloc.lower()
+
+def _extract_links(url, doc):
+    return extract_links(doc, url)
+
+def _extract_anchors(url, doc):
+    return [[link, text] for link, text in extract_anchors(doc, url)]
+
+def _as_anchors(outlinks):
+    # 兼容旧版状态中只保存了 URL 的外链
+    return [[o, ""] if isinstance(o, str) else o for o in outlinks]
+
+def _base_domain(seed_urls, base_domain_str):
     base_domain = _get_domain(base_domain_str)
     if not base_domain:
         base_domain = _get_domain(seed_urls[0]) if seed_urls else ''
+    return base_domain
+
+
+def bfs_serial(seed_urls: list, base_domain_str: str, max_depth: int = 2, max_total: int = 120):
+    """旧的串行 BFS（逐页阻塞请求），保留用于对比基准。"""
+    q = deque([(url, 0) for url in seed_urls])
+    seen = {_clean_link(url) for url in seed_urls}
+
+    base_domain = _base_domain(seed_urls, base_domain_str)
 
     while q and len(seen) < max_total:
         url, depth = q.popleft()
 
         if depth >= max_depth or not url.lower().startswith('http'):
             continue
-        
+
         try:
-            res = requests.get(url, timeout=8, verify=False)
+            res = requests.get(url, timeout=DEFAULT_TIMEOUT, verify=False)
             if 'html' not in res.headers.get('Content-Type', ''):
                 continue
-            
-            soup = BeautifulSoup(res.text, "html.parser")
-            
-            for a in soup.find_all("a", href=True):
-                link = urljoin(url, a["href"])
-                cleaned_link = _clean_link(link)
-                
+
+            for cleaned_link in _extract_links(url, res.text):
                 if cleaned_link in seen:
                     continue
-                
+
                 if _get_domain(cleaned_link) == base_domain:
                     seen.add(cleaned_link)
                     q.append((cleaned_link, depth + 1))
@@ -50,5 +132,407 @@ def bfs(seed_urls: list, base_domain_str: str, max_depth: int = 2, max_total: in
 
         except requests.RequestException:
             continue
-            
+
     return list(seen)
+
+
+class AsyncCrawler:
+    """
+    asyncio 版爬虫。
+    - 共用一个 keep-alive 的 httpx.AsyncClient 连接池
+    - 全局并发上限 + 每个主机的并发上限
+    - crawl()：按层并发抓取，但按队列顺序合并结果，因此 depth / max_total 语义与串行版一致
+    - crawl_best_first()：优先队列前沿，按 URL / 锚文本打分先展开有希望的分支
+    - 传入 state（CrawlState）时增量爬取：最近抓过的页面直接复用外链，
+      其余页面发条件请求，304 或内容哈希未变时不重新解析
+    - 传入 politeness（HostLimiter）时，多个爬虫（批量模式下的各城市）共享同一主机的最小请求间隔
+    - 先看响应头再决定是否读正文：扩展名是 PDF / 图片 / Office 的链接不发请求，
+      其余流式 GET 在 Content-Type 不是 HTML 时立即断开；HTML 正文最多读 max_html_bytes。
+      叶子的类型记在 self.leaves（url -> kind）
+    - 传入 store（Fetcher）时，完整读取的 HTML 写入共享的正文存储（summarizer 之后不再下载），
+      存储中 max_age 内的正文直接使用，不发请求
+    """
+
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY, per_host: int = DEFAULT_PER_HOST,
+                 timeout: float = DEFAULT_TIMEOUT, client: httpx.AsyncClient | None = None,
+                 state: CrawlState | None = None, max_age: float = CRAWL_STATE_MAX_AGE,
+                 use_sitemap: bool = False, politeness: HostLimiter | None = None,
+                 max_html_bytes: int = CRAWL_MAX_HTML_BYTES, head_probe: bool = CRAWL_HEAD_PROBE,
+                 store: Fetcher | None = None):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.state = state
+        self.max_age = max_age
+        self.use_sitemap = use_sitemap
+        self.politeness = politeness
+        self.max_html_bytes = max_html_bytes
+        self.head_probe = head_probe
+        self.store = store
+        self._client = client
+        self._global = None
+        self._hosts = {}
+        self._prev = {}
+        self._updates = {}
+        self.leaves = {}
+        self.stats = {}
+
+    def _count(self, key, n=1):
+        self.stats[key] = self.stats.get(key, 0) + n
+
+    def _host_sem(self, url):
+        host = _host(url)
+        if host not in self._hosts:
+            self._hosts[host] = asyncio.Semaphore(self.per_host)
+        return self._hosts[host]
+
+    def _record(self, url, depth, headers, content_hash, outlinks):
+        self._updates[url] = {
+            "url": url,
+            "depth": depth,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "content_hash": content_hash,
+            "content_type": headers.get("Content-Type", ""),
+            "outlinks": outlinks,
+            "fetched_at": time.time(),
+        }
+
+    async def _read_html(self, res) -> tuple[bytes, bool]:
+        """读取 HTML 正文，超过 max_html_bytes 时截断（不再继续下载）。返回 (body, 是否截断)。"""
+        body = bytearray()
+        async for chunk in res.aiter_bytes():
+            body += chunk
+            if len(body) > self.max_html_bytes:
+                self._count("truncated")
+                del body[self.max_html_bytes:]
+                return bytes(body), True
+        return bytes(body), False
+
+    async def _probe(self, client, url) -> str | None:
+        """HEAD 探测：确认是非 HTML 时返回叶子类型，否则（含不支持 HEAD）返回 None。"""
+        try:
+            with metrics.span("http_head"):
+                res = await client.head(url)
+        except httpx.HTTPError:
+            return None
+        self._count("head")
+        if res.status_code >= 400:
+            return None
+        return leaf_kind_from_type(res.headers.get("Content-Type", ""))
+
+    async def _fetch_links(self, client, url, depth=0):
+        """抓取一页并返回页面内的链接 [[url, anchor_text], ...]；非 HTML 或失败时返回空列表。"""
+        kind = leaf_kind_from_url(url)
+        if kind:
+            self.leaves[url] = kind
+            self._count("leaf_skipped")
+            return []
+
+        prev = self._prev.get(url)
+        if prev and time.time() - prev["fetched_at"] < self.max_age:
+            self._count("fresh")
+            if prev.get("content_hash") is None and prev.get("content_type") is not None:
+                kind = leaf_kind_from_type(prev["content_type"])
+                if kind:
+                    self.leaves[url] = kind
+            return _as_anchors(prev["outlinks"])
+
+        stored = await asyncio.to_thread(self.store.lookup, url, self.max_age) if self.store is not None else None
+        if stored is not None:
+            # summarizer / 下载器最近抓取过：直接用存储中的正文
+            self._count("stored")
+            headers = {"ETag": stored.etag, "Last-Modified": stored.last_modified,
+                       "Content-Type": stored.content_type}
+            kind = leaf_kind_from_type(stored.content_type)
+            body = b"" if kind else await asyncio.to_thread(stored.read)
+        else:
+            request_headers = {}
+            if prev:
+                if prev.get("etag"):
+                    request_headers["If-None-Match"] = prev["etag"]
+                if prev.get("last_modified"):
+                    request_headers["If-Modified-Since"] = prev["last_modified"]
+
+            # 先占主机槽再占全局槽：慢主机排队时不占用全局并发；
+            # 礼貌间隔在主机槽内、全局槽外等待，等待期间其他主机的请求照常进行
+            async with self._host_sem(url):
+                if self.politeness is not None:
+                    delay = self.politeness.reserve(url)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                async with self._global:
+                    if self.head_probe and not prev:
+                        kind = await self._probe(client, url)
+                        if kind:
+                            self.leaves[url] = kind
+                            self._count("leaf_head")
+                            return []
+                    try:
+                        with metrics.span("http_fetch"):
+                            async with client.stream("GET", url, headers=request_headers) as res:
+                                kind = None if res.status_code == 304 else leaf_kind_from_type(
+                                    res.headers.get("Content-Type", ""))
+                                # 非 HTML：只看响应头，不读正文直接断开连接
+                                body, truncated = (b"", False) if kind else await self._read_html(res)
+                    except httpx.HTTPError:
+                        return []
+            metrics.bytes_downloaded.inc(len(body), source="crawl")
+
+            if res.status_code == 304 and prev:
+                self._count("not_modified")
+                self._updates[url] = dict(prev, depth=min(depth, prev["depth"]), fetched_at=time.time())
+                return _as_anchors(prev["outlinks"])
+
+            headers = res.headers
+            if self.store is not None and not kind and not truncated and res.status_code == 200:
+                await asyncio.to_thread(self.store.put, url, res.status_code, headers, body)
+
+        if kind:
+            self.leaves[url] = kind
+            self._count("leaf_aborted")
+            if self.state is not None:
+                self._record(url, depth, headers, None, [])
+            return []
+
+        content_hash = hashlib.sha256(body).hexdigest()
+        if prev and prev.get("content_hash") == content_hash:
+            self._count("unchanged")
+            outlinks = _as_anchors(prev["outlinks"])
+        else:
+            self._count("parsed")
+            try:
+                text = body.decode(charset_of(headers.get("Content-Type", ""), body), errors="replace")
+                # 解析是 CPU 密集的，放到线程里避免阻塞事件循环
+                outlinks = await asyncio.to_thread(_extract_anchors, url, text)
+            except Exception:
+                return []
+        if self.state is not None:
+            self._record(url, depth, headers, content_hash, outlinks)
+        return outlinks
+
+    async def _sitemap_links(self, client, seed_urls, base_domain):
+        """读取各种子主机的 /sitemap.xml（支持一层 sitemapindex），返回同域名的 URL。"""
+        found = []
+        roots = dict.fromkeys(f"{urlparse(u).scheme}://{_host(u)}" for u in seed_urls if u.lower().startswith('http'))
+        for root in roots:
+            queue, visited = [f"{root}/sitemap.xml"], set()
+            while queue and len(visited) < 5:
+                sm_url = queue.pop(0)
+                visited.add(sm_url)
+                try:
+                    res = await client.get(sm_url)
+                    if res.status_code != 200:
+                        continue
+                except httpx.HTTPError:
+                    continue
+                locs = [html.unescape(m.strip()) for m in _LOC_RE.findall(res.text)]
+                if "<sitemapindex" in res.text:
+                    queue.extend(u for u in locs if u not in visited)
+                    continue
+                found.extend(_clean_link(u) for u in locs if _get_domain(u) == base_domain)
+        return found
+
+    def _open_client(self):
+        # 与 fetcher 的同步连接池同样的 User-Agent / 重定向设置
+        return self._client or fetcher.async_client(self.concurrency, self.timeout)
+
+    async def _begin(self, base_domain):
+        self._global = asyncio.Semaphore(self.concurrency)
+        self._hosts = {}
+        self._updates = {}
+        self.leaves = {}
+        self.stats = {}
+        self._prev = await asyncio.to_thread(self.state.load, base_domain) if self.state is not None else {}
+
+    async def _end(self, client, base_domain):
+        if self._client is None:
+            await client.aclose()
+        if self.state is not None and self._updates:
+            await asyncio.to_thread(self.state.save_many, base_domain, list(self._updates.values()))
+
+    async def crawl(self, seed_urls: list, base_domain_str: str, max_depth: int = 2, max_total: int = 120,
+                    progress=None):
+        """
+        按层的 BFS（与 bfs_serial 得到相同集合），返回 URL 列表。
+        progress(pages, links) 在每合并一页的结果后被调用（可选）。
+        """
+        seen = {_clean_link(url) for url in seed_urls}
+        base_domain = _base_domain(seed_urls, base_domain_str)
+        await self._begin(base_domain)
+        client = self._open_client()
+        pages = 0
+        try:
+            sitemap = await self._sitemap_links(client, seed_urls, base_domain) if self.use_sitemap else []
+            level = list(seed_urls)
+            depth = 0
+            while level and len(seen) < max_total and depth < max_depth:
+                urls = [u for u in level if u.lower().startswith('http')]
+                tasks = [asyncio.create_task(self._fetch_links(client, u, depth)) for u in urls]
+                next_level = []
+                try:
+                    # 按入队顺序消费结果，保证与串行 BFS 得到相同的集合
+                    for task in tasks:
+                        if len(seen) >= max_total:
+                            break
+                        for cleaned_link, _ in await task:
+                            if cleaned_link in seen:
+                                continue
+                            if _get_domain(cleaned_link) == base_domain:
+                                seen.add(cleaned_link)
+                                next_level.append(cleaned_link)
+                                if len(seen) >= max_total:
+                                    break
+                        pages += 1
+                        if progress:
+                            progress(pages, len(seen))
+                finally:
+                    for task in tasks:
+                        task.cancel()
+                    await asyncio.gather(*tasks, return_exceptions=True)
+                if depth == 0 and sitemap:
+                    # sitemap 中的 URL 视为种子页的直接链接（深度 1），排在页面链接之后
+                    for link in sitemap:
+                        if len(seen) >= max_total:
+                            break
+                        if link not in seen:
+                            seen.add(link)
+                            next_level.append(link)
+                level = next_level
+                depth += 1
+        finally:
+            await self._end(client, base_domain)
+
+        return list(seen)
+
+    async def crawl_best_first(self, seed_urls: list, base_domain_str: str, max_depth: int = 2,
+                               max_total: int = 120, progress=None) -> list:
+        """
+        优先队列前沿：按 link_scoring 的分数先展开最有希望的页面，把 max_total 的预算
+        花在可能的规制页面上。depth / max_total 的含义与 BFS 相同。
+        返回按分数降序排列的 CrawledLink 列表。
+        """
+        base_domain = _base_domain(seed_urls, base_domain_str)
+        await self._begin(base_domain)
+        client = self._open_client()
+
+        found = {}          # url -> CrawledLink
+        frontier = []       # (-score, seq, url, depth)
+        seq = 0
+
+        def discover(url, text, depth, parent_score):
+            nonlocal seq
+            if url in found or len(found) >= max_total:
+                return
+            score = score_link(url, text, depth, parent_score)
+            kind = leaf_kind_from_url(url) or "HTML"
+            found[url] = CrawledLink(url, score, depth, kind)
+            # 扩展名已表明是叶子的链接不进入前沿，也不发请求
+            if kind == "HTML" and depth < max_depth and url.lower().startswith('http'):
+                heapq.heappush(frontier, (-score, seq, url, depth))
+                seq += 1
+
+        # 种子页（搜索结果）总是最先展开，保持搜索排名的顺序
+        for i, url in enumerate(seed_urls):
+            url = _clean_link(url)
+            if url not in found:
+                kind = leaf_kind_from_url(url) or "HTML"
+                found[url] = CrawledLink(url, score_link(url), 0, kind)
+                if kind == "HTML" and max_depth > 0 and url.lower().startswith('http'):
+                    heapq.heappush(frontier, (float("-inf"), i, url, 0))
+        seq = len(seed_urls)
+
+        pages = 0
+        wake = asyncio.Event()
+        active = 0
+
+        async def worker():
+            nonlocal pages, active
+            while True:
+                if len(found) >= max_total:
+                    return
+                if not frontier:
+                    if active == 0:
+                        return
+                    wake.clear()
+                    await wake.wait()
+                    continue
+                _, _, url, depth = heapq.heappop(frontier)
+                active += 1
+                try:
+                    parent_score = found[url].score
+                    for link, text in await self._fetch_links(client, url, depth):
+                        if link not in found and _get_domain(link) == base_domain:
+                            discover(link, text, depth + 1, parent_score)
+                    if url in self.leaves:
+                        found[url] = found[url]._replace(kind=self.leaves[url])
+                    pages += 1
+                    if progress:
+                        progress(pages, len(found))
+                finally:
+                    active -= 1
+                    wake.set()
+
+        try:
+            if self.use_sitemap:
+                for link in await self._sitemap_links(client, seed_urls, base_domain):
+                    discover(link, "", 1, 0.0)
+            await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        finally:
+            await self._end(client, base_domain)
+
+        for kind, n in Counter(c.kind for c in found.values() if c.kind != "HTML").items():
+            self.stats[f"leaves_{kind.lower()}"] = n
+        return sorted(found.values(), key=lambda c: c.score, reverse=True)
+
+
+async def bfs_async(seed_urls: list, base_domain_str: str, max_depth: int = 2, max_total: int = 120,
+                    concurrency: int = DEFAULT_CONCURRENCY, per_host: int = DEFAULT_PER_HOST, progress=None,
+                    incremental: bool = True, use_sitemap: bool = False):
+    crawler = AsyncCrawler(concurrency=concurrency, per_host=per_host,
+                           state=crawl_state if incremental else None, use_sitemap=use_sitemap,
+                           store=fetcher if incremental else None)
+    links = await crawler.crawl(seed_urls, base_domain_str, max_depth=max_depth, max_total=max_total,
+                                progress=progress)
+    if crawler.stats:
+        print(f"♻️ [Crawl] {crawler.stats}")
+    return links
+
+
+def bfs(seed_urls: list, base_domain_str: str, max_depth: int = 2, max_total: int = 120,
+        concurrency: int = DEFAULT_CONCURRENCY, per_host: int = DEFAULT_PER_HOST, progress=None,
+        incremental: bool = True, use_sitemap: bool = False):
+    """
+    同步入口，内部使用并发的 AsyncCrawler（按层 BFS）。
+    incremental=True 时使用持久化的爬取状态；use_sitemap=True 时额外从 sitemap.xml 取种子。
+    """
+    return asyncio.run(bfs_async(seed_urls, base_domain_str, max_depth=max_depth, max_total=max_total,
+                                 concurrency=concurrency, per_host=per_host, progress=progress,
+                                 incremental=incremental, use_sitemap=use_sitemap))
+
+
+async def crawl_ranked_async(seed_urls: list, base_domain_str: str, max_depth: int = 2, max_total: int = 120,
+                             concurrency: int = DEFAULT_CONCURRENCY, per_host: int = DEFAULT_PER_HOST,
+                             progress=None, incremental: bool = True, use_sitemap: bool = False,
+                             politeness: HostLimiter | None = None) -> list:
+    crawler = AsyncCrawler(concurrency=concurrency, per_host=per_host,
+                           state=crawl_state if incremental else None, use_sitemap=use_sitemap,
+                           politeness=politeness, store=fetcher if incremental else None)
+    links = await crawler.crawl_best_first(seed_urls, base_domain_str, max_depth=max_depth,
+                                           max_total=max_total, progress=progress)
+    if crawler.stats:
+        print(f"♻️ [Crawl] {crawler.stats}")
+    return links
+
+
+def crawl_ranked(seed_urls: list, base_domain_str: str, max_depth: int = 2, max_total: int = 120,
+                 concurrency: int = DEFAULT_CONCURRENCY, per_host: int = DEFAULT_PER_HOST, progress=None,
+                 incremental: bool = True, use_sitemap: bool = False,
+                 politeness: HostLimiter | None = None) -> list:
+    """
+    同步入口（供 main_runner 调用）：best-first 爬取，返回按分数降序的 CrawledLink(url, score, depth)。
+    """
+    return asyncio.run(crawl_ranked_async(seed_urls, base_domain_str, max_depth=max_depth, max_total=max_total,
+                                          concurrency=concurrency, per_host=per_host, progress=progress,
+                                          incremental=incremental, use_sitemap=use_sitemap,
+                                          politeness=politeness))
@@ -0,0 +1,121 @@
+"""
+HTML からリンクと本文テキストを取り出す共通モジュール（link_crawler と summarizer が共用）。
+
+- "fast": 正規表現ベースのストリーミング・トークナイザ。DOM を構築しない
+- "bs4" : BeautifulSoup(html.parser)。fast が失敗した場合のフォールバック
+
+どちらのバックエンドも URL は urljoin + urldefrag で同じように正規化する。
+"""
+
+from __future__ import annotations
+import os
+import re
+import html as html_lib
+from functools import lru_cache
+from urllib.parse import urljoin, urldefrag
+
+DEFAULT_BACKEND = os.getenv("LINK_EXTRACT_BACKEND", "fast")
+BACKENDS = ("fast", "bs4")
+
+# タグ・コメント・宣言。属性値内の ">" にも対応する
+_TOKEN_RE = re.compile(
+    r"<!--.*?-->"
+    r"|<!\[CDATA\[.*?\]\]>"
+    r"|<[!?][^>]*>"
+    r"|<(/?)([a-zA-Z][\w:.-]*)((?:\"[^\"]*\"|'[^']*'|[^'\">])*)>",
+    re.S,
+)
+_HREF_RE = re.compile(r"""(?:^|\s)href\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))""", re.I)
+# 中身をテキストとして扱わない要素
+_RAW_TEXT_END = {
+    "script": re.compile(r"</script\s*>", re.I),
+    "style": re.compile(r"</style\s*>", re.I),
+    "template": re.compile(r"</template\s*>", re.I),
+}
+
+
+@lru_cache(maxsize=8192)
+def normalize_link(base_url: str, href: str) -> str:
+    return urldefrag(urljoin(base_url, href.strip()))[0]
+
+
+def _parse_fast(doc: str, base_url: str, want_text: bool = True):
+    """1 パスでテキスト断片と (url, anchor_text) を集める。"""
+    texts = []
+    anchors = []
+    anchor_href = None
+    anchor_text = []
+    pos = 0
+    n = len(doc)
+    while pos < n:
+        m = _TOKEN_RE.search(doc, pos)
+        end_text = m.start() if m else n
+        if end_text > pos and (want_text or anchor_href is not None):
+            chunk = doc[pos:end_text]
+            if "&" in chunk:
+                chunk = html_lib.unescape(chunk)
+            if want_text:
+                texts.append(chunk)
+            if anchor_href is not None:
+                anchor_text.append(chunk.strip())
+        if not m:
+            break
+        pos = m.end()
+        name = m.group(2)
+        if not name:
+            continue
+        name = name.lower()
+        closing = m.group(1) == "/"
+        if name == "a":
+            if anchor_href is not None:
+                anchors.append((anchor_href, "".join(anchor_text)))
+                anchor_href = None
+            if not closing:
+                h = _HREF_RE.search(m.group(3) or "")
+                if h:
+                    href = html_lib.unescape(next(g for g in h.groups() if g is not None))
+                    anchor_href = normalize_link(base_url, href)
+                    anchor_text = []
+        elif not closing and name in _RAW_TEXT_END:
+            end = _RAW_TEXT_END[name].search(doc, pos)
+            pos = end.end() if end else n
+    if anchor_href is not None:
+        anchors.append((anchor_href, "".join(anchor_text)))
+    return "".join(texts), anchors
+
+
+def _parse_bs4(doc: str, base_url: str, want_text: bool = True):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(doc, "html.parser")
+    anchors = [
+        (normalize_link(base_url, a["href"]), a.get_text(strip=True))
+        for a in soup.find_all("a", href=True)
+    ]
+    return (soup.get_text() if want_text else ""), anchors
+
+
+_PARSERS = {"fast": _parse_fast, "bs4": _parse_bs4}
+
+
+def parse_page(doc: str, base_url: str, backend: str | None = None, want_text: bool = True):
+    """(本文テキスト, [(url, anchor_text), ...]) を返す。"""
+    backend = backend or DEFAULT_BACKEND
+    try:
+        return _PARSERS[backend](doc, base_url, want_text)
+    except Exception as e:
+        if backend == "bs4":
+            raise
+        print(f"⚠️ fast link extraction failed for {base_url}, falling back to bs4: {e}")
+        return _parse_bs4(doc, base_url, want_text)
+
+
+def extract_links(doc: str, base_url: str, backend: str | None = None) -> list:
+    return [url for url, _ in parse_page(doc, base_url, backend, want_text=False)[1]]
+
+
+def extract_anchors(doc: str, base_url: str, backend: str | None = None) -> list:
+    return parse_page(doc, base_url, backend, want_text=False)[1]
+
+
+def extract_text(doc: str, backend: str | None = None) -> str:
+    return parse_page(doc, "", backend)[0]
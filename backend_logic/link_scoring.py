@@ -0,0 +1,60 @@
+"""
+クロールのフロンティア用の軽量スコアリング。URL パス・アンカーテキスト・キーワードだけで計算し、
+ネットワークや LLM は使わない。スコアが高いリンクほど先に展開・判定される。
+"""
+
+from __future__ import annotations
+from functools import lru_cache
+from urllib.parse import unquote, urlparse
+
+from .keywords import KEYWORDS
+from .ai_filter import EXCLUSION_PATTERNS
+
+# 検索キーワードに加えて、規制ページによく出る語
+_EXTRA_TERMS = ["都市計画", "建築", "開発", "指導要綱", "地区計画", "高さ", "斜線", "日影", "条例", "要綱", "規制"]
+TERMS = list(dict.fromkeys(KEYWORDS + _EXTRA_TERMS))
+
+# 市役所サイトの URL によく使われるローマ字
+PATH_HINTS = [
+    "toshikeikaku", "toshi", "keikaku", "kenchiku", "youto", "yoto", "kaihatsu", "shido",
+    "chiku", "machizukuri", "kenpei", "yoseki", "jorei", "zoning", "urban", "planning",
+]
+
+# ナビゲーション的なアンカーテキスト
+NAV_TEXT = ["トップ", "ホーム", "サイトマップ", "english", "お問い合わせ", "観光", "イベント", "子育て", "採用"]
+
+KEYWORD_WEIGHT = 3.0
+HINT_WEIGHT = 1.5
+PDF_BONUS = 1.0
+EXCLUSION_PENALTY = 5.0
+NAV_PENALTY = 2.0
+DEPTH_PENALTY = 0.5
+PARENT_WEIGHT = 0.3     # 親ページのスコアを子に引き継ぐ割合（有望な枝を先に掘る）
+
+
+@lru_cache(maxsize=16384)
+def _url_score(url: str) -> float:
+    path = unquote(urlparse(url).path + "?" + urlparse(url).query).lower()
+    score = 0.0
+    score += KEYWORD_WEIGHT * sum(1 for kw in TERMS if kw in path)
+    score += HINT_WEIGHT * sum(1 for hint in PATH_HINTS if hint in path)
+    if path.split("?")[0].endswith(".pdf"):
+        score += PDF_BONUS
+    url_lower = url.lower()
+    if any(pattern in url_lower for pattern in EXCLUSION_PATTERNS):
+        score -= EXCLUSION_PENALTY
+    if "category/" in url_lower and url_lower.count("-") > 5:
+        score -= EXCLUSION_PENALTY
+    return score
+
+
+def score_link(url: str, anchor_text: str = "", depth: int = 0, parent_score: float = 0.0) -> float:
+    score = _url_score(url)
+    if anchor_text:
+        text = anchor_text.lower()
+        score += KEYWORD_WEIGHT * sum(1 for kw in TERMS if kw in text)
+        if any(nav in text for nav in NAV_TEXT):
+            score -= NAV_PENALTY
+    score -= DEPTH_PENALTY * depth
+    score += PARENT_WEIGHT * max(parent_score, 0.0)
+    return round(score, 3)
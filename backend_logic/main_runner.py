@@ -3,119 +3,281 @@
 """
 
 from __future__ import annotations
-import os, time
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from urllib.parse import urlparse
+from urllib.parse import unquote, urlparse
+import time
 import urllib3
-import tldextract
-from dotenv import load_dotenv
 
-from .search_google import build_query, search_links
-from .ai_filter import is_link_relevant
-from .link_crawler import bfs
+from . import metrics
+from .jobs import emit_progress
+from .settings import get_settings
+
+from .keywords import KEYWORDS
+from .domains import registered_domain
+from .search_google import build_query, search_links, search_links_fanout
+from .ai_filter import classify_links
+from .link_crawler import crawl_ranked
 from .pdf_downloader import download_pdf_if_available
+from .rate_limit import download_limiter, HostLimiter
+from .findings_store import findings_store
+from .extraction import EXTRACT_ENABLED, ExtractionStage, aggregate_by_zone
+from .dedupe import DEDUPE_ENABLED, NearDuplicateIndex, fingerprint
+from .fetcher import fetcher
+from .link_crawler import leaf_kind_from_type
+from .boilerplate import BOILERPLATE_ENABLED, Page, extract_page, site_chrome
 
 urllib3.disable_warnings()
 
+# 每个关键词单独查询并合并结果（更好的种子链接，重复运行走缓存）
+SEARCH_FANOUT = os.getenv("SEARCH_FANOUT", "0") == "1"
 
-def run_analysis_for_city(city: str) -> dict:
-    """与本地版本完全一致的链接查找和过滤"""
-    load_dotenv()
-    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-    SERPER_API_KEY = os.getenv("SERPER_API_KEY")
-    
-    if not OPENAI_API_KEY or not SERPER_API_KEY:
-        raise RuntimeError("OPENAI_API_KEY と SERPER_API_KEY を設定してください。")
-
-    # 与本地版本完全一致的关键词
-    keywords = [
-        "都市計画図",
-        "用途地域", 
-        "建蔽率",
-        "容積率",
-        "開発指導要綱",
-        "建築基準法"
-    ]
-    
-    query = build_query(city, keywords)
+# 爬取时是否额外读取 sitemap.xml 作为种子
+CRAWL_USE_SITEMAP = os.getenv("CRAWL_USE_SITEMAP", "0") == "1"
+
+# 过滤 + 下载流水线的并发参数
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", 4))
+CLASSIFY_WINDOW = 40   # 每次按顺序送去判定的链接数
+
+
+def _download_link(url: str, pdf_dir: Path) -> dict:
+    """下载一个 PDF（受每主机限流约束），返回要合并进 link_info 的字段。"""
+    try:
+        with download_limiter.limit(url):
+            # 爬虫已按扩展名或 Content-Type 确认是 PDF
+            pdf_path = download_pdf_if_available(url, str(pdf_dir), known_pdf=True)
+    except Exception as e:
+        print(f"⚠️ PDF download error for {url}: {e}")
+        pdf_path = None
+    if pdf_path:
+        return {"downloaded": True, "local_path": f"/files/{Path(pdf_path).name}"}
+    return {"downloaded": False}
+
+
+def _pdf_filename(link: dict) -> str:
+    """报告中显示的文件名：URL 路径的末段；没有扩展名或带查询参数的下载 URL 退回到本地文件名。"""
+    name = unquote(os.path.basename(urlparse(link["url"]).path))
+    if not name.lower().endswith(".pdf"):
+        name = os.path.basename(link["local_path"])
+    return name
+
+
+def _stored_page(url: str) -> Page | None:
+    """爬虫已存入 fetch 存储的 HTML 正文分块后的结果；没有正文或不是 HTML 时为 None。"""
+    stored = fetcher.lookup(url)
+    if stored is None or leaf_kind_from_type(stored.content_type):
+        return None
+    return extract_page(stored.text(), url)
+
+
+def _learn_site_chrome(crawled_links: list) -> dict:
+    """
+    把爬取时读取过正文的页面分块，计入各主机的站点公共部分统计（抽取时据此去掉导航、页脚等）。
+    返回 {url: Page}，供判定前的重复检测使用。
+    """
+    with ThreadPoolExecutor(max_workers=PIPELINE_WORKERS) as pool:
+        pages = dict(zip(crawled_links, pool.map(_stored_page, crawled_links)))
+    if BOILERPLATE_ENABLED:
+        for url, page in pages.items():
+            if page is not None:
+                site_chrome.observe(url, page)
+    return pages
+
+
+def _collapse_duplicates(crawled_links: list, pages: dict, index: NearDuplicateIndex) -> list:
+    """
+    判定前按正文（去掉站点公共部分后）合并近似重复的页面（印刷版、手机版、镜像等），保留排名最靠前的一个。
+    只有爬取时读取过正文的页面参与；其余链接原样保留。
+    """
+    kept = []
+    for url in crawled_links:
+        page = pages.get(url)
+        fp = fingerprint("\n".join(b.text for b in site_chrome.strip(url, page)[0])) if page else None
+        if index.add(url, fp) is None:
+            kept.append(url)
+    return kept
+
+
+def _filter_and_download(crawled_links: list, city: str, base_domain: str, key: str,
+                         pdf_dir: Path, max_process: int, progress=None, scores: dict | None = None,
+                         kinds: dict | None = None, extraction: ExtractionStage | None = None) -> list:
+    """
+    按爬取顺序（best-first 时即分数降序）分窗口批量判定相关性，取前 max_process 个相关链接；
+    PDF 在判定出相关后立即交给有界线程池下载。节奏由 rate_limit 中的限流器控制，不再固定 sleep。
+    kinds 为爬虫判定的链接类型（HTML / PDF / IMAGE / OFFICE / OTHER），没有时按扩展名判断。
+    传入 extraction 时，相关 HTML 立即、PDF 下载完成后提交规制抽取，与后续的判定并行。
+    """
+    relevant = []
+    with ThreadPoolExecutor(max_workers=PIPELINE_WORKERS) as pool:
+        downloads = {}
+        for start in range(0, len(crawled_links), CLASSIFY_WINDOW):
+            if len(relevant) >= max_process:
+                print(f"Reached max_links limit of {max_process}. Stopping processing.")
+                break
+            window = crawled_links[start:start + CLASSIFY_WINDOW]
+            print(f"🔄 Progress: {start}/{len(crawled_links)} links checked, {len(relevant)} relevant found")
+            try:
+                with metrics.span("classify"):
+                    verdicts = classify_links(window, city, base_domain, key)
+            except Exception as e:
+                print(f"⚠️ [Filter Error] window {start}: {e}")
+                continue
+
+            for url in window:
+                if len(relevant) >= max_process:
+                    break
+                if not verdicts.get(url, False):
+                    print(f"❌ [Filter] Skipping irrelevant link: {url}")
+                    continue
+                print(f"✅ [Relevant] Processing link ({len(relevant) + 1}/{max_process}): {url}")
+                kind = (kinds or {}).get(url) or ("PDF" if url.lower().endswith(".pdf") else "HTML")
+                is_pdf = kind == "PDF"
+                relevant.append({
+                    "url": url,
+                    "type": kind,
+                    "status": "relevant",
+                    "score": (scores or {}).get(url)
+                })
+                emit_progress(progress, "relevant_link", url=url, type=relevant[-1]["type"], index=len(relevant))
+                if is_pdf:
+                    downloads[url] = metrics.submit(pool, _download_link, url, pdf_dir)
+                    if extraction is not None:
+                        extraction.submit_after_download(downloads[url], url, pdf_dir)
+                elif extraction is not None and kind == "HTML":
+                    extraction.submit(url, url)
+
+        # 保持原有输出顺序：按相关链接的顺序合并下载结果
+        for link_info in relevant:
+            future = downloads.get(link_info["url"])
+            link_info.update(future.result() if future else {"downloaded": False})
+    return relevant
+
+
+def run_analysis_for_city(city: str, progress=None, fanout: bool | None = None,
+                          politeness: HostLimiter | None = None) -> dict:
+    """
+    与本地版本完全一致的链接查找和过滤。
+    progress(event, **data) 可选，用于向后台任务推送进度（seed_search / crawl / relevant_link / document_extracted）。
+    fanout 为 True 时按关键词分别搜索并合并（默认取环境变量 SEARCH_FANOUT）。
+    politeness 可选，批量模式下各城市的爬取共用同一个按主机的请求间隔。
+    本次运行各阶段 / 外部调用的耗时与计数器写入 statistics["timings"]。
+    """
+    start = time.perf_counter()
+    with metrics.track_run() as run:
+        with metrics.span("analysis"):
+            result = _analyze_city(city, progress, fanout, politeness)
+    if "statistics" in result:
+        result["statistics"]["timings"] = dict(run.to_dict(), total_seconds=round(time.perf_counter() - start, 3))
+    return result
+
+
+def _analyze_city(city: str, progress, fanout: bool | None, politeness: HostLimiter | None) -> dict:
+    OPENAI_API_KEY, SERPER_API_KEY = get_settings().require_api_keys()
+
+    query = build_query(city, KEYWORDS)
     print(f"🔍 Initial Search Query: {query}")
 
     # 与本地版本一致的搜索参数
-    seed_links = search_links(query, SERPER_API_KEY, num_results=10)
+    use_fanout = SEARCH_FANOUT if fanout is None else fanout
+    with metrics.span("search"):
+        if use_fanout:
+            seed_links = search_links_fanout(city, KEYWORDS, SERPER_API_KEY, num_results=10)
+        else:
+            seed_links = search_links(query, SERPER_API_KEY, num_results=10)
     print(f"🌱 Found {len(seed_links)} seed links.")
+    emit_progress(progress, "seed_search", query=query, seed_count=len(seed_links))
     
     if not seed_links:
         return {"error": "シードリンクが取得できませんでした。"}
 
     # 与本地版本完全一致的爬虫参数
-    crawled_links = bfs(seed_links, seed_links[0], max_depth=2, max_total=120)
+    # best-first 爬取：按分数降序返回，先判定最有希望的链接
+    with metrics.span("crawl"):
+        ranked = crawl_ranked(seed_links, seed_links[0], max_depth=2, max_total=120,
+                              use_sitemap=CRAWL_USE_SITEMAP, politeness=politeness,
+                              progress=lambda pages, links: emit_progress(progress, "crawl", pages=pages, links=links))
+    crawled_links = [c.url for c in ranked]
+    scores = {c.url: c.score for c in ranked}
+    kinds = {c.url: c.kind for c in ranked}
+    link_types = dict(Counter(c.kind for c in ranked))
     print(f"🔗 Crawled to {len(crawled_links)} total unique links (including seeds).")
+    emit_progress(progress, "crawl_done", links=len(crawled_links))
 
     pdf_dir = Path("downloaded_pdfs")
     pdf_dir.mkdir(exist_ok=True)
 
-    relevant_links = []
-    pdf_downloads = []
-    processed_count = 0
-    
     # 修复域名过滤问题：使用与本地版本一致的方式提取域名
-    base_domain = tldextract.extract(seed_links[0]).registered_domain if seed_links else ""
+    base_domain = registered_domain(seed_links[0]) if seed_links else ""
     print(f"🏠 Base domain for filtering: {base_domain}")
     
+    # 已抓取页面的分块：学习站点公共部分，并用于重复检测
+    pages = {}
+    if BOILERPLATE_ENABLED or DEDUPE_ENABLED:
+        with metrics.span("boilerplate"):
+            pages = _learn_site_chrome(crawled_links)
+
+    # 近似重复的页面只判定 / 抽取一次
+    page_index = NearDuplicateIndex() if DEDUPE_ENABLED else None
+    candidates = crawled_links
+    if page_index is not None:
+        with metrics.span("dedupe"):
+            candidates = _collapse_duplicates(crawled_links, pages, page_index)
+        print(f"♊ [Dedupe] {len(crawled_links) - len(candidates)} near-duplicate pages collapsed before classification")
+
     # 与本地版本一致的处理数量
-    max_process = min(30, len(crawled_links))  # 恢复到30个
-    
-    # 与本地版本一致的处理逻辑
-    for i, url in enumerate(crawled_links):
-        if processed_count >= max_process:
-            print(f"Reached max_links limit of {max_process}. Stopping processing.")
-            break
-        
-        # 每5个链接输出一次进度
-        if i % 5 == 0:
-            print(f"🔄 Progress: {i}/{len(crawled_links)} links checked, {processed_count} relevant found")
-        
-        try:
-            if not is_link_relevant(url, city, base_domain, OPENAI_API_KEY):
-                print(f"❌ [Filter] Skipping irrelevant link: {url}")
-                continue
-        except Exception as e:
-            print(f"⚠️ [Filter Error] {url}: {e}")
-            continue
-        
-        print(f"✅ [Relevant] Processing link ({processed_count + 1}/{max_process}): {url}")
-        
-        link_info = {
-            "url": url,
-            "type": "PDF" if url.lower().endswith(".pdf") else "HTML",
-            "status": "relevant"
+    max_process = min(30, len(candidates))  # 恢复到30个
+
+    document_index = NearDuplicateIndex() if DEDUPE_ENABLED else None
+    extraction = ExtractionStage(city, OPENAI_API_KEY, progress=progress,
+                                 index=document_index) if EXTRACT_ENABLED else None
+    try:
+        with metrics.span("filter"):
+            relevant_links = _filter_and_download(candidates, city, base_domain, OPENAI_API_KEY, pdf_dir,
+                                                  max_process, progress=progress, scores=scores, kinds=kinds,
+                                                  extraction=extraction)
+        # 判定与下载结束时大部分文档已在抽取中，这里只等待剩余的
+        with metrics.span("extract"):
+            extracted = extraction.results() if extraction is not None else {}
+    finally:
+        if extraction is not None:
+            extraction.close()
+    for link in relevant_links:
+        if link["url"] in extracted:
+            link["findings_count"] = len(extracted[link["url"]].get("findings", []))
+            if extracted[link["url"]].get("duplicate_of"):
+                link["duplicate_of"] = extracted[link["url"]]["duplicate_of"]
+            if extracted[link["url"]].get("input_tokens"):
+                link["input_tokens"] = extracted[link["url"]]["input_tokens"]
+            if extracted[link["url"]].get("dropped_chunks"):
+                # 文档过长，超出 SUMMARY_MAX_CHUNKS 的块未抽取
+                link["dropped_chunks"] = extracted[link["url"]]["dropped_chunks"]
+        # canonical 文档保留被合并的 URL
+        duplicates = [
+            dup for index in (page_index, document_index) if index is not None
+            for dup in index.duplicates.get(link["url"], [])
+        ]
+        if duplicates:
+            link["duplicates"] = duplicates
+    findings_by_zone = aggregate_by_zone(extracted)
+    findings_count = sum(len(d.get("findings", [])) for d in extracted.values())
+    truncated_documents = sum(1 for d in extracted.values() if d.get("dropped_chunks"))
+    token_docs = {url: d["input_tokens"] for url, d in extracted.items() if d.get("input_tokens")}
+    input_tokens = {
+        "documents": len(token_docs),
+        **{k: sum(t[k] for t in token_docs.values()) for k in ("raw", "sent", "saved")},
+    }
+    # 相关链接写入 findings 存储（后台批量写入），供跨城市查询时回溯来源
+    findings_store.record_links(city, relevant_links)
+    pdf_downloads = [
+        {
+            "original_url": link["url"],
+            "local_path": link["local_path"],
+            "filename": _pdf_filename(link),
         }
-        
-        # 尝试下载PDF
-        if url.lower().endswith(".pdf"):
-            try:
-                pdf_path = download_pdf_if_available(url, str(pdf_dir))
-                if pdf_path:
-                    link_info["downloaded"] = True
-                    link_info["local_path"] = f"/files/{Path(pdf_path).name}"
-                    pdf_downloads.append({
-                        "original_url": url,
-                        "local_path": f"/files/{Path(pdf_path).name}",
-                        "filename": Path(pdf_path).name
-                    })
-                else:
-                    link_info["downloaded"] = False
-            except Exception as e:
-                print(f"⚠️ PDF download error for {url}: {e}")
-                link_info["downloaded"] = False
-        else:
-            link_info["downloaded"] = False
-        
-        relevant_links.append(link_info)
-        processed_count += 1
-        
-        # 与本地版本一致的延迟
-        time.sleep(1.5)  # 恢复到1.5秒
+        for link in relevant_links if link.get("downloaded")
+    ]
 
     # 生成简化报告
     report_content = f"# {city} 建築規制関連リンク調査結果\n\n"
@@ -123,9 +285,15 @@ def run_analysis_for_city(city: str) -> dict:
     report_content += f"- 検索クエリ: {query}\n"
     report_content += f"- 初期検索結果: {len(seed_links)} 件\n"
     report_content += f"- クロール総数: {len(crawled_links)} 件\n"
+    if page_index is not None:
+        report_content += f"- 重複ページとして統合: {len(crawled_links) - len(candidates)} 件\n"
     report_content += f"- 処理対象: {max_process} 件\n"
     report_content += f"- 関連性の高いリンク: {len(relevant_links)} 件\n"
-    report_content += f"- ダウンロード成功PDF: {len(pdf_downloads)} 件\n\n"
+    report_content += f"- ダウンロード成功PDF: {len(pdf_downloads)} 件\n"
+    report_content += f"- 規制抽出: {len(extracted)} 文書から {findings_count} 件\n"
+    if truncated_documents:
+        report_content += f"- 長すぎて一部のみ抽出した文書: {truncated_documents} 件\n"
+    report_content += "\n"
     
     if relevant_links:
         report_content += "## 関連性の高いリンク一覧\n\n"
@@ -135,7 +303,7 @@ def run_analysis_for_city(city: str) -> dict:
             if link['downloaded']:
                 report_content += f"- ダウンロード: 成功 ({link['local_path']})\n"
             else:
-                report_content += f"- ダウンロード: {'PDF以外' if not link['url'].lower().endswith('.pdf') else '失敗'}\n"
+                report_content += f"- ダウンロード: {'PDF以外' if link['type'] != 'PDF' else '失敗'}\n"
             report_content += "\n"
     else:
         report_content += "## 結果\n\n"
@@ -143,6 +311,25 @@ def run_analysis_for_city(city: str) -> dict:
         report_content += "- AIフィルターの判定が厳しすぎる可能性があります\n"
         report_content += "- 別の都市で試してみてください\n\n"
     
+    if findings_by_zone:
+        report_content += "## 抽出された規制（用途地域別）\n\n"
+        for zone, regulations in findings_by_zone.items():
+            report_content += f"### {zone}\n"
+            for regulation_type, items in regulations.items():
+                for item in items:
+                    plan = f"（{item['district_plan_name']}）" if item["district_plan_name"] else ""
+                    condition = f" ※{item['condition']}" if item["condition"] else ""
+                    report_content += f"- {regulation_type}{plan}: {item['value']}{condition}\n"
+            report_content += "\n"
+
+    if token_docs:
+        report_content += "## LLM入力トークン（ナビゲーション等の除去）\n\n"
+        for url, t in token_docs.items():
+            ratio = t["saved"] / t["raw"] * 100 if t["raw"] else 0
+            report_content += f"- {url}: {t['raw']} → {t['sent']} トークン（{t['saved']} 削減, {ratio:.0f}%）\n"
+        total_ratio = input_tokens["saved"] / input_tokens["raw"] * 100 if input_tokens["raw"] else 0
+        report_content += f"- 合計: {input_tokens['saved']} トークン削減（{total_ratio:.0f}%）\n\n"
+
     if pdf_downloads:
         report_content += "## ダウンロード済みPDFファイル\n\n"
         for pdf in pdf_downloads:
@@ -154,10 +341,20 @@ def run_analysis_for_city(city: str) -> dict:
         "report": report_content,
         "relevant_links": relevant_links,
         "pdf_downloads": pdf_downloads,
+        "findings_by_zone": findings_by_zone,
         "statistics": {
             "total_crawled": len(crawled_links),
+            "link_types": link_types,
             "processed_count": max_process,
             "relevant_count": len(relevant_links),
-            "pdf_count": len(pdf_downloads)
+            "pdf_count": len(pdf_downloads),
+            "extracted_documents": len(extracted),
+            "findings_count": findings_count,
+            "input_tokens": input_tokens,
+            "truncated_documents": truncated_documents,
+            "duplicates": {
+                "before_classification": page_index.stats() if page_index is not None else None,
+                "before_extraction": document_index.stats() if document_index is not None else None,
+            }
         }
     }
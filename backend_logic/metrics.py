@@ -0,0 +1,185 @@
+"""
+进程内指标：计时 span + 计数器，以 Prometheus 文本格式导出（/metrics），不依赖 prometheus_client。
+
+- span(name)：记录各阶段（search / crawl / filter / download / report）与各外部调用
+  （serper / openai / vision / http_fetch）的耗时，出错时另计 errors
+- 计数器：下载字节数、缓存命中 / 未命中、LLM token 数、去掉站点公共部分节省的输入 token 数
+- 每次 run_analysis_for_city 通过 track_run() 收集本次运行的汇总，写入 statistics["timings"]。
+  运行信息保存在 contextvar 中；提交到线程池的任务需经 submit() 才能带上当前运行
+"""
+
+from __future__ import annotations
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_registry = []
+_current_run = contextvars.ContextVar("metrics_run", default=None)
+
+
+def _label_str(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class RunStats:
+    """一次运行内的汇总：各 span 的次数与总秒数、各计数器的合计。"""
+
+    def __init__(self):
+        self.spans = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, seconds: float) -> None:
+        with self._lock:
+            count, total = self.spans.get(name, (0, 0.0))
+            self.spans[name] = (count + 1, total + seconds)
+
+    def add(self, name: str, value: float) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "spans": {name: {"count": c, "seconds": round(s, 3)} for name, (c, s) in self.spans.items()},
+                "counters": dict(self.counters),
+            }
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, value: float = 1, **labels) -> None:
+        key = tuple(labels.get(k, "") for k in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+        run = _current_run.get()
+        if run is not None:
+            # 运行内的汇总按 "名称:首个标签" 合计，例如 cache_hits:verdicts
+            suffix = f":{key[0]}" if key else ""
+            run.add(self.name.removeprefix("law_checker_").removesuffix("_total") + suffix, value)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_str(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = _BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._values = {}      # key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels.get(k, "") for k in self.labelnames)
+        with self._lock:
+            state = self._values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                for bound, n in zip(self.buckets, state):
+                    le = 'le="%s"' % bound
+                    lines.append(f"{self.name}_bucket{_label_str(self.labelnames, key, le)} {n}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_label_str(self.labelnames, key, le)} {state[-1]}")
+                lines.append(f"{self.name}_sum{_label_str(self.labelnames, key)} {state[-2]:.6f}")
+                lines.append(f"{self.name}_count{_label_str(self.labelnames, key)} {state[-1]}")
+        return lines
+
+
+span_seconds = Histogram("law_checker_span_seconds", "Duration of pipeline stages and external calls.", ("span",))
+span_errors = Counter("law_checker_span_errors_total", "Spans that ended with an exception.", ("span",))
+bytes_downloaded = Counter("law_checker_bytes_downloaded_total", "Response bytes downloaded.", ("source",))
+cache_hits = Counter("law_checker_cache_hits_total", "Disk cache hits.", ("cache",))
+cache_misses = Counter("law_checker_cache_misses_total", "Disk cache misses.", ("cache",))
+llm_tokens = Counter("law_checker_llm_tokens_total", "LLM tokens reported by the API.", ("kind", "model"))
+dropped_chunks = Counter("law_checker_dropped_chunks_total",
+                         "Document chunks past SUMMARY_MAX_CHUNKS that were not extracted.")
+llm_input_tokens_saved = Counter("law_checker_llm_input_tokens_saved_total",
+                                 "Prompt tokens removed by boilerplate stripping before extraction.", ("source",))
+runs = Counter("law_checker_runs_total", "Completed analysis runs.", ("status",))
+
+
+def observe(name: str, seconds: float) -> None:
+    """直接记录一段已知耗时（例如限流器的等待时间）。"""
+    span_seconds.observe(seconds, span=name)
+    run = _current_run.get()
+    if run is not None:
+        run.add_span(name, seconds)
+
+
+@contextmanager
+def span(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        span_errors.inc(span=name)
+        raise
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+def record_usage(response, model: str) -> None:
+    """从 OpenAI 响应的 usage 中累计 token 数。"""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    llm_tokens.inc(getattr(usage, "prompt_tokens", 0) or 0, kind="prompt", model=model)
+    llm_tokens.inc(getattr(usage, "completion_tokens", 0) or 0, kind="completion", model=model)
+
+
+@contextmanager
+def track_run():
+    """在当前上下文中收集本次运行的 span 与计数器，yield RunStats。"""
+    run = RunStats()
+    token = _current_run.set(run)
+    status = "error"
+    try:
+        yield run
+        status = "ok"
+    finally:
+        _current_run.reset(token)
+        runs.inc(status=status)
+
+
+def submit(pool, fn, *args, **kwargs):
+    """pool.submit 的替代：任务在提交时的上下文中执行，span 仍计入当前运行。"""
+    return pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,194 @@
+"""
+扫描页 OCR 阶段。
+
+- 栅格化在进程池中并行（PyMuPDF 不支持多线程），可降分辨率 / 转灰度以减小图像
+- 识别按批提交给后端，同时在途的批次数有上限
+- 后端可插拔：VisionOCRBackend 复用一个 ImageAnnotatorClient 并使用 batch_annotate_images；
+  FakeOCRBackend 不需要 Google 凭证，用于测试吞吐
+
+worker 进程只 import 本模块（vision 在首次使用时才加载）。
+"""
+
+from __future__ import annotations
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import metrics
+from .settings import get_settings
+
+OCR_DPI = int(os.getenv("OCR_DPI", 200))
+OCR_GRAYSCALE = os.getenv("OCR_GRAYSCALE", "1") == "1"
+OCR_MAX_PIXELS = int(os.getenv("OCR_MAX_PIXELS", 12_000_000))   # 单页像素上限，超过则再降分辨率
+OCR_BATCH_SIZE = int(os.getenv("OCR_BATCH_SIZE", 8))             # Vision 每个请求最多 16 张
+OCR_MAX_IN_FLIGHT = int(os.getenv("OCR_MAX_IN_FLIGHT", 2))
+
+
+class OCRBackend:
+    """recognize(images) 接收 PNG 字节列表，按顺序返回识别文本。"""
+
+    name = "base"
+
+    def recognize(self, images: list) -> list:
+        raise NotImplementedError
+
+
+class VisionOCRBackend(OCRBackend):
+    name = "vision"
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _get_client(self):
+        with self._lock:
+            if self._client is None:
+                from google.cloud import vision_v1 as vision
+                self._client = vision.ImageAnnotatorClient()
+            return self._client
+
+    def recognize(self, images: list) -> list:
+        from google.cloud import vision_v1 as vision
+        feature = vision.Feature(type_=vision.Feature.Type.TEXT_DETECTION)
+        requests = [
+            vision.AnnotateImageRequest(image=vision.Image(content=content), features=[feature])
+            for content in images
+        ]
+        try:
+            with metrics.span("vision"):
+                response = self._get_client().batch_annotate_images(requests=requests)
+        except Exception as e:
+            print(f"Vision API OCR error: {e}")
+            return ["[OCR ERROR]"] * len(images)
+        out = []
+        for r in response.responses:
+            if r.error.message:
+                print(f"Vision API OCR error: {r.error.message}")
+                out.append("[OCR ERROR]")
+            else:
+                out.append(r.text_annotations[0].description if r.text_annotations else "")
+        return out
+
+
+class FakeOCRBackend(OCRBackend):
+    """本地替身：模拟每批请求的延迟，返回固定文本。"""
+
+    name = "fake"
+
+    def __init__(self, latency: float = 0.5, per_image: float = 0.05, text: str = "OCR テキスト"):
+        self.latency = latency
+        self.per_image = per_image
+        self.text = text
+        self.calls = 0
+        self.images = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def recognize(self, images: list) -> list:
+        with self._lock:
+            self.calls += 1
+            self.images += len(images)
+            self.bytes += sum(len(b) for b in images)
+        time.sleep(self.latency + self.per_image * len(images))
+        return [f"{self.text} ({len(b)} bytes)" for b in images]
+
+
+_default_backend = None
+_default_lock = threading.Lock()
+
+
+def default_backend() -> OCRBackend | None:
+    """Vision 可用（凭证已就绪且能导入客户端库）时返回共享的 VisionOCRBackend，否则返回 None。"""
+    global _default_backend
+    with _default_lock:
+        if _default_backend is None:
+            # 凭证缺失或初始化失败时每页都会在 batch_annotate_images 报错，直接不启用
+            if not get_settings().google_credentials:
+                return None
+            try:
+                from google.cloud import vision_v1  # noqa: F401
+            except ImportError:
+                return None
+            _default_backend = VisionOCRBackend()
+        return _default_backend
+
+
+def rasterize_pages(path: str, pages: list, dpi: int = OCR_DPI, grayscale: bool = OCR_GRAYSCALE,
+                    max_pixels: int = OCR_MAX_PIXELS) -> list:
+    """worker 中执行：打开一次文档，把给定页渲染为 PNG，返回 [(page, png_bytes), ...]。"""
+    import fitz
+    out = []
+    doc = fitz.open(path)
+    try:
+        for i in pages:
+            page = doc[i]
+            page_dpi = dpi
+            w_in, h_in = page.rect.width / 72, page.rect.height / 72
+            if w_in * h_in * page_dpi * page_dpi > max_pixels:
+                page_dpi = int((max_pixels / (w_in * h_in)) ** 0.5)
+            pix = page.get_pixmap(dpi=page_dpi, colorspace=fitz.csGRAY if grayscale else fitz.csRGB)
+            out.append((i, pix.tobytes("png")))
+            pix = None
+    finally:
+        doc.close()
+    return out
+
+
+class OCRStage:
+    def __init__(self, backend: OCRBackend, dpi: int = OCR_DPI, grayscale: bool = OCR_GRAYSCALE,
+                 max_pixels: int = OCR_MAX_PIXELS, batch_size: int = OCR_BATCH_SIZE,
+                 max_in_flight: int = OCR_MAX_IN_FLIGHT, pool=None):
+        self.backend = backend
+        self.dpi = dpi
+        self.grayscale = grayscale
+        self.max_pixels = max_pixels
+        self.batch_size = max(1, min(batch_size, 16))
+        self.max_in_flight = max(1, max_in_flight)
+        self.pool = pool
+
+    def _recognize_batch(self, batch: list) -> dict:
+        try:
+            texts = self.backend.recognize([png for _, png in batch])
+        except Exception as e:
+            print(f"OCR backend {self.backend.name} error: {e}")
+            texts = ["[OCR ERROR]"] * len(batch)
+        return {i: text for (i, _), text in zip(batch, texts)}
+
+    def run(self, path: str, pages: list) -> dict:
+        """对给定页做 OCR，返回 {page: text}。"""
+        if not pages:
+            return {}
+        if self.pool is None:
+            from .pdf_text import get_process_pool
+            self.pool = get_process_pool()
+
+        chunks = [pages[i:i + self.batch_size] for i in range(0, len(pages), self.batch_size)]
+        # 栅格化并行进行；识别线程池的大小即在途批次上限。
+        # 为限制内存，已栅格化但未识别的批次最多保留 max_in_flight 个
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as senders:
+            raster = [self.pool.submit(rasterize_pages, path, chunk, self.dpi, self.grayscale, self.max_pixels)
+                      for chunk in chunks[:self.max_in_flight]]
+            sending = []
+            next_chunk = len(raster)
+            while raster:
+                future = raster.pop(0)
+                try:
+                    batch = future.result()
+                except Exception as e:
+                    print(f"OCR rasterization failed in {path}: {e}")
+                    batch = []
+                sending.append(senders.submit(self._recognize_batch, batch))
+                if next_chunk < len(chunks):
+                    raster.append(self.pool.submit(rasterize_pages, path, chunks[next_chunk],
+                                                   self.dpi, self.grayscale, self.max_pixels))
+                    next_chunk += 1
+                if len(sending) >= self.max_in_flight:
+                    results.update(sending.pop(0).result())
+            for f in sending:
+                results.update(f.result())
+
+        for i in pages:
+            results.setdefault(i, "[OCR PROCESSING ERROR]")
+        return results
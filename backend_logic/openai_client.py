@@ -0,0 +1,33 @@
+"""
+按 API key 复用 OpenAI 客户端，所有调用共用一个 httpx 连接池（避免每次请求重新握手）。
+openai 包在第一次创建客户端时才导入（导入约需 0.6 秒，不计入冷启动）。
+"""
+
+from __future__ import annotations
+import threading
+from typing import TYPE_CHECKING
+
+import httpx
+
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+MAX_CONNECTIONS = 16
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(key: str) -> OpenAI:
+    with _clients_lock:
+        cli = _clients.get(key)
+        if cli is None:
+            from openai import OpenAI
+            http_client = httpx.Client(
+                verify=False,
+                limits=httpx.Limits(max_connections=MAX_CONNECTIONS,
+                                    max_keepalive_connections=MAX_CONNECTIONS),
+            )
+            cli = OpenAI(api_key=key, http_client=http_client)
+            _clients[key] = cli
+        return cli
@@ -1,30 +1,33 @@
 import os
-import requests
-import urllib3
+import httpx
 from urllib.parse import urlparse
 from pathlib import Path
 
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+from . import metrics
+from .fetcher import fetcher
 
-def download_pdf_if_available(url: str, save_dir: str = "downloaded_pdfs") -> str | None:
-    if not url.lower().endswith(".pdf"):
-        return None
+MAX_PDF_BYTES = int(os.getenv("MAX_PDF_BYTES", 100 * 1024 * 1024))
 
-    os.makedirs(save_dir, exist_ok=True)
-    fname = os.path.basename(urlparse(url).path)
-    path = os.path.join(save_dir, fname)
 
-    if os.path.exists(path):
-        print(f"PDF already exists, skipping download: {path}")
-        return path
+def download_pdf_if_available(url: str, save_dir: str = "downloaded_pdfs", known_pdf: bool = False) -> str | None:
+    """
+    经共享抓取层（fetcher）获取 PDF，按内容哈希放到 <save_dir>/<sha256>.pdf 并返回路径。
+    最近抓取过的 URL 直接复用存储中的正文，过期的带 ETag / Last-Modified 做条件请求。
+    known_pdf=True 表示调用方已从 Content-Type 确认是 PDF（URL 可以没有 .pdf 扩展名）。
+    """
+    if not known_pdf and not url.lower().endswith(".pdf"):
+        return None
 
+    fname = os.path.basename(urlparse(url).path)
     try:
-        res = requests.get(url, timeout=20, verify=False)
-        res.raise_for_status()
-        with open(path, "wb") as f:
-            f.write(res.content)
-        print(f"Successfully downloaded {fname}")
-        return path
-    except requests.exceptions.RequestException as e:
+        with metrics.span("pdf_download"):
+            fetched = fetcher.fetch(url, max_bytes=MAX_PDF_BYTES, source="pdf")
+        path = fetcher.materialize(fetched, save_dir, ".pdf")
+    except (httpx.HTTPError, ValueError, OSError) as e:
         print(f"PDF download error for {url}: {e}")
         return None
+    if fetched.from_store:
+        print(f"PDF reused from fetch store: {fname} -> {Path(path).name}")
+    else:
+        print(f"Successfully downloaded {fname} ({fetched.size} bytes) -> {Path(path).name}")
+    return path
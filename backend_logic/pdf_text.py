@@ -0,0 +1,150 @@
+"""
+PDF 文本提取（页级并行 + 磁盘缓存）。
+
+- 按页段把任务分给进程池；worker 按 (路径, 大小, mtime) 缓存最近打开的 PdfReader，
+  同一文档的后续页段不再重新解析交叉引用表
+- 同时在途的页段数有上限，超大文档（几百页）的峰值内存也有界
+- 每页的文本按 (PDF 内容哈希, 页码, 提取器版本) 缓存，已知的 PDF 重新总结时完全跳过解析
+- 空白页（扫描件）交给调用方提供的 OCR 回调
+
+worker 进程只会 import 本模块，不会加载 openai / vision 等重量级依赖。
+"""
+
+from __future__ import annotations
+import os
+import hashlib
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from .disk_cache import DiskCache, CACHE_DIR
+
+# 修改提取逻辑时递增，旧缓存自动失效
+EXTRACTOR_VERSION = "pypdf-1"
+
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", max(1, min(4, (os.cpu_count() or 2) - 1))))
+PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", 8))
+MAX_IN_FLIGHT = PDF_WORKERS * 2
+# 每个 worker 进程保留的已打开文档数（pypdf 把整个文件读进内存，需要有上限）
+READER_CACHE_SIZE = int(os.getenv("PDF_READER_CACHE_SIZE", 2))
+
+pdf_text_cache = DiskCache(CACHE_DIR / "pdf_text.sqlite3", table="pdf_text", max_entries=500000)
+
+_pool = None
+_pool_lock = threading.Lock()
+_readers = OrderedDict()     # 仅在 worker 进程内使用：(path, size, mtime) -> PdfReader
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """PDF 解析与 OCR 栅格化共用的进程池。"""
+    global _pool
+    with _pool_lock:
+        # worker 异常退出后进程池不可再用，需要重建
+        if _pool is None or getattr(_pool, "_broken", False):
+            # spawn：服务器是多线程的，fork 不安全
+            _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _page_key(sha: str, page: int) -> str:
+    return f"{sha}:{page}:{EXTRACTOR_VERSION}"
+
+
+def _meta_key(sha: str) -> str:
+    return f"{sha}:pages:{EXTRACTOR_VERSION}"
+
+
+def count_pages(path: str) -> int:
+    from pypdf import PdfReader
+    return len(PdfReader(path).pages)
+
+
+def _reader(path: str):
+    """worker 进程中复用同一文档的 PdfReader；主进程不缓存，用完即释放。"""
+    from pypdf import PdfReader
+    if multiprocessing.parent_process() is None or READER_CACHE_SIZE <= 0:
+        return PdfReader(path)
+    st = os.stat(path)
+    key = (path, st.st_size, st.st_mtime_ns)
+    reader = _readers.get(key)
+    if reader is None:
+        reader = _readers[key] = PdfReader(path)
+        while len(_readers) > READER_CACHE_SIZE:
+            _readers.popitem(last=False)
+    else:
+        _readers.move_to_end(key)
+    return reader
+
+
+def extract_page_range(path: str, pages: list) -> list:
+    """worker 中执行：返回 [(page, text), ...]。"""
+    reader = _reader(path)
+    out = []
+    for i in pages:
+        try:
+            out.append((i, reader.pages[i].extract_text() or ""))
+        except Exception as e:
+            print(f"PDF page {i + 1} extraction error in {path}: {e}")
+            out.append((i, ""))
+    return out
+
+
+def _extract_uncached(path: str, pages: list) -> dict:
+    """并行提取给定页，返回 {page: text}。页数少时直接在本进程内完成。"""
+    if len(pages) <= PAGES_PER_TASK or PDF_WORKERS <= 1:
+        return dict(extract_page_range(path, pages))
+
+    chunks = [pages[i:i + PAGES_PER_TASK] for i in range(0, len(pages), PAGES_PER_TASK)]
+    pool = get_process_pool()
+    results = {}
+    pending = set()
+    for chunk in chunks:
+        if len(pending) >= MAX_IN_FLIGHT:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                results.update(f.result())
+        pending.add(pool.submit(extract_page_range, path, chunk))
+    for f in pending:
+        results.update(f.result())
+    return results
+
+
+def extract_pdf_text(path: str, max_pages: int | None = 10, ocr=None) -> str:
+    """
+    返回带 "--- Page N ---" 分隔的文本。
+    ocr(path, [page, ...]) -> {page: text} 用于处理没有文本层的页（可选）。
+    """
+    sha = file_sha256(path)
+    total = pdf_text_cache.get(_meta_key(sha))
+    if total is None:
+        total = count_pages(path)
+        pdf_text_cache.set(_meta_key(sha), total)
+    pages = list(range(total if max_pages is None else min(total, max_pages)))
+
+    texts = pdf_text_cache.get_many([_page_key(sha, i) for i in pages])
+    texts = {i: texts[_page_key(sha, i)] for i in pages if _page_key(sha, i) in texts}
+    missing = [i for i in pages if i not in texts]
+    if missing:
+        extracted = _extract_uncached(path, missing)
+        blank = [i for i in missing if not extracted.get(i, "").strip()]
+        if blank and ocr is not None:
+            extracted.update(ocr(path, blank))
+        texts.update(extracted)
+        # 不缓存 OCR 的错误标记；没有 OCR 时空白页也不缓存，以便以后 OCR 可用时重试
+        pdf_text_cache.set_many({
+            _page_key(sha, i): extracted[i] for i in missing
+            if not extracted.get(i, "").startswith("[OCR")
+            and (ocr is not None or extracted.get(i, "").strip())
+        })
+
+    return "".join(f"\n--- Page {i + 1} ---\n{texts.get(i, '')}" for i in pages)
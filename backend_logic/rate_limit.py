@@ -0,0 +1,134 @@
+"""
+线程安全的限流器：
+- TokenBucket：令牌桶（按秒补充），用于 OpenAI / Serper 的请求数与 token 数
+- OpenAIRateLimiter：同时受 RPM 与 TPM 两个桶约束
+- HostLimiter：每个主机的并发上限 + 最小请求间隔（下载 / 批量爬取的礼貌性）
+"""
+
+from __future__ import annotations
+import os
+import time
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from . import metrics
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = float(rate)                      # 每秒补充的令牌数
+        self.capacity = float(capacity if capacity is not None else rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def adjust(self, delta: float) -> None:
+        """退回（delta > 0）或补扣（delta < 0）令牌；补扣可使余额为负，之后的 acquire 等待相应时间。"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens + delta)
+
+    def acquire(self, n: float = 1) -> float:
+        """阻塞直到取得 n 个令牌，返回等待的秒数。超过容量的请求按容量计。"""
+        n = min(float(n), self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= n:
+                    self._tokens -= n
+                    return waited
+                delay = (n - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class OpenAIRateLimiter:
+    """
+    请求前按 (输入 token + max_tokens) 预约，响应后用 usage.total_tokens 结算（settle），
+    多预约的部分退回桶中，不会因为按上限预约而长期压低吞吐。
+    """
+
+    def __init__(self, rpm: float, tpm: float):
+        self.requests = TokenBucket(rpm / 60.0, capacity=max(1.0, rpm / 60.0 * 5))
+        self.tokens = TokenBucket(tpm / 60.0, capacity=tpm / 6.0)
+
+    def acquire(self, tokens: int = 0) -> float:
+        waited = self.requests.acquire(1)
+        if tokens:
+            waited += self.tokens.acquire(tokens)
+        metrics.observe("openai_rate_wait", waited)
+        return waited
+
+    def settle(self, reserved: int, response=None) -> None:
+        """
+        结算 acquire(reserved) 的预约：response 带 usage 时按实际用量退回或补扣；
+        没有 usage（请求失败）时整笔退回。
+        """
+        usage = getattr(response, "usage", None) if response is not None else None
+        used = getattr(usage, "total_tokens", None) if usage is not None else None
+        reserved = min(float(reserved), self.tokens.capacity)
+        self.tokens.adjust(reserved - (used if used is not None else 0))
+
+
+class HostLimiter:
+    def __init__(self, per_host: int = 2, min_interval: float = 0.0):
+        self.per_host = per_host
+        self.min_interval = min_interval
+        self._sems = {}
+        self._last = {}
+        self._lock = threading.Lock()
+
+    def _state(self, host: str):
+        with self._lock:
+            if host not in self._sems:
+                self._sems[host] = threading.BoundedSemaphore(self.per_host)
+                self._last[host] = 0.0
+            return self._sems[host]
+
+    def reserve(self, url: str) -> float:
+        """
+        预约该主机的下一个可用时间片，返回需要等待的秒数（不占用并发名额）。
+        供 asyncio 代码使用：await asyncio.sleep(delay)。
+        """
+        if not self.min_interval:
+            return 0.0
+        host = urlparse(url).netloc.lower()
+        self._state(host)
+        # 保证同一主机的请求间隔不小于 min_interval
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._last[host] + self.min_interval)
+            self._last[host] = slot
+        return slot - now
+
+    @contextmanager
+    def limit(self, url: str):
+        sem = self._state(urlparse(url).netloc.lower())
+        with sem:
+            delay = self.reserve(url)
+            if delay > 0:
+                time.sleep(delay)
+                metrics.observe("host_rate_wait", delay)
+            yield
+
+
+# 进程内共享的限流器（所有分析请求共用）
+openai_limiter = OpenAIRateLimiter(
+    rpm=float(os.getenv("OPENAI_RPM", 500)),
+    tpm=float(os.getenv("OPENAI_TPM", 200000)),
+)
+serper_limiter = TokenBucket(
+    rate=float(os.getenv("SERPER_QPS", 5)),
+    capacity=float(os.getenv("SERPER_BURST", 10)),
+)
+download_limiter = HostLimiter(
+    per_host=int(os.getenv("DOWNLOAD_PER_HOST", 2)),
+    min_interval=float(os.getenv("DOWNLOAD_MIN_INTERVAL", 0.2)),
+)
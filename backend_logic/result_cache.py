@@ -0,0 +1,132 @@
+"""
+按城市缓存整个 run_analysis_for_city 的结果，并合并并发的相同请求（single-flight）。
+
+- 同一城市同时只跑一次流水线：后到的请求等待正在进行的那一次，并收到它的进度事件
+- 成功的结果按 RESULT_CACHE_TTL 缓存到磁盘，热门城市的重复查询直接返回
+- force_refresh=True 跳过缓存重新执行（仍会与正在进行的同一城市请求合并）
+"""
+
+from __future__ import annotations
+import os
+import copy
+import time
+import threading
+import unicodedata
+
+from .disk_cache import DiskCache, CACHE_DIR
+from .jobs import emit_progress
+from .main_runner import run_analysis_for_city
+
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", 6 * 3600))
+RESULT_CACHE_MAX = int(os.getenv("RESULT_CACHE_MAX", 2000))
+# 结果结构或流水线行为变化时递增，旧缓存自动失效
+RESULT_CACHE_VERSION = "3"
+
+result_cache = DiskCache(CACHE_DIR / "results.sqlite3", table="results",
+                         ttl=RESULT_CACHE_TTL, max_entries=RESULT_CACHE_MAX)
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.listeners = []
+        self.lock = threading.Lock()
+
+    def add_listener(self, progress) -> None:
+        if progress is not None:
+            with self.lock:
+                self.listeners.append(progress)
+
+    def broadcast(self, event: str, **data) -> None:
+        with self.lock:
+            listeners = list(self.listeners)
+        for progress in listeners:
+            emit_progress(progress, event, **data)
+
+
+class SingleFlight:
+    """同一 key 的并发调用只执行一次 fn，其余调用等待并共享结果（或异常）。"""
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key: str, fn, progress=None):
+        """fn(progress=...) 的返回值；第二个返回值表示是否与进行中的调用合并。"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.coalesced += 1
+            flight.add_listener(progress)
+
+        if not leader:
+            emit_progress(progress, "coalesced")
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = fn(progress=flight.broadcast)
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
+
+
+_flights = SingleFlight()
+
+
+def city_key(city: str, **options) -> str:
+    normalized = " ".join(unicodedata.normalize("NFKC", city).split())
+    extra = ",".join(f"{k}={options[k]}" for k in sorted(options) if options[k] is not None)
+    return f"{RESULT_CACHE_VERSION}:{normalized}:{extra}"
+
+
+def analyze_city(city: str, force_refresh: bool = False, progress=None, fanout: bool | None = None,
+                 politeness=None) -> dict:
+    """
+    带缓存与请求合并的 run_analysis_for_city。
+    返回的结果多一个 "cache" 字段：{"hit", "coalesced", "cached_at"}。
+    """
+    key = city_key(city, fanout=fanout)
+    if not force_refresh:
+        cached = result_cache.get(key)
+        if cached is not None:
+            print(f"⚡ [Cache] Returning cached result for {city}")
+            emit_progress(progress, "cache_hit", cached_at=cached["cached_at"])
+            return dict(cached["result"], cache={"hit": True, "coalesced": False,
+                                                  "cached_at": cached["cached_at"]})
+
+    def run(progress):
+        result = run_analysis_for_city(city, progress=progress, fanout=fanout, politeness=politeness)
+        cached_at = time.time()
+        # "シードリンクが取得できませんでした" などのエラー結果はキャッシュしない
+        if "error" not in result:
+            result_cache.set(key, {"result": result, "cached_at": cached_at})
+        return result, cached_at
+
+    (result, cached_at), coalesced = _flights.do(key, run, progress=progress)
+    # 合并的调用方共享同一个对象，各自拿一份拷贝（发起方只复制顶层，不修改共享的对象）
+    result = copy.deepcopy(result) if coalesced else dict(result)
+    result["cache"] = {"hit": False, "coalesced": coalesced, "cached_at": cached_at}
+    return result
+
+
+def result_cache_stats() -> dict:
+    return dict(result_cache.stats(), ttl=RESULT_CACHE_TTL,
+                in_flight=_flights.in_flight(), coalesced=_flights.coalesced)
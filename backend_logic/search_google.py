@@ -1,21 +1,75 @@
 # auto_plan_fetcher/search_google.py
+import os, json, hashlib
 import urllib3, requests
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 
+from . import metrics
+from .disk_cache import DiskCache, CACHE_DIR
+from .rate_limit import serper_limiter
+
+SERPER_URL = os.getenv("SERPER_URL", "https://google.serper.dev/search")
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", 7 * 24 * 3600))
+
+# 搜索结果缓存，键为 (query, gl, hl)
+search_cache = DiskCache(CACHE_DIR / "search.sqlite3", table="search",
+                         ttl=SEARCH_CACHE_TTL, max_entries=10000)
+
+_session = requests.Session()
+
 def build_query(city_name: str, keywords: List[str]) -> str:
     kw_block = " OR ".join([f'"{kw}"' for kw in keywords])
     return f"({kw_block}) {city_name}"
 
-def search_links(query: str, api_key: str, num_results: int = 20) -> List[str]:
-    url = "https://google.serper.dev/search"
+def _search_key(query: str, gl: str, hl: str) -> str:
+    return hashlib.sha256(json.dumps([query, gl, hl], ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def _organic_results(query: str, api_key: str, gl: str = "jp", hl: str = "ja") -> List[dict]:
+    """返回 Serper 的 organic 结果（带缓存）；失败或结果为空时返回空列表且不写缓存。"""
+    key = _search_key(query, gl, hl)
+    cached = search_cache.get(key)
+    if cached is not None:
+        return cached
+
     headers = {"X-API-KEY": api_key, "Content-Type": "application/json"}
-    payload = {"q": query, "gl": "jp", "hl": "ja"}
+    payload = {"q": query, "gl": gl, "hl": hl}
+    metrics.observe("serper_rate_wait", serper_limiter.acquire())
     try:
-        res = requests.post(url, json=payload, headers=headers,
-                            timeout=10, verify=False)
-        res.raise_for_status()
-        return [i["link"] for i in res.json().get("organic", [])][:num_results]
+        with metrics.span("serper"):
+            res = _session.post(SERPER_URL, json=payload, headers=headers,
+                                timeout=10, verify=False)
+            res.raise_for_status()
+        metrics.bytes_downloaded.inc(len(res.content), source="serper")
+        organic = [
+            {"link": i["link"], "title": i.get("title", ""), "position": i.get("position")}
+            for i in res.json().get("organic", []) if i.get("link")
+        ]
     except Exception as e:
         print("Serper search error:", e)
         return []
+    # 空结果多为临时性的（配额、索引波动），不缓存，下次重新查询
+    if organic:
+        search_cache.set(key, organic)
+    return organic
+
+def search_links(query: str, api_key: str, num_results: int = 20, gl: str = "jp", hl: str = "ja") -> List[str]:
+    return [i["link"] for i in _organic_results(query, api_key, gl, hl)][:num_results]
+
+def search_links_fanout(city_name: str, keywords: List[str], api_key: str, num_results: int = 20,
+                        gl: str = "jp", hl: str = "ja", max_workers: int = 6) -> List[str]:
+    """
+    每个关键词单独查询（并发），再用倒数排名融合 (RRF) 合并、去重、排序。
+    被多个关键词同时命中、且排名靠前的链接排在前面。
+    """
+    queries = [f'"{kw}" {city_name}' for kw in keywords]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(queries)) or 1) as pool:
+        futures = [metrics.submit(pool, _organic_results, q, api_key, gl, hl) for q in queries]
+        results = [f.result() for f in futures]
+
+    scores = {}
+    for organic in results:
+        for rank, item in enumerate(organic):
+            scores[item["link"]] = scores.get(item["link"], 0.0) + 1.0 / (60 + rank)
+    ranked = sorted(scores, key=lambda link: scores[link], reverse=True)
+    return ranked[:num_results]
@@ -0,0 +1,82 @@
+"""
+进程级配置：启动时读取一次，之后各模块共用同一个 Settings 对象。
+
+- .env 只在第一次调用 get_settings() 时加载（原来每次分析都调用 load_dotenv()）
+- API key 在这里统一读取和校验，缺失时给出同一条错误信息
+- GOOGLE_CREDENTIALS_JSON 存在时写出凭证文件（initialize_google_credentials）；
+  写出失败或凭证文件读不出 JSON 时记入 google_credentials_error，google_credentials 为 None，
+  ocr.default_backend() 据此不启用 Vision OCR，不影响启动
+"""
+
+from __future__ import annotations
+import os
+import json
+import threading
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Settings:
+    openai_api_key: str | None
+    serper_api_key: str | None
+    google_credentials: str | None      # GOOGLE_APPLICATION_CREDENTIALS 的路径（不可用时为 None）
+    google_credentials_error: str | None = None
+
+    def require_api_keys(self) -> tuple[str, str]:
+        if not self.openai_api_key or not self.serper_api_key:
+            raise RuntimeError("OPENAI_API_KEY と SERPER_API_KEY を設定してください。")
+        return self.openai_api_key, self.serper_api_key
+
+    def to_dict(self) -> dict:
+        """/debug/status 用：key 本身不输出，只输出是否已设置。"""
+        return {
+            "openai_api_key": bool(self.openai_api_key),
+            "serper_api_key": bool(self.serper_api_key),
+            "google_credentials": bool(self.google_credentials),
+            "google_credentials_error": self.google_credentials_error,
+        }
+
+
+_settings: Settings | None = None
+_settings_lock = threading.Lock()
+
+
+def _load() -> Settings:
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+
+    credentials_error = None
+    if os.getenv("GOOGLE_CREDENTIALS_JSON") and not os.getenv("GOOGLE_APPLICATION_CREDENTIALS"):
+        from .initialize_credentials import initialize_google_credentials
+        try:
+            initialize_google_credentials()
+        except Exception as e:
+            credentials_error = f"initialize_google_credentials failed: {e}"
+    credentials = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
+    if credentials and not credentials_error:
+        try:
+            with open(credentials, encoding="utf-8") as f:
+                json.load(f)
+        except (OSError, ValueError) as e:
+            credentials_error = f"unreadable credentials file {credentials}: {e}"
+    if credentials_error:
+        print(f"⚠️ Google credentials unavailable, Vision OCR disabled: {credentials_error}")
+        credentials = None
+
+    return Settings(
+        openai_api_key=os.getenv("OPENAI_API_KEY"),
+        serper_api_key=os.getenv("SERPER_API_KEY"),
+        google_credentials=credentials,
+        google_credentials_error=credentials_error,
+    )
+
+
+def get_settings() -> Settings:
+    global _settings
+    with _settings_lock:
+        if _settings is None:
+            _settings = _load()
+        return _settings
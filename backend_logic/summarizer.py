@@ -1,23 +1,37 @@
+from __future__ import annotations
 import os
-import io
 import json
-import httpx
 import urllib3
-from urllib.parse import urljoin
-from bs4 import BeautifulSoup
-from PIL import Image
-from openai import OpenAI
-from pypdf import PdfReader
-from pathlib import Path
-
-try:
-    from google.cloud import vision_v1 as vision
-    vision_available = True
-except ImportError:
-    vision_available = False
+from concurrent.futures import ThreadPoolExecutor
+
+from . import metrics
+from .fetcher import fetcher
+from .link_extract import parse_page
+from .boilerplate import BOILERPLATE_ENABLED, main_content
+from .pdf_text import extract_pdf_text
+from .ocr import OCRStage, default_backend
+from .chunking import split_into_chunks
+from .openai_client import get_client
+from .rate_limit import openai_limiter
+from .tokens import count_tokens
+from .findings_store import findings_store
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# 分块抽取的上限（取代原来 HTML 15,000 字符 / PDF 10 页的硬截断）
+SUMMARY_MAX_PAGES = int(os.getenv("SUMMARY_MAX_PAGES", 60))
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", 6000))
+SUMMARY_MAX_CHUNKS = int(os.getenv("SUMMARY_MAX_CHUNKS", 12))
+# HTML 正文按 token 计的上限（默认为分块上限的总和）；其中附加的链接列表最多占 SUMMARY_LINK_TOKENS
+SUMMARY_MAX_HTML_TOKENS = int(os.getenv("SUMMARY_MAX_HTML_TOKENS", SUMMARY_CHUNK_TOKENS * SUMMARY_MAX_CHUNKS))
+SUMMARY_LINK_TOKENS = int(os.getenv("SUMMARY_LINK_TOKENS", 1500))
+SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", 4))
+# 每次抽取请求的输出上限；限流器按 输入 + 此值 预约，响应后按实际用量结算
+SUMMARY_MAX_COMPLETION_TOKENS = int(os.getenv("SUMMARY_MAX_COMPLETION_TOKENS", 4096))
+
+# token 计数用的模型（抽取默认使用 gpt-4o-mini）
+_COUNT_MODEL = "gpt-4o-mini"
+
 _TEMPLATE_EXTRACTOR = (
     "あなたは日本の建築基準法及び都市計画法に精通した専門家です。提供された文書（特にPDFの表形式データ）を非常に注意深く分析し、以下の指示に従って情報を抽出してください。\n"
     "1. **規制の抽出**: 文書から建築に関する規制や数値を「条件と共に」すべて抽出してください。\n"
@@ -49,114 +63,186 @@ _TEMPLATE_EXTRACTOR = (
 )
 
 
-def _vision_text(img: Image.Image) -> str:
-    if not vision_available:
-        return "[OCR SKIPPED - Vision API not available]"
-    
-    try:
-        client = vision.ImageAnnotatorClient()
-        buf = io.BytesIO()
-        img.save(buf, format="PNG")
-        content = buf.getvalue()
-        image = vision.Image(content=content)
-        response = client.text_detection(image=image)
-        return response.text_annotations[0].description if response.text_annotations else ""
-    except Exception as e:
-        print(f"Vision API OCR error: {e}")
-        return "[OCR ERROR]"
+def _vision_available() -> bool:
+    # google.cloud.vision は ocr.default_backend() が初回に読み込む
+    return default_backend() is not None
 
 
-def _pdf_text(path: str, pages: int = 10) -> str:
+def _ocr_pages(path: str, pages: list) -> dict:
+    """对没有文本层的页做批量 OCR（共享客户端、并行栅格化、有界在途请求）。"""
+    backend = default_backend()
+    if backend is None:
+        return {}
+    return OCRStage(backend).run(path, pages)
+
+
+def _pdf_text(path: str, pages: int | None = 10) -> str:
     try:
-        reader = PdfReader(path)
-        out = ""
-        for i, page in enumerate(reader.pages):
-            if i >= pages:
-                break
-            out += f"\n--- Page {i+1} ---\n"
-            page_text = page.extract_text()
-            if not page_text.strip() and vision_available:
-                try:
-                    import fitz
-                    doc = fitz.open(path)
-                    pix = doc[i].get_pixmap(dpi=300)
-                    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                    page_text = _vision_text(img)
-                    doc.close()
-                except Exception as e:
-                    print(f"OCR failed for page {i+1} in {path}: {e}")
-                    page_text = "[OCR PROCESSING ERROR]"
-            out += page_text
-        return out
+        return extract_pdf_text(path, max_pages=pages, ocr=_ocr_pages if _vision_available() else None)
     except Exception as e:
         print(f"PDF text extraction error: {e}")
         return ""
 
 
-def _html_text(url: str, limit: int = 15000) -> str:
+def _link_lines(anchors) -> list:
+    return [f"- Link Text: {link_text}, URL: {link_url}" for link_url, link_text in anchors if link_text]
+
+
+def _take_within(lines: list, budget: int, partial: bool = False) -> tuple[list, int]:
+    """从头取行，直到 token 数达到 budget。partial=True 时放不下的那一行按比例截断保留。返回 (保留的行, token 数)。"""
+    kept, used = [], 0
+    for line in lines:
+        tokens = count_tokens(line, _COUNT_MODEL) + 1
+        if used + tokens > budget:
+            if partial and budget - used > 1:
+                kept.append(line[:len(line) * (budget - used - 1) // tokens])
+                used = budget
+            break
+        kept.append(line)
+        used += tokens
+    return kept, used
+
+
+def _html_text(url: str, max_tokens: int = SUMMARY_MAX_HTML_TOKENS, stats: dict | None = None) -> str:
+    """
+    HTML 页面的抽取输入：去掉导航 / 页眉页脚 / 站点公共块后的正文（保留标题与表格），
+    加上去重后的正文内链接。按 token 数截断，stats 中记录与整页文本相比节省的 token 数。
+    """
     try:
-        with httpx.Client(timeout=15, verify=False) as client:
-            response = client.get(url, headers={'User-Agent': 'Mozilla/5.0'})
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, "html.parser")
-            text_content = soup.get_text()
-            
-            links_extracted = []
-            for a in soup.find_all("a", href=True):
-                link_text = a.get_text(strip=True)
-                if not link_text:
-                    continue
-                link_url = urljoin(url, a['href'])
-                links_extracted.append(f"- Link Text: {link_text}, URL: {link_url}")
-            
-            if links_extracted:
-                link_info = "\n\n--- Document Links ---\n" + "\n".join(links_extracted)
-                full_content = text_content + link_info
-            else:
-                full_content = text_content
-            
-            return full_content[:limit]
+        # 爬虫已抓取过的页面直接从共享的正文存储读取
+        doc = fetcher.fetch(url, source="html").text()
+        raw_text, raw_anchors = parse_page(doc, url)
+        raw_links = _link_lines(raw_anchors)
+        raw_content = raw_text + ("\n\n--- Document Links ---\n" + "\n".join(raw_links) if raw_links else "")
+        if not BOILERPLATE_ENABLED:
+            text_content, link_lines, dropped = raw_text, raw_links, 0
+        else:
+            text_content, anchors, dropped = main_content(doc, url)
+            link_lines = _link_lines(anchors)
+
+        links_kept, link_tokens = _take_within(link_lines, min(SUMMARY_LINK_TOKENS, max_tokens // 4))
+        body_lines, _ = _take_within(text_content.splitlines(), max_tokens - link_tokens, partial=True)
+        full_content = "\n".join(body_lines)
+        if links_kept:
+            full_content += "\n\n--- Document Links ---\n" + "\n".join(links_kept)
+
+        raw_tokens = count_tokens(raw_content, _COUNT_MODEL)
+        sent_tokens = count_tokens(full_content, _COUNT_MODEL)
+        saved = max(0, raw_tokens - sent_tokens)
+        metrics.llm_input_tokens_saved.inc(saved, source="html")
+        if stats is not None:
+            stats.update(raw=raw_tokens, sent=sent_tokens, saved=saved, chrome_blocks=dropped,
+                         links=len(links_kept), links_dropped=len(raw_links) - len(links_kept))
+        return full_content
     except Exception as e:
         print(f"HTML text extraction error for {url}: {e}")
         return ""
 
 
-def summarize_text_from_url_or_pdf(doc_identifier: str, city: str, key: str, model: str = "gpt-3.5-turbo") -> dict:
-    if doc_identifier.endswith('.pdf'):
-        body = _pdf_text(doc_identifier)
-    else:
-        body = _html_text(doc_identifier)
-    
-    if not body.strip():
-        return {"findings": [], "external_links": []}
-    
-    client = OpenAI(api_key=key, http_client=httpx.Client(verify=False))
-    
-    prompt_with_doc_identifier_context = f"以下の文書（識別子: {doc_identifier}）から{city}に関する情報を抽出してください。\n\n{body}"
+def _finding_key(finding: dict) -> tuple:
+    return tuple(
+        str(finding.get(k) or "").strip()
+        for k in ("regulation_type", "zone", "district_plan_name", "value")
+    )
+
 
+def merge_extractions(parts: list) -> dict:
+    """合并各块的抽取结果：findings 按 (regulation_type, zone, district_plan_name, value) 去重，链接按 URL 去重。"""
+    findings, external_links = {}, {}
+    for data in parts:
+        for finding in data.get("findings") or []:
+            if isinstance(finding, dict):
+                findings.setdefault(_finding_key(finding), finding)
+        for ext_link in data.get("external_links") or []:
+            if isinstance(ext_link, dict):
+                external_links.setdefault(ext_link.get("url") or ext_link.get("text"), ext_link)
+    return {"findings": list(findings.values()), "external_links": list(external_links.values())}
+
+
+def _extract_chunk(doc_identifier: str, city: str, key: str, model: str, chunk: str,
+                   index: int, total: int) -> dict:
+    part = f"（全{total}部分中の第{index + 1}部分）" if total > 1 else ""
+    prompt_with_doc_identifier_context = (
+        f"以下の文書{part}（識別子: {doc_identifier}）から{city}に関する情報を抽出してください。\n\n{chunk}"
+    )
+    reserved = count_tokens(_TEMPLATE_EXTRACTOR + prompt_with_doc_identifier_context, model) + \
+        SUMMARY_MAX_COMPLETION_TOKENS
+    openai_limiter.acquire(reserved)
+    response = None
     try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": _TEMPLATE_EXTRACTOR},
-                {"role": "user", "content": prompt_with_doc_identifier_context}
-            ],
-            response_format={"type": "json_object"}
-        )
+        with metrics.span("openai"):
+            response = get_client(key).chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": _TEMPLATE_EXTRACTOR},
+                    {"role": "user", "content": prompt_with_doc_identifier_context}
+                ],
+                response_format={"type": "json_object"},
+                max_tokens=SUMMARY_MAX_COMPLETION_TOKENS,
+            )
+        metrics.record_usage(response, model)
         raw_ai_output = response.choices[0].message.content.strip()
-        
-        try:
-            data = json.loads(raw_ai_output)
-            if "findings" in data and isinstance(data["findings"], list):
-                for finding in data["findings"]:
-                    finding["source_document_key"] = doc_identifier
-            if "external_links" in data and isinstance(data["external_links"], list):
-                for ext_link in data["external_links"]:
-                    ext_link["source_document_key"] = doc_identifier
-            return data
-        except json.JSONDecodeError:
-            print(f"AI output for {doc_identifier} was not valid JSON: {raw_ai_output[:200]}")
-            return {"findings": [], "external_links": []}
     except Exception as e:
-        print(f"OpenAI API call failed during extraction for {doc_identifier} ({model}): {e}")
+        print(f"OpenAI API call failed during extraction for {doc_identifier} part {index + 1} ({model}): {e}")
+        return {"findings": [], "external_links": []}
+    finally:
+        openai_limiter.settle(reserved, response)
+
+    try:
+        data = json.loads(raw_ai_output)
+    except json.JSONDecodeError:
+        print(f"AI output for {doc_identifier} part {index + 1} was not valid JSON: {raw_ai_output[:200]}")
         return {"findings": [], "external_links": []}
+    return data if isinstance(data, dict) else {"findings": [], "external_links": []}
+
+
+def load_document(doc_identifier: str, max_pages: int | None = SUMMARY_MAX_PAGES,
+                  stats: dict | None = None) -> str:
+    """抽出対象の本文（PDF はローカルパス、それ以外は URL）。stats には HTML の入力 token 数を記録する。"""
+    if doc_identifier.endswith('.pdf'):
+        return _pdf_text(doc_identifier, pages=max_pages)
+    return _html_text(doc_identifier, stats=stats)
+
+
+def summarize_text_from_url_or_pdf(doc_identifier: str, city: str, key: str, model: str = "gpt-3.5-turbo",
+                                   max_pages: int | None = SUMMARY_MAX_PAGES,
+                                   chunk_tokens: int = SUMMARY_CHUNK_TOKENS,
+                                   max_chunks: int = SUMMARY_MAX_CHUNKS, body: str | None = None) -> dict:
+    """
+    文書を頁・章節の境界で chunk_tokens 以内の塊に分け、塊ごとの抽出を並行に実行してから結果をまとめる。
+    max_pages / max_chunks が従来の固定の切り詰め（HTML 15,000 文字・PDF 10 頁）に代わる上限。
+    body を渡した場合は本文を読み直さない（load_document() の結果）。
+    max_chunks を超えて抽出しなかった塊がある場合、結果の dropped_chunks にその数を記録する。
+    """
+    if body is None:
+        body = load_document(doc_identifier, max_pages)
+
+    if not body.strip():
+        return {"findings": [], "external_links": []}
+
+    chunks = split_into_chunks(body, chunk_tokens, model)
+    dropped_chunks = max(0, len(chunks) - max_chunks)
+    if dropped_chunks:
+        print(f"⚠️ {doc_identifier}: {len(chunks)} chunks, only the first {max_chunks} are extracted")
+        metrics.dropped_chunks.inc(dropped_chunks)
+        chunks = chunks[:max_chunks]
+
+    if len(chunks) == 1:
+        parts = [_extract_chunk(doc_identifier, city, key, model, chunks[0], 0, 1)]
+    else:
+        with ThreadPoolExecutor(max_workers=min(SUMMARY_WORKERS, len(chunks))) as pool:
+            futures = [
+                metrics.submit(pool, _extract_chunk, doc_identifier, city, key, model, chunk, i, len(chunks))
+                for i, chunk in enumerate(chunks)
+            ]
+            parts = [f.result() for f in futures]
+
+    data = merge_extractions(parts)
+    for finding in data["findings"]:
+        finding["source_document_key"] = doc_identifier
+    for ext_link in data["external_links"]:
+        ext_link["source_document_key"] = doc_identifier
+    findings_store.record_findings(city, doc_identifier, data["findings"])
+    if dropped_chunks:
+        data["dropped_chunks"] = dropped_chunks
+    return data
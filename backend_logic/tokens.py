@@ -0,0 +1,46 @@
+"""
+LLM 入力のトークン数見積もり。tiktoken があれば正確に数え、無ければ文字種ベースの近似を使う。
+"""
+
+from functools import lru_cache
+
+
+@lru_cache(maxsize=1)
+def _tiktoken():
+    """tiktoken は初回の計数時に読み込む（無ければ None）。"""
+    try:
+        import tiktoken
+        return tiktoken
+    except ImportError:
+        return None
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    """模型的编码；编码文件无法取得（离线等）时为 None，失败结果也缓存，不会每次计数都重试下载。"""
+    tiktoken = _tiktoken()
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        pass
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        print(f"⚠️ tiktoken encoding unavailable, using the approximate token count: {e}")
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is not None:
+        try:
+            return len(encoding.encode(text, disallowed_special=()))
+        except Exception:
+            pass
+    # 近似：日本語などの非 ASCII は 1 文字 ≒ 1 トークン、ASCII は 4 文字 ≒ 1 トークン
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return non_ascii + (len(text) - non_ascii + 3) // 4
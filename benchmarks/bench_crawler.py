@@ -0,0 +1,67 @@
+"""
+串行 bfs_serial 与并发 bfs 的对比基准。
+
+    python -m benchmarks.bench_crawler --latency 0.1 --max-total 120
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+from backend_logic.crawl_state import CrawlState
+from backend_logic.link_crawler import AsyncCrawler, bfs, bfs_serial, crawl_ranked
+from benchmarks.fake_site import FakeSite
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--latency", type=float, default=0.1, help="偽サイトの1リクエストあたりの遅延（秒）")
+    ap.add_argument("--fanout", type=int, default=8)
+    ap.add_argument("--max-depth", type=int, default=2)
+    ap.add_argument("--max-total", type=int, default=120)
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--per-host", type=int, default=8)
+    args = ap.parse_args()
+
+    with FakeSite(fanout=args.fanout, latency=args.latency) as site:
+        seeds = [site.url("/")]
+
+        t0 = time.perf_counter()
+        serial = bfs_serial(seeds, seeds[0], max_depth=args.max_depth, max_total=args.max_total)
+        t_serial = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        concurrent = bfs(seeds, seeds[0], max_depth=args.max_depth, max_total=args.max_total,
+                         concurrency=args.concurrency, per_host=args.per_host, incremental=False)
+        t_async = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        ranked = crawl_ranked(seeds, seeds[0], max_depth=args.max_depth, max_total=args.max_total,
+                              concurrency=args.concurrency, per_host=args.per_host, incremental=False)
+        t_ranked = time.perf_counter() - t0
+
+        # 增量爬取：第一次建立状态，第二次用条件请求（max_age=0 强制重新验证）
+        with tempfile.TemporaryDirectory() as tmp:
+            state = CrawlState(Path(tmp) / "state.sqlite3")
+
+            def incremental_run():
+                crawler = AsyncCrawler(concurrency=args.concurrency, per_host=args.per_host,
+                                       state=state, max_age=0)
+                t0 = time.perf_counter()
+                asyncio.run(crawler.crawl(seeds, seeds[0], max_depth=args.max_depth, max_total=args.max_total))
+                return time.perf_counter() - t0, crawler.stats
+
+            t_first, _ = incremental_run()
+            t_second, second_stats = incremental_run()
+
+    print(f"serial bfs    : {t_serial:7.2f}s  {len(serial)} links")
+    print(f"async  bfs    : {t_async:7.2f}s  {len(concurrent)} links")
+    print(f"best-first    : {t_ranked:7.2f}s  {len(ranked)} links")
+    print(f"same link set : {set(serial) == set(concurrent)}")
+    print(f"speedup       : {t_serial / t_async:7.1f}x")
+    print(f"incremental   : first {t_first:.2f}s, re-crawl {t_second:.2f}s {second_stats}")
+
+
+if __name__ == "__main__":
+    main()
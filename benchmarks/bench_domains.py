@@ -0,0 +1,80 @@
+"""
+登録ドメイン解決のマイクロベンチマーク（1 URL あたりのコストとコールドスタート）。
+
+    python -m benchmarks.bench_domains --urls 200000
+
+- before: tldextract.extract(url).registered_domain（既定の抽出器。PSL をネットワークから取りに行く）
+- after : backend_logic.domains.registered_domain（同梱スナップショット + ホスト単位の LRU）
+コールドスタートはそれぞれ新しいプロセスで最初の 1 回の解決までを計測する。
+"""
+import argparse
+import random
+import subprocess
+import sys
+import time
+import warnings
+
+COLD_BEFORE = ("import time; t = time.perf_counter(); import tldextract; "
+               "tldextract.extract('https://www.city.ama.aichi.jp/a.html'); "
+               "print(time.perf_counter() - t)")
+COLD_AFTER = ("import time; t = time.perf_counter(); from backend_logic.domains import registered_domain; "
+              "registered_domain('https://www.city.ama.aichi.jp/a.html'); "
+              "print(time.perf_counter() - t)")
+
+
+def synthetic_urls(n: int, hosts: int = 40, seed: int = 0) -> list:
+    """クロールと同じく、少数のホストに多数のパスが集中する URL 列。"""
+    rnd = random.Random(seed)
+    names = [f"www.city.town{i}.aichi.jp" for i in range(hosts // 2)]
+    names += [f"www.city.example{i}.lg.jp" for i in range(hosts - len(names))]
+    return [
+        f"https://{rnd.choice(names)}/soshiki/toshi/{rnd.randint(0, 10**6)}.html?page={i % 7}"
+        for i in range(n)
+    ]
+
+
+def cold_start(code: str, timeout: float) -> str:
+    try:
+        out = subprocess.run([sys.executable, "-W", "ignore", "-c", code], capture_output=True,
+                             text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return f"> {timeout:.0f} s (timed out)"
+    if out.returncode != 0:
+        return "failed: " + (out.stderr.strip().splitlines() or ["?"])[-1]
+    return f"{float(out.stdout.strip().splitlines()[-1]) * 1000:.1f} ms"
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--urls", type=int, default=200000)
+    ap.add_argument("--cold-timeout", type=float, default=60)
+    args = ap.parse_args()
+
+    import tldextract
+    from backend_logic.domains import registered_domain
+
+    urls = synthetic_urls(args.urls)
+    # 既定の抽出器の初期化（ネットワーク取得）はコールドスタート側で計測する
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        tldextract.extract(urls[0])
+        registered_domain(urls[0])
+
+        t = time.perf_counter()
+        before = [tldextract.extract(u).registered_domain for u in urls]
+        before_s = time.perf_counter() - t
+
+    t = time.perf_counter()
+    after = [registered_domain(u) for u in urls]
+    after_s = time.perf_counter() - t
+
+    print(f"{'':8} {'us/url':>8} {'total s':>8}")
+    print(f"{'before':8} {before_s / len(urls) * 1e6:8.2f} {before_s:8.2f}")
+    print(f"{'after':8} {after_s / len(urls) * 1e6:8.2f} {after_s:8.2f}  ({before_s / after_s:.1f}x)")
+    print(f"results identical: {before == after}")
+    print(f"cold start before: {cold_start(COLD_BEFORE, args.cold_timeout)}")
+    print(f"cold start after : {cold_start(COLD_AFTER, args.cold_timeout)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+オフラインのエンドツーエンド・ベンチマーク。外部サービスはすべてローカルの代役に置き換える。
+
+    python -m benchmarks.bench_e2e
+    python -m benchmarks.bench_e2e --cities 3 --pages 300 --slow-hosts 1 --llm-latency 0.5 --rate-limit 0.1
+    python -m benchmarks.bench_e2e --warm --json result.json     # 2 回目（キャッシュ有り）も計測して保存
+
+合成サイト（SyntheticMunicipality）・FakeSerper・FakeOpenAI を起動し、一時ディレクトリを
+CACHE_DIR / 作業ディレクトリにして run_analysis_for_city（規制抽出の段階を含む）を実行する。
+壁時計時間、段階ごとの所要時間（statistics.timings と同じ span）、ピーク RSS を表示する。
+FakeOpenAI には RPM / TPM の上限がないので、クライアント側の限流器（OPENAI_RPM / OPENAI_TPM）は
+--openai-rpm / --openai-tpm で十分大きく設定する。限流器の待ち時間（openai_rate_wait）は別に表示する。
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.fake_services import FakeOpenAI, FakeSerper
+from benchmarks.synthetic_site import SyntheticMunicipality
+
+
+def _peak_rss_mb() -> dict:
+    # Linux では ru_maxrss は KB 単位
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }
+
+
+def _merge_spans(total: dict, spans: dict) -> None:
+    for name, s in spans.items():
+        entry = total.setdefault(name, {"count": 0, "seconds": 0.0})
+        entry["count"] += s["count"]
+        entry["seconds"] += s["seconds"]
+
+
+def run_pass(cities: list) -> dict:
+    from backend_logic.main_runner import run_analysis_for_city
+
+    report = {"cities": {}, "spans": {}, "counters": {}}
+    start = time.perf_counter()
+    for city in cities:
+        t = time.perf_counter()
+        result = run_analysis_for_city(city)
+        analysis_s = time.perf_counter() - t
+        stats = result.get("statistics", {})
+        timings = stats.get("timings", {})
+        _merge_spans(report["spans"], timings.get("spans", {}))
+        for k, v in timings.get("counters", {}).items():
+            report["counters"][k] = report["counters"].get(k, 0) + v
+
+        report["cities"][city] = {
+            "analysis_s": round(analysis_s, 3),
+            "crawled": stats.get("total_crawled"),
+            "relevant": stats.get("relevant_count"),
+            "pdfs": stats.get("pdf_count"),
+            "documents": stats.get("extracted_documents", 0),
+            "findings": stats.get("findings_count", 0),
+            "duplicates": sum((d or {}).get("collapsed", 0) for d in (stats.get("duplicates") or {}).values()),
+            "tokens_saved": (stats.get("input_tokens") or {}).get("saved", 0),
+        }
+    report["wall_s"] = round(time.perf_counter() - start, 3)
+    rate_wait = report["spans"].get("openai_rate_wait", {})
+    report["openai_rate_wait"] = {"count": rate_wait.get("count", 0),
+                                  "seconds": round(rate_wait.get("seconds", 0.0), 3)}
+    report["peak_rss_mb"] = _peak_rss_mb()
+    return report
+
+
+def print_report(label: str, report: dict) -> None:
+    print(f"\n=== {label}: wall {report['wall_s']:.2f} s, peak RSS {report['peak_rss_mb']['self']:.0f} MB "
+          f"(children {report['peak_rss_mb']['children']:.0f} MB) ===")
+    print(f"{'city':16} {'analysis s':>10} {'crawled':>8} {'relevant':>8} {'pdfs':>5} "
+          f"{'docs':>5} {'findings':>8} {'dups':>5} {'tok saved':>9}")
+    for city, c in report["cities"].items():
+        print(f"{city:16} {c['analysis_s']:10.2f} {c['crawled'] or 0:8} "
+              f"{c['relevant'] or 0:8} {c['pdfs'] or 0:5} {c['documents']:5} {c['findings']:8} {c['duplicates']:5} "
+              f"{c['tokens_saved']:9}")
+    wait = report["openai_rate_wait"]
+    print(f"\nopenai_rate_wait: {wait['seconds']:.2f} s over {wait['count']} calls "
+          f"(wall {report['wall_s']:.2f} s)")
+    print(f"\n{'span':32} {'count':>7} {'total s':>9} {'mean ms':>9}")
+    for name, s in sorted(report["spans"].items(), key=lambda kv: -kv[1]["seconds"]):
+        if name == "openai_rate_wait":
+            continue
+        print(f"{name:32} {s['count']:7} {s['seconds']:9.3f} {s['seconds'] / max(1, s['count']) * 1000:9.1f}")
+    if report["counters"]:
+        print("\ncounters: " + ", ".join(f"{k}={v}" for k, v in sorted(report["counters"].items())))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cities", type=int, default=2, help="合成する都市（サイト）の数")
+    ap.add_argument("--pages", type=int, default=150, help="サイトあたりのページ数")
+    ap.add_argument("--depth", type=int, default=3)
+    ap.add_argument("--pdf-ratio", type=float, default=0.2)
+    ap.add_argument("--pdf-pages", type=int, default=4)
+    ap.add_argument("--dup-ratio", type=float, default=0.0, help="印刷用の重複ページを持つ規制ページの割合")
+    ap.add_argument("--latency", type=float, default=0.02, help="本庁ホストの応答遅延（秒）")
+    ap.add_argument("--slow-hosts", type=int, default=1)
+    ap.add_argument("--slow-latency", type=float, default=0.5)
+    ap.add_argument("--serper-latency", type=float, default=0.05)
+    ap.add_argument("--llm-latency", type=float, default=0.3)
+    ap.add_argument("--llm-per-1k", type=float, default=0.05, help="入力 1k トークンあたりの追加遅延（秒）")
+    ap.add_argument("--rate-limit", type=float, default=0.0, help="429 を返す割合")
+    ap.add_argument("--openai-rpm", type=float, default=10000, help="クライアント側限流器の RPM（OPENAI_RPM）")
+    ap.add_argument("--openai-tpm", type=float, default=10_000_000, help="クライアント側限流器の TPM（OPENAI_TPM）")
+    ap.add_argument("--warm", action="store_true", help="キャッシュが温まった状態でもう 1 回計測する")
+    ap.add_argument("--json", help="結果を JSON で保存するパス")
+    args = ap.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench_e2e_"))
+    sites = {
+        f"合成市{i + 1}": SyntheticMunicipality(pages=args.pages, depth=args.depth, pdf_ratio=args.pdf_ratio,
+                                              latency=args.latency, slow_hosts=args.slow_hosts,
+                                              slow_latency=args.slow_latency, pdf_pages=args.pdf_pages, seed=i,
+                                              dup_ratio=args.dup_ratio)
+        for i in range(args.cities)
+    }
+    for site in sites.values():
+        site.__enter__()
+    try:
+        with FakeSerper(sites, latency=args.serper_latency) as serper, \
+                FakeOpenAI(latency=args.llm_latency, per_1k_tokens=args.llm_per_1k,
+                           rate_limit_ratio=args.rate_limit) as openai_server:
+            # backend_logic はモジュール読み込み時に環境変数を読むので、import の前に設定する
+            os.environ.update({
+                "OPENAI_API_KEY": "bench-key",
+                "SERPER_API_KEY": "bench-key",
+                "OPENAI_BASE_URL": openai_server.url,
+                "SERPER_URL": serper.url,
+                "CACHE_DIR": str(workdir / "cache"),
+                "OPENAI_RPM": str(args.openai_rpm),
+                "OPENAI_TPM": str(args.openai_tpm),
+            })
+            os.chdir(workdir)
+            print(f"workdir: {workdir}")
+
+            reports = {"cold": run_pass(list(sites))}
+            if args.warm:
+                reports["warm"] = run_pass(list(sites))
+
+            services = {
+                "site_requests": sum(s.requests for s in sites.values()),
+                "site_bytes": sum(s.bytes_served for s in sites.values()),
+                "serper_requests": serper.requests,
+                "openai_requests": openai_server.requests,
+                "openai_429": openai_server.rate_limited,
+            }
+    finally:
+        for site in sites.values():
+            site.__exit__(None, None, None)
+
+    for label, report in reports.items():
+        print_report(label, report)
+    print("\nservices: " + ", ".join(f"{k}={v}" for k, v in services.items()))
+    if args.json:
+        Path(args.json).write_text(json.dumps({"args": vars(args), "reports": reports, "services": services},
+                                              ensure_ascii=False, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""
+link_extract の各バックエンドのマイクロベンチマーク（pages/s）。
+
+    python -m benchmarks.bench_link_extract --corpus saved_pages/   # 保存済み *.html を使う
+    python -m benchmarks.bench_link_extract                         # 合成した大きな索引ページを使う
+"""
+import argparse
+import random
+import time
+from pathlib import Path
+
+from backend_logic.link_extract import BACKENDS, parse_page
+
+
+def synthetic_corpus(pages: int = 40, links_per_page: int = 1500, seed: int = 0) -> list:
+    """市役所の大きな索引ページを模した HTML を生成する。"""
+    rnd = random.Random(seed)
+    corpus = []
+    for p in range(pages):
+        parts = ["<!DOCTYPE html><html><head><title>都市計画課</title>",
+                 "<style>.nav{color:#333}</style><script>var x = '<a href=\"/no\">';</script></head><body>",
+                 "<nav><ul>"]
+        parts += [f'<li><a href="/menu/{i}.html">メニュー{i}</a></li>' for i in range(40)]
+        parts.append("</ul></nav><main><h1>用途地域</h1><table>")
+        for i in range(links_per_page):
+            path = f"/soshiki/toshi/{p}/{rnd.randint(0, 10**6)}.{'pdf' if i % 5 == 0 else 'html'}"
+            parts.append(
+                f'<tr><td>第{i}号</td><td><a class="l" href="{path}#sec&amp;x">建蔽率&amp;容積率 {i}</a>'
+                f'</td><td>60%</td></tr>'
+            )
+        parts.append("</table></main><footer>Copyright &copy; 市役所</footer></body></html>")
+        corpus.append(("https://www.city.example.lg.jp/index.html", "".join(parts)))
+    return corpus
+
+
+def load_corpus(directory: str) -> list:
+    return [
+        (f"https://{path.stem}.example/", path.read_text(encoding="utf-8", errors="replace"))
+        for path in sorted(Path(directory).glob("**/*.htm*"))
+    ]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--corpus", help="保存済み HTML ページのディレクトリ")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    corpus = load_corpus(args.corpus) if args.corpus else synthetic_corpus()
+    total_bytes = sum(len(doc.encode("utf-8")) for _, doc in corpus)
+    print(f"corpus: {len(corpus)} pages, {total_bytes / 1e6:.1f} MB")
+
+    results = {}
+    for backend in BACKENDS:
+        best = float("inf")
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            out = [parse_page(doc, url, backend) for url, doc in corpus]
+            best = min(best, time.perf_counter() - t0)
+        results[backend] = out
+        print(f"{backend:5s}: {len(corpus) / best:8.1f} pages/s  ({best:.3f}s)")
+
+    mismatched = sum(
+        1 for a, b in zip(results["fast"], results["bs4"])
+        if [u for u, _ in a[1]] != [u for u, _ in b[1]]
+    )
+    print(f"pages with differing link lists: {mismatched}/{len(corpus)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+OCR 段のスループット比較（Google 認証不要、FakeOCRBackend を使用）。
+
+旧方式：1ページずつ 300dpi RGB で PNG 化し、1リクエストずつ送信
+新方式：OCRStage（並列ラスタライズ・グレースケール・バッチ送信・在途上限）
+
+    python -m benchmarks.bench_ocr --pages 24 --latency 0.3
+"""
+import argparse
+import io
+import tempfile
+import time
+from pathlib import Path
+
+import fitz
+from PIL import Image
+
+from backend_logic.ocr import FakeOCRBackend, OCRStage
+
+
+def make_scanned_pdf(path: str, pages: int) -> None:
+    """テキスト層の無い（画像のみの）A4 PDF を作る。"""
+    src = fitz.open()
+    page = src.new_page(width=595, height=842)
+    for row in range(40):
+        page.insert_text((50, 60 + row * 19), f"第{row}条 建蔽率 60% 容積率 200% 高さ制限 10m", fontsize=11)
+    scan = page.get_pixmap(dpi=150).tobytes("png")
+    src.close()
+
+    doc = fitz.open()
+    for _ in range(pages):
+        p = doc.new_page(width=595, height=842)
+        p.insert_image(p.rect, stream=scan)
+    doc.save(path)
+    doc.close()
+
+
+def legacy_ocr(path: str, pages: list, backend: FakeOCRBackend) -> dict:
+    out = {}
+    for i in pages:
+        doc = fitz.open(path)
+        pix = doc[i].get_pixmap(dpi=300)
+        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+        buf = io.BytesIO()
+        img.save(buf, format="PNG")
+        out[i] = backend.recognize([buf.getvalue()])[0]
+        doc.close()
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, default=24)
+    ap.add_argument("--latency", type=float, default=0.3, help="1リクエストあたりの固定遅延（秒）")
+    ap.add_argument("--dpi", type=int, default=200)
+    ap.add_argument("--batch-size", type=int, default=8)
+    ap.add_argument("--max-in-flight", type=int, default=2)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "scanned.pdf")
+        make_scanned_pdf(path, args.pages)
+        pages = list(range(args.pages))
+
+        legacy_backend = FakeOCRBackend(latency=args.latency)
+        t0 = time.perf_counter()
+        legacy_ocr(path, pages, legacy_backend)
+        t_legacy = time.perf_counter() - t0
+
+        stage_backend = FakeOCRBackend(latency=args.latency)
+        stage = OCRStage(stage_backend, dpi=args.dpi, batch_size=args.batch_size,
+                         max_in_flight=args.max_in_flight)
+        stage.run(path, pages[:1])          # プロセスプールの起動を計測から除く
+        stage_backend.calls = stage_backend.images = stage_backend.bytes = 0
+        t0 = time.perf_counter()
+        stage.run(path, pages)
+        t_stage = time.perf_counter() - t0
+
+    for name, t, b in (("legacy", t_legacy, legacy_backend), ("stage", t_stage, stage_backend)):
+        print(f"{name:7s}: {t:6.2f}s  {args.pages / t:6.1f} pages/s  "
+              f"requests={b.calls}  uploaded={b.bytes / 1e6:.1f} MB")
+    print(f"speedup: {t_legacy / t_stage:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+起動時間（コールドスタート）のベンチマーク。
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --module backend_logic.summarizer --repeat 10 --top 20
+
+毎回新しいサブプロセスで `import <module>` を実行して所要時間の中央値を測り、
+最後に `-X importtime` の累積時間が大きいモジュールを表示する（重い import の特定用）。
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+_TIMER = "import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+
+
+def time_import(module: str) -> float:
+    out = subprocess.run([sys.executable, "-c", _TIMER.format(module=module)], cwd=ROOT,
+                         capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def import_profile(module: str) -> list:
+    """-X importtime の出力を (累積 µs, モジュール名) のリストにする。"""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT,
+                         capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, self_us, cumulative_us, name = (part.strip() for part in line.replace("import time:", "|").split("|"))
+        rows.append((int(cumulative_us), name))
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--module", default="app", help="計測するモジュール（既定: app）")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--top", type=int, default=15, help="表示する重いモジュールの数")
+    args = ap.parse_args()
+
+    time_import(args.module)     # .pyc 生成・ディスクキャッシュ用の空打ち
+    samples = [time_import(args.module) for _ in range(args.repeat)]
+    print(f"import {args.module}: median {statistics.median(samples) * 1000:.0f} ms "
+          f"(min {min(samples) * 1000:.0f} ms, max {max(samples) * 1000:.0f} ms, n={len(samples)})")
+
+    rows = sorted(import_profile(args.module), reverse=True)
+    heavy = [(us, name) for us, name in rows if name.strip() != args.module][:args.top]
+    print(f"\n{'cumulative ms':>13}  module")
+    for us, name in heavy:
+        print(f"{us / 1000:13.1f}  {name}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""
+ベンチマーク用の外部サービスの代役（ローカル HTTP サーバ）。
+
+- FakeSerper : POST /search。クエリ中の都市名に対応する合成サイトの URL を organic 結果として返す
+- FakeOpenAI : POST /v1/chat/completions。遅延と 429（Retry-After 付き）を設定できる。
+  リンク判定（json_schema）は URL のローマ字パスで、抽出（json_object）は本文中の数値で決定的に応答する
+
+どちらも with 文で起動・停止し、.url を OPENAI_BASE_URL / SERPER_URL に設定して使う。
+"""
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+RELEVANT_PATH_HINTS = ("toshikeikaku", "kenchiku", "kaihatsu")
+
+_LISTING_RE = re.compile(r"^(\d+)\. (\S+)$", re.M)
+_HTML_VALUE_RE = re.compile(r"(建蔽率|容積率)\s*(\d+%)")
+_PDF_VALUE_RE = re.compile(r"(Building coverage ratio|Floor area ratio|Height limit): ([\d.]+ ?(?:%|m))")
+_PDF_ZONE_RE = re.compile(r"Zone: (.+)")
+_REGULATION_TYPES = {"Building coverage ratio": "建蔽率", "Floor area ratio": "容積率", "Height limit": "高さ制限"}
+
+
+class _JSONServer:
+    def __init__(self):
+        self.requests = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+
+    def handle(self, path: str, payload: dict):
+        """(status, headers, body) を返す。"""
+        raise NotImplementedError
+
+    def _handler(self):
+        owner = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                with owner._lock:
+                    owner.requests += 1
+                status, headers, body = owner.handle(self.path, payload)
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+    @property
+    def base(self) -> str:
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FakeSerper(_JSONServer):
+    def __init__(self, sites: dict, latency: float = 0.05):
+        """sites: {都市名: SyntheticMunicipality}"""
+        super().__init__()
+        self.sites = sites
+        self.latency = latency
+
+    @property
+    def url(self) -> str:
+        return f"{self.base}/search"
+
+    def handle(self, path, payload):
+        time.sleep(self.latency)
+        query = payload.get("q", "")
+        organic = []
+        for city, site in self.sites.items():
+            if city in query:
+                organic = [{"link": link, "title": f"{city} {i}", "position": i + 1}
+                           for i, link in enumerate(site.entry_urls())]
+        return 200, {}, {"organic": organic}
+
+
+class FakeOpenAI(_JSONServer):
+    def __init__(self, latency: float = 0.3, per_1k_tokens: float = 0.05, rate_limit_ratio: float = 0.0,
+                 retry_after_ms: int = 200, seed: int = 0):
+        super().__init__()
+        self.latency = latency
+        self.per_1k_tokens = per_1k_tokens
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after_ms = retry_after_ms
+        self.rnd = random.Random(seed)
+        self.rate_limited = 0
+        self.prompt_tokens = 0
+
+    @property
+    def url(self) -> str:
+        return f"{self.base}/v1"
+
+    def handle(self, path, payload):
+        if not path.endswith("/chat/completions"):
+            return 404, {}, {"error": {"message": f"unknown path {path}"}}
+        with self._lock:
+            limited = self.rnd.random() < self.rate_limit_ratio
+            if limited:
+                self.rate_limited += 1
+        if limited:
+            return 429, {"retry-after-ms": str(self.retry_after_ms)}, {
+                "error": {"message": "Rate limit reached (fake)", "type": "requests", "code": "rate_limit_exceeded"}
+            }
+
+        messages = payload.get("messages", [])
+        user = next((m["content"] for m in messages if m.get("role") == "user"), "")
+        prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 2
+        with self._lock:
+            self.prompt_tokens += prompt_tokens
+        time.sleep(self.latency + self.per_1k_tokens * prompt_tokens / 1000)
+
+        response_format = payload.get("response_format") or {}
+        if response_format.get("type") == "json_schema":
+            content = self._verdicts(user)
+        else:
+            content = self._extraction(user)
+        text = json.dumps(content, ensure_ascii=False)
+        return 200, {}, {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "fake"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(text) // 2,
+                      "total_tokens": prompt_tokens + len(text) // 2},
+        }
+
+    @staticmethod
+    def _verdicts(user: str) -> dict:
+        return {"verdicts": [
+            {"index": int(i), "relevant": any(h in url for h in RELEVANT_PATH_HINTS)}
+            for i, url in _LISTING_RE.findall(user)
+        ]}
+
+    @staticmethod
+    def _extraction(user: str) -> dict:
+        findings = []
+        zone = "general"
+        for line in user.splitlines():
+            m = _PDF_ZONE_RE.search(line)
+            if m:
+                zone = m.group(1).strip()
+            for kind, value in _PDF_VALUE_RE.findall(line):
+                findings.append({"regulation_type": _REGULATION_TYPES[kind], "value": value,
+                                 "zone": zone, "district_plan_name": None, "condition": None})
+        for kind, value in _HTML_VALUE_RE.findall(user):
+            findings.append({"regulation_type": kind, "value": value, "zone": "general",
+                             "district_plan_name": None, "condition": None})
+        return {"findings": findings, "external_links": []}
@@ -0,0 +1,75 @@
+"""
+ベンチマーク用のローカル偽市役所サイト。
+
+ThreadingHTTPServer 上で、固定の分岐数・遅延を持つページツリーを返す。
+"""
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+def _make_handler(fanout: int, latency: float, pdf_every: int):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            time.sleep(latency)
+            path = self.path.split("?")[0]
+            etag = f'"{abs(hash(path))}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            if path.endswith(".pdf"):
+                body = b"%PDF-1.4\n%fake\n"
+                ctype = "application/pdf"
+            else:
+                node = path.strip("/").replace(".html", "") or "root"
+                links = []
+                for i in range(fanout):
+                    child = f"{node}-{i}"
+                    if pdf_every and i % pdf_every == pdf_every - 1:
+                        links.append(f'<a href="/{child}.pdf">資料 {child}</a>')
+                    else:
+                        links.append(f'<a href="/{child}.html#top">ページ {child}</a>')
+                body = (
+                    "<html><head><title>都市計画課</title></head><body>"
+                    f"<h1>{node}</h1><p>用途地域・建蔽率・容積率のご案内</p>"
+                    + "".join(links)
+                    + "</body></html>"
+                ).encode("utf-8")
+                ctype = "text/html; charset=utf-8"
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+class FakeSite:
+    """with FakeSite(latency=0.05) as site: site.url('/') ..."""
+
+    def __init__(self, fanout: int = 8, latency: float = 0.05, pdf_every: int = 4):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(fanout, latency, pdf_every))
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def url(self, path: str = "/") -> str:
+        host, port = self.server.server_address
+        return f"http://{host}:{port}{path}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
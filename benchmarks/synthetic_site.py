@@ -0,0 +1,254 @@
+"""
+ベンチマーク用の合成市役所サイト。
+
+ページ数・深さ・PDF の割合・遅いホストを指定して、決定的なページツリーを生成し、
+ローカルの ThreadingHTTPServer で配信する。規制ページ（用途地域・建蔽率など）と
+無関係なページ（子育て・ごみ・観光など）が混在し、PDF は pypdf で文字を抽出できる本物の PDF。
+dup_ratio を指定すると、規制ページの一部に内容が同じ印刷用ページ（/print/...）を追加する。
+
+    with SyntheticMunicipality(pages=150, depth=3, pdf_ratio=0.2, slow_hosts=1) as site:
+        site.entry_urls()   # 検索結果として返すべき URL
+"""
+import math
+import random
+import threading
+import time
+import zlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# (パス用ローマ字, 見出し, 規制ページか)
+TOPICS = [
+    ("toshikeikaku/youtochiiki", "用途地域", True),
+    ("kenchiku/kenpeiritsu", "建蔽率・容積率", True),
+    ("toshikeikaku/chikukeikaku", "地区計画", True),
+    ("kenchiku/takasa", "高さ制限・斜線制限", True),
+    ("kaihatsu/shidoyoko", "開発指導要綱", True),
+    ("kosodate/hoikuen", "保育園のご案内", False),
+    ("kurashi/gomi", "ごみの出し方", False),
+    ("kanko/event", "観光・イベント", False),
+    ("kenko/kenshin", "健康診断", False),
+    ("shisei/saiyo", "職員採用", False),
+]
+
+ZONES = ["第一種低層住居専用地域", "第二種中高層住居専用地域", "近隣商業地域", "準工業地域", "市街化調整区域"]
+# 規制ページの説明文（ページごとに決定的に選ぶ）
+SENTENCES = [
+    "建築物を建てる際には、用途地域ごとに定められた建蔽率と容積率の上限を守る必要があります。",
+    "敷地が二以上の用途地域にわたる場合は、それぞれの面積の割合に応じて制限を計算します。",
+    "角地の場合は建蔽率の緩和を受けられることがあります。詳しくは窓口でご相談ください。",
+    "前面道路の幅員が十二メートル未満の場合、容積率は道路幅員に応じて制限されます。",
+    "第一種低層住居専用地域では、建築物の高さの限度が定められています。",
+    "北側斜線制限は、北側隣地の日照を確保するための制限です。",
+    "地区計画が定められている区域では、地区整備計画の内容に適合させる必要があります。",
+    "日影規制の対象となる建築物は、冬至日の日影時間が基準を超えないようにしてください。",
+    "開発行為を行う場合は、事前に開発指導要綱に基づく協議が必要です。",
+    "都市計画図は市役所の都市計画課窓口およびインターネットで閲覧できます。",
+]
+# PDF は標準フォント（Helvetica）で描くのでローマ字表記
+ZONES_EN = ["Category 1 low-rise residential", "Category 2 mid/high-rise residential",
+            "Neighborhood commercial", "Quasi-industrial", "Urbanization control area"]
+
+
+def make_pdf(lines_per_page: list) -> bytes:
+    """Helvetica で ASCII テキストを描いた最小限の PDF（1 要素 = 1 ページの行リスト）。"""
+    objects = []
+    page_ids = []
+    n_pages = len(lines_per_page)
+    # 1: catalog, 2: pages, 3: font, 以降 page / content の組
+    for i, lines in enumerate(lines_per_page):
+        page_id, content_id = 4 + 2 * i, 5 + 2 * i
+        page_ids.append(page_id)
+        text = " ".join(
+            f"({line.replace(chr(92), '').replace('(', '').replace(')', '')}) Tj 0 -16 Td" for line in lines
+        )
+        stream = f"BT /F1 11 Tf 56 780 Td {text} ET".encode("latin-1", "replace")
+        objects.append((page_id, (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                                  f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>").encode()))
+        objects.append((content_id, b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"))
+    kids = " ".join(f"{p} 0 R" for p in page_ids)
+    objects = [
+        (1, b"<< /Type /Catalog /Pages 2 0 R >>"),
+        (2, f"<< /Type /Pages /Kids [{kids}] /Count {n_pages} >>".encode()),
+        (3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"),
+    ] + objects
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for obj_id, body in objects:
+        offsets[obj_id] = len(out)
+        out += b"%d 0 obj\n" % obj_id + body + b"\nendobj\n"
+    xref = len(out)
+    size = max(offsets) + 1
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % size
+    for obj_id in range(1, size):
+        out += b"%010d 00000 n \n" % offsets[obj_id]
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, xref)
+    return bytes(out)
+
+
+class _Page:
+    def __init__(self, path: str, title: str, relevant: bool, depth: int):
+        self.path = path
+        self.title = title
+        self.relevant = relevant
+        self.depth = depth
+        self.links = []        # (host_index, path, text)
+        self.source = path     # 印刷用ページは元ページのパス（本文を共有する）
+
+
+class SyntheticMunicipality:
+    def __init__(self, pages: int = 150, depth: int = 3, pdf_ratio: float = 0.2, latency: float = 0.02,
+                 slow_hosts: int = 0, slow_latency: float = 0.5, pdf_pages: int = 4, seed: int = 0,
+                 dup_ratio: float = 0.0):
+        self.latency = latency
+        self.slow_latency = slow_latency
+        self.pdf_pages = pdf_pages
+        self.rnd = random.Random(seed)
+        self.requests = 0
+        self.bytes_served = 0
+        self._lock = threading.Lock()
+        # host 0 が本庁サイト、1.. が遅いホスト（外部委託の例規集・地図サービスなど）
+        self.servers = [self._make_server(i) for i in range(1 + slow_hosts)]
+        self.pages = {}        # (host, path) -> _Page
+        self._generate(pages, depth, pdf_ratio)
+        self._add_print_versions(dup_ratio)
+
+    # ---- 生成 ----
+    def _generate(self, total: int, depth: int, pdf_ratio: float) -> None:
+        rnd = self.rnd
+        root = _Page("/", "トップページ", False, 0)
+        self.pages[(0, "/")] = root
+        levels = [[(0, root)]]
+        count = 1
+        while count < total:
+            d = len(levels)
+            if d > depth:
+                break
+            level = []
+            # 残りのページを残りの階層に均等に割り当てる
+            target = count + math.ceil((total - count) / (depth - d + 1))
+            fanout = max(1, math.ceil((target - count) / len(levels[-1])))
+            for host, parent in levels[-1]:
+                for _ in range(fanout):
+                    if count >= target:
+                        break
+                    slug, title, relevant = rnd.choice(TOPICS)
+                    child_host = host
+                    if len(self.servers) > 1 and relevant and rnd.random() < 0.3:
+                        child_host = rnd.randrange(1, len(self.servers))
+                    is_pdf = d > 1 and rnd.random() < pdf_ratio
+                    path = f"/{slug}/{count}.{'pdf' if is_pdf else 'html'}"
+                    page = _Page(path, title, relevant, d)
+                    self.pages[(child_host, path)] = page
+                    parent.links.append((child_host, path, f"{title} {count}"))
+                    if not is_pdf:
+                        level.append((child_host, page))
+                    count += 1
+            if not level:
+                break
+            levels.append(level)
+        # ナビゲーション：全ページからトップへ
+        for (host, path), page in self.pages.items():
+            if not path.endswith(".pdf") and path != "/":
+                page.links.append((0, "/", "トップ"))
+
+    def _add_print_versions(self, ratio: float) -> None:
+        """規制ページの一部に印刷用ページを追加し、元ページからリンクする。"""
+        if not ratio:
+            return
+        for (host, path), page in list(self.pages.items()):
+            if not page.relevant or path.endswith(".pdf") or self.rnd.random() >= ratio:
+                continue
+            copy = _Page(f"/print{path}", page.title, True, page.depth + 1)
+            copy.links = list(page.links)
+            copy.source = page.source
+            self.pages[(host, copy.path)] = copy
+            page.links.append((host, copy.path, "印刷用ページ"))
+
+    def _html(self, page: _Page) -> bytes:
+        links = "".join(
+            f'<li><a href="{self.url(path, host)}">{text}</a></li>' for host, path, text in page.links
+        )
+        body = ""
+        if page.relevant:
+            zone = ZONES[zlib.crc32(page.source.encode()) % len(ZONES)]
+            rnd = random.Random(zlib.crc32(page.source.encode()))
+            text = "".join(rnd.sample(SENTENCES, 6))
+            body = (f"<h2>{zone}</h2><p>{text}</p><table><tr><th>建蔽率</th><td>60%</td></tr>"
+                    f"<tr><th>容積率</th><td>200%</td></tr></table>")
+        nav = "".join(f'<a href="/menu/{i}.html">メニュー{i}</a>' for i in range(8))
+        # 実際の市役所サイトに多い、タグやクラス名では見分けられない共通部分（全ページで同じ）
+        common = "".join(f'<li><a href="/menu/{i}.html">よく見られるページ{i}</a></li>' for i in range(12))
+        contact = ("<div class=\"box\"><h2>このページに関するお問い合わせ</h2>"
+                   "<p>合成市 都市整備部 都市計画課 電話：0725-99-0000 ファクス：0725-99-0001</p></div>")
+        return (f"<!DOCTYPE html><html><head><title>{page.title}</title></head><body>"
+                f"<header><nav>{nav}</nav></header><main><h1>{page.title}</h1>{body}"
+                f"<ul>{links}</ul>{contact}<div class=\"box\"><ul>{common}</ul></div></main>"
+                f"<footer>Copyright &copy; 合成市"
+                f"{'（印刷用）' if page.source != page.path else ''}</footer></body></html>").encode("utf-8")
+
+    def _pdf(self, page: _Page) -> bytes:
+        pages = []
+        for p in range(self.pdf_pages):
+            zone = ZONES_EN[(zlib.crc32(page.path.encode()) + p) % len(ZONES_EN)]
+            pages.append([f"Page {p + 1} of {page.path}", f"Zone: {zone}",
+                          "Building coverage ratio: 60%", "Floor area ratio: 200%",
+                          "Height limit: 10 m"] + [f"Filler line {i}" for i in range(30)])
+        return make_pdf(pages)
+
+    # ---- 配信 ----
+    def _make_server(self, index: int):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                time.sleep(site.slow_latency if index else site.latency)
+                path = self.path.split("?")[0].split("#")[0]
+                page = site.pages.get((index, path))
+                if page is None:
+                    body, ctype, status = b"not found", "text/plain", 404
+                elif path.endswith(".pdf"):
+                    body, ctype, status = site._pdf(page), "application/pdf", 200
+                else:
+                    body, ctype, status = site._html(page), "text/html; charset=utf-8", 200
+                etag = f'"{zlib.crc32(body):08x}"'
+                if status == 200 and self.headers.get("If-None-Match") == etag:
+                    status, body = 304, b""
+                with site._lock:
+                    site.requests += 1
+                    site.bytes_served += len(body)
+                self.send_response(status)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        server.daemon_threads = True
+        return server
+
+    def url(self, path: str = "/", host: int = 0) -> str:
+        addr, port = self.servers[host].server_address
+        return f"http://{addr}:{port}{path}"
+
+    def entry_urls(self, n: int = 10) -> list:
+        """検索エンジンが返しそうな URL：トップ + 浅い階層の規制ページ。"""
+        relevant = [(h, p) for (h, p), page in self.pages.items() if page.relevant and page.depth <= 2]
+        relevant.sort(key=lambda hp: (self.pages[hp].depth, hp[1]))
+        return [self.url("/")] + [self.url(p, h) for h, p in relevant[:n - 1]]
+
+    def __enter__(self):
+        for server in self.servers:
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
@@ -52,6 +52,82 @@ if (detailsModal){
     });
 }
 
+// 解析ジョブを投入し、SSE で進捗を表示しながら完了を待って結果を返す
+function describeProgress(event, data) {
+    switch (event) {
+        case 'queued': return '待機中です。順番が来ると処理を開始します...';
+        case 'started': return '検索を開始しました...';
+        case 'seed_search': return `初期検索完了: ${data.seed_count}件のシードリンク`;
+        case 'crawl': return `クロール中: ${data.pages}ページ取得、${data.links}件のリンクを発見`;
+        case 'crawl_done': return `クロール完了: ${data.links}件のリンク。関連性を判定しています...`;
+        case 'relevant_link': return `関連リンク発見 (${data.index}件目): ${data.url}`;
+        case 'document_extracted': return `規制抽出 (${data.index}文書目): ${data.count}件 - ${data.url}`;
+        case 'coalesced': return '同じ都市の解析が実行中です。その結果を待っています...';
+        case 'cache_hit': return 'キャッシュ済みの結果を表示します...';
+        default: return null;
+    }
+}
+
+async function postJson(url, payload) {
+    const response = await fetch(url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(payload),
+    });
+    if (!response.ok) {
+        const errorData = await response.json().catch(() => ({
+            detail: `サーバーエラー (HTTP ${response.status}): ${response.statusText}`
+        }));
+        throw new Error(errorData.detail);
+    }
+    return response.json();
+}
+
+async function fetchJobResult(jobId) {
+    const response = await fetch(`/api/jobs/${jobId}/result`);
+    if (!response.ok) {
+        const errorData = await response.json().catch(() => ({
+            detail: `サーバーエラー (HTTP ${response.status}): ${response.statusText}`
+        }));
+        throw new Error(errorData.detail);
+    }
+    return response.json();
+}
+
+async function runAnalysisJob(city) {
+    const job = await postJson('/api/jobs', { city: city });
+    await new Promise((resolve, reject) => {
+        const source = new EventSource(`/api/jobs/${job.job_id}/events`);
+        const onEvent = (e) => {
+            const data = JSON.parse(e.data || '{}');
+            const message = describeProgress(e.type, data);
+            if (message) statusDiv.textContent = message;
+        };
+        ['queued', 'started', 'seed_search', 'crawl', 'crawl_done', 'relevant_link', 'document_extracted', 'coalesced',
+         'cache_hit'].forEach(
+            (name) => source.addEventListener(name, onEvent)
+        );
+        source.addEventListener('done', () => { source.close(); resolve(); });
+        source.addEventListener('error', (e) => {
+            // サーバーから送られた error イベント、または接続断
+            source.close();
+            if (e.data) {
+                const data = JSON.parse(e.data);
+                reject(new Error(data.error || 'ジョブが失敗しました'));
+            } else {
+                resolve();  // 接続が切れた場合は結果 API に問い合わせる
+            }
+        });
+    });
+    let result = await fetchJobResult(job.job_id);
+    // 接続断で早めに戻った場合は完了までポーリング
+    while (result && result.job_id && result.status !== 'done') {
+        await new Promise((r) => setTimeout(r, 3000));
+        result = await fetchJobResult(job.job_id);
+    }
+    return result;
+}
+
 async function startAnalysis() {
     const city = cityInput.value.trim();
     if (!city) {
@@ -60,7 +136,7 @@ async function startAnalysis() {
     }
 
     startButton.disabled = true;
-    statusDiv.textContent = '処理中です。関連リンクを検索・フィルタリングしています... 10-15分かかる場合があります。ページを閉じないでください。';
+    statusDiv.textContent = '処理中です。関連リンクを検索・フィルタリングしています... ページを閉じないでください。';
     statusDiv.style.color = 'blue';
     resultsDiv.style.display = 'none';
     // Ensure legacy sections stay hidden; reset summary and modal content
@@ -70,32 +146,8 @@ async function startAnalysis() {
     if (summaryDiv) { summaryDiv.style.display = 'none'; summaryDiv.innerHTML = ''; }
     if (toggleDetailsBtn) toggleDetailsBtn.disabled = true;
 
-    // 创建一个AbortController来处理超时 - 延长到18分钟
-    const controller = new AbortController();
-    const timeoutId = setTimeout(() => {
-        controller.abort();
-    }, 1080000); // 18分钟超时 (1080秒)
-
     try {
-        const response = await fetch('/api/run-analysis', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({ city: city }),
-            signal: controller.signal  // 添加超时信号
-        });
-
-        clearTimeout(timeoutId); // 清除超时定时器
-
-        if (!response.ok) {
-            const errorData = await response.json().catch(() => ({ 
-                detail: `サーバーエラー (HTTP ${response.status}): ${response.statusText}` 
-            }));
-            throw new Error(errorData.detail);
-        }
-
-        const data = await response.json();
+        const data = await runAnalysisJob(city);
 
         // 检查返回的数据结构
         if (!data || typeof data !== 'object') {
@@ -133,21 +185,17 @@ async function startAnalysis() {
             const s = data.statistics;
             if (summaryDiv) {
                 summaryDiv.style.display = 'block';
-                summaryDiv.textContent = `総クロール数: ${s.total_crawled || 0}件 ｜ 処理対象数: ${s.processed_count || 0}件 ｜ 関連リンク: ${s.relevant_count || 0}件 ｜ PDF: ${s.pdf_count || 0}件`;
+                summaryDiv.textContent = `総クロール数: ${s.total_crawled || 0}件 ｜ 処理対象数: ${s.processed_count || 0}件 ｜ 関連リンク: ${s.relevant_count || 0}件 ｜ PDF: ${s.pdf_count || 0}件 ｜ 抽出規制: ${s.findings_count || 0}件`;
             }
             if (modalStats) {
-                modalStats.innerHTML = `<ul><li>総クロール数: ${s.total_crawled || 0}件</li><li>処理対象数: ${s.processed_count || 0}件</li><li>関連リンク数: ${s.relevant_count || 0}件</li><li>PDF数: ${s.pdf_count || 0}件</li></ul>`;
+                modalStats.innerHTML = `<ul><li>総クロール数: ${s.total_crawled || 0}件</li><li>処理対象数: ${s.processed_count || 0}件</li><li>関連リンク数: ${s.relevant_count || 0}件</li><li>PDF数: ${s.pdf_count || 0}件</li><li>抽出文書数: ${s.extracted_documents || 0}件</li><li>抽出規制数: ${s.findings_count || 0}件</li><li>削減した入力トークン: ${(s.input_tokens && s.input_tokens.saved) || 0}</li></ul>`;
             }
         }
 
     } catch (error) {
-        clearTimeout(timeoutId);
-        
         let errorMessage = 'エラーが発生しました';
         
-        if (error.name === 'AbortError') {
-            errorMessage = 'タイムアウト: 処理に時間がかかりすぎました（18分超過）。サーバーが高負荷の可能性があります。';
-        } else if (error.message) {
+        if (error.message) {
             errorMessage = `エラー: ${error.message}`;
         }
         
@@ -0,0 +1,15 @@
+"""
+backend_logic は import 時に CACHE_DIR などの環境変数を読むので、テスト用の一時ディレクトリを先に設定する。
+ネットワークには一切アクセスしない（HTTP は httpx.MockTransport、OpenAI はスタブ）。
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+_TMP = Path(tempfile.mkdtemp(prefix="law_checker_tests_"))
+os.environ["CACHE_DIR"] = str(_TMP / "cache")
+os.environ["FINDINGS_DB"] = str(_TMP / "findings.sqlite3")
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
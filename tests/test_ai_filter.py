@@ -0,0 +1,85 @@
+import json
+import re
+from types import SimpleNamespace
+
+import pytest
+
+from backend_logic import ai_filter
+from backend_logic.disk_cache import DiskCache
+
+
+class FakeClient:
+    """chat.completions.create の代役：URL に "kijun" を含むものだけ関連と判定する。"""
+
+    def __init__(self):
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, **kwargs):
+        self.calls.append(messages[1]["content"])
+        verdicts = [{"index": int(i), "relevant": "kijun" in url}
+                    for i, url in re.findall(r"^(\d+)\. (\S+)$", messages[1]["content"], re.M)]
+        content = json.dumps({"verdicts": verdicts})
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(prompt_tokens=100, completion_tokens=10, total_tokens=110),
+        )
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    fake = FakeClient()
+    monkeypatch.setattr(ai_filter, "get_client", lambda key: fake)
+    monkeypatch.setattr(ai_filter, "verdict_cache", DiskCache(tmp_path / "verdicts.sqlite3", table="verdicts"))
+    return fake
+
+
+BASE = "https://www.city.example.lg.jp/"
+
+
+def test_quick_reject_skips_gpt(client):
+    urls = [
+        "https://other.example.com/kijun.html",                       # 别的注册域名
+        BASE + "kosodate/index.html",                                  # 排除关键词
+        BASE + "category/1-2-3-4-5-6-7.html",                          # 数字分类页
+    ]
+    assert ai_filter.classify_links(urls, "例市", BASE, "k") == {u: False for u in urls}
+    assert client.calls == []
+
+
+def test_second_call_is_served_from_cache(client):
+    urls = [BASE + "toshi/kijun.html", BASE + "toshi/news.html"]
+    first = ai_filter.classify_links(urls, "例市", BASE, "k")
+    assert first == {urls[0]: True, urls[1]: False}
+    assert len(client.calls) == 1
+
+    # 片段和默认端口不影响缓存键
+    again = [BASE + "toshi/kijun.html#top", "https://www.city.example.lg.jp:443/toshi/news.html"]
+    assert ai_filter.classify_links(again, "例市", BASE, "k") == {again[0]: True, again[1]: False}
+    assert len(client.calls) == 1
+    assert ai_filter.verdict_cache.stats()["hits"] == 2
+
+
+def test_cache_is_per_city(client):
+    url = BASE + "toshi/kijun.html"
+    ai_filter.classify_links([url], "例市", BASE, "k")
+    ai_filter.classify_links([url], "別の市", BASE, "k")
+    assert len(client.calls) == 2
+
+
+def test_only_uncached_urls_are_sent(client):
+    cached, fresh = BASE + "toshi/kijun.html", BASE + "toshi/kijun2.html"
+    ai_filter.classify_links([cached], "例市", BASE, "k")
+    ai_filter.classify_links([cached, fresh], "例市", BASE, "k")
+    assert len(client.calls) == 2
+    assert cached not in client.calls[1] and fresh in client.calls[1]
+
+
+def test_failed_batch_is_not_cached(client, monkeypatch):
+    def boom(**kwargs):
+        raise RuntimeError("api down")
+
+    monkeypatch.setattr(client.chat.completions, "create", boom)
+    url = BASE + "toshi/kijun.html"
+    assert ai_filter.classify_links([url], "例市", BASE, "k") == {url: False}
+    assert len(ai_filter.verdict_cache) == 0
@@ -0,0 +1,75 @@
+import pytest
+
+from backend_logic import boilerplate
+from backend_logic.boilerplate import SiteChrome, extract_page, main_content
+
+HOST = "https://www.city.example.lg.jp"
+
+
+def _page(body: str) -> str:
+    return f"""<html><head><title>t</title><script>var x = "<p>no</p>";</script></head><body>
+<header><a href="/">トップ</a> 例市</header>
+<nav class="gnav"><ul><li><a href="/kurashi/">くらし</a></li><li><a href="/jigyo/">事業者</a></li></ul></nav>
+<div id="pankuzu"><a href="/">ホーム</a> &gt; 都市計画</div>
+<div id="main">{body}</div>
+<footer>Copyright 例市 <a href="/privacy.html">プライバシー</a></footer>
+</body></html>"""
+
+
+@pytest.fixture(autouse=True)
+def fresh_chrome(monkeypatch):
+    chrome = SiteChrome(min_pages=3, min_ratio=0.5)
+    monkeypatch.setattr(boilerplate, "site_chrome", chrome)
+    return chrome
+
+
+def test_structural_chrome_is_dropped():
+    body = "<h2>用途地域</h2><p>第一種低層住居専用地域の建蔽率は 60％ とする。</p>"
+    text, links, _ = main_content(_page(body), HOST + "/toshi/a.html")
+    assert text.splitlines() == ["## 用途地域", "第一種低層住居専用地域の建蔽率は 60％ とする。"]
+    assert links == []
+
+
+def test_tables_are_rendered_as_rows():
+    body = ("<table><tr><th>地域</th><th>建蔽率</th></tr>"
+            "<tr><td>第一種住居</td><td>60%<br>（角地 70%）</td></tr></table>")
+    page = extract_page(_page(body), HOST + "/toshi/a.html")
+    tables = [b for b in page.blocks if b.kind == "table"]
+    assert [t.text for t in tables] == ["| 地域 | 建蔽率 |\n| 第一種住居 | 60% （角地 70%） |"]
+    assert tables[0].in_main
+    assert page.skipped_links >= 4
+
+
+def test_repeated_blocks_and_links_are_learned_per_host(fresh_chrome):
+    # 没有结构性标记（也没有正文区域）的侧栏，只能靠跨页面统计识别
+    sidebar = '<div class="box"><p>お問い合わせ 都市計画課 <a href="/soshiki/toshi.html">課のページ</a></p></div>'
+
+    def page(body):
+        return f"<html><body>{sidebar}<div>{body}</div></body></html>"
+
+    for i in range(3):
+        main_content(page(f'<p>地区計画 {i} の概要 <a href="/toshi/plan{i}.pdf">計画書</a></p>'),
+                     f"{HOST}/toshi/{i}.html")
+
+    text, links, dropped = main_content(page('<p>高さの最高限度 10m <a href="/toshi/height.pdf">資料</a></p>'),
+                                        HOST + "/toshi/new.html")
+    assert text == "高さの最高限度 10m 資料"
+    assert links == [(HOST + "/toshi/height.pdf", "資料")]
+    assert dropped == 1
+    assert fresh_chrome.stats() == {"hosts": 1, "pages": 4}
+
+
+def test_links_are_deduplicated_and_self_links_dropped():
+    url = HOST + "/toshi/a.html"
+    body = ('<p><a href="/toshi/b.pdf">B</a> <a href="/toshi/b.pdf#p2">B again</a> '
+            '<a href="a.html">self</a></p>')
+    _, links, _ = main_content(_page(body), url)
+    assert links == [(HOST + "/toshi/b.pdf", "B")]
+
+
+def test_falls_back_to_full_text_when_everything_is_chrome():
+    html = '<html><body class="side-layout"><p>建蔽率 60%</p><a href="/x.pdf">x</a></body></html>'
+    text, links, dropped = main_content(html, HOST + "/a.html")
+    assert "建蔽率 60%" in text
+    assert (HOST + "/x.pdf", "x") in links
+    assert dropped == 0
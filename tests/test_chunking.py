@@ -0,0 +1,86 @@
+import pytest
+
+from backend_logic import chunking, summarizer
+from backend_logic.chunking import split_into_chunks
+
+
+@pytest.fixture(autouse=True)
+def one_token_per_char(monkeypatch):
+    # 边界测试用确定的计数：1 字符 = 1 token
+    monkeypatch.setattr(chunking, "count_tokens", lambda text, model="": len(text))
+
+
+def _pages(*bodies):
+    return "".join(f"\n--- Page {i + 1} ---\n{b}" for i, b in enumerate(bodies))
+
+
+def test_short_text_is_one_chunk():
+    assert split_into_chunks("建蔽率 60%", 100) == ["建蔽率 60%"]
+    assert split_into_chunks("   \n", 100) == []
+
+
+def test_pages_are_packed_up_to_the_budget():
+    text = _pages("a" * 30, "b" * 30, "c" * 30, "d" * 30)
+    page = len(text) // 4
+    chunks = split_into_chunks(text, page * 2)
+    assert len(chunks) == 2
+    assert "".join(chunks) == text
+    assert all(len(c) <= page * 2 for c in chunks)
+    assert chunks[1].startswith("\n--- Page 3 ---")
+
+
+def test_exact_budget_fits_and_one_more_splits():
+    text = _pages("a" * 30, "b" * 30)
+    assert len(split_into_chunks(text, len(text))) == 1
+    assert len(split_into_chunks(text, len(text) - 1)) == 2
+
+
+def test_oversized_page_splits_on_sections():
+    body = "第1条 " + "あ" * 40 + "\n第2条 " + "い" * 40 + "\n第3条 " + "う" * 40
+    chunks = split_into_chunks(_pages(body), 60)
+    assert [c.strip()[:3] for c in chunks[1:]] == ["第2条", "第3条"]
+    assert all(len(c) <= 60 for c in chunks)
+
+
+def test_long_line_is_split_hard_without_losing_text():
+    line = "x" * 1000
+    chunks = split_into_chunks(line, 128)
+    assert "".join(chunks) == line
+    assert all(0 < len(c) <= 128 for c in chunks)
+
+
+def test_hard_split_keeps_lines_whole_when_they_fit():
+    lines = ["line %02d\n" % i for i in range(10)]        # 每行 8 token
+    pieces = chunking._split_hard("".join(lines), 20, "m")
+    assert pieces == ["".join(lines[i:i + 2]) for i in range(0, 10, 2)]
+
+
+@pytest.fixture
+def extracted(monkeypatch):
+    calls = []
+
+    def fake_extract(doc, city, key, model, chunk, index, total):
+        calls.append(index)
+        return {"findings": [{"regulation_type": "建蔽率", "zone": "general", "value": f"{index}0%"}],
+                "external_links": []}
+
+    monkeypatch.setattr(summarizer, "_extract_chunk", fake_extract)
+    monkeypatch.setattr(summarizer.findings_store, "record_findings", lambda *args: None)
+    return calls
+
+
+def test_chunks_past_max_chunks_are_reported(extracted):
+    body = _pages(*("p" * 50 for _ in range(5)))
+    data = summarizer.summarize_text_from_url_or_pdf("doc.pdf", "例市", "k", body=body,
+                                                     chunk_tokens=70, max_chunks=2)
+    assert sorted(extracted) == [0, 1]
+    assert data["dropped_chunks"] == 3
+    assert len(data["findings"]) == 2
+
+
+def test_no_dropped_chunks_key_when_everything_fits(extracted):
+    body = _pages(*("p" * 50 for _ in range(3)))
+    data = summarizer.summarize_text_from_url_or_pdf("doc.pdf", "例市", "k", body=body,
+                                                     chunk_tokens=70, max_chunks=3)
+    assert sorted(extracted) == [0, 1, 2]
+    assert "dropped_chunks" not in data
@@ -0,0 +1,66 @@
+import random
+
+from backend_logic.dedupe import NearDuplicateIndex, fingerprint, jaccard, main_text
+
+_WORDS = ["用途地域", "建蔽率", "容積率", "高さ", "制限", "第一種", "住居", "地域", "敷地", "道路",
+          "斜線", "区域", "計画", "建築物", "外壁", "後退", "距離", "最低", "面積", "緑化"]
+
+
+def _document(seed: int, words: int = 400) -> str:
+    rnd = random.Random(seed)
+    return "。".join(" ".join(rnd.choice(_WORDS) for _ in range(8)) for _ in range(words // 8))
+
+
+def test_short_text_has_no_fingerprint():
+    assert fingerprint("建蔽率 60%") is None
+
+
+def test_main_text_drops_links_and_page_markers():
+    text = "\n--- Page 1 ---\n本文\n--- Document Links ---\n- a (https://x)"
+    assert main_text(text).strip() == "本文"
+
+
+def test_identical_and_reformatted_copies_are_duplicates():
+    body = _document(1) + " 建蔽率 60% 容積率 200%"
+    printable = "\n--- Page 1 ---\n" + body.replace(" ", "  ") + "\n--- Document Links ---\n- 印刷 (https://x/print)"
+    index = NearDuplicateIndex()
+    assert index.add("a", fingerprint(body)) is None
+    assert index.add("a_print", fingerprint(printable)) == "a"
+    assert index.canonical_of("a_print") == "a"
+    assert index.stats() == {"fingerprinted": 2, "collapsed": 1, "duplicate_rate": 0.5}
+
+
+def test_small_edit_is_still_a_near_duplicate():
+    body = _document(2)
+    edited = body[:len(body) // 2] + "（更新日 令和六年）" + body[len(body) // 2:]
+    a, b = fingerprint(body), fingerprint(edited)
+    assert jaccard(a.sketch, b.sketch) >= 0.9
+    index = NearDuplicateIndex()
+    index.add("a", a)
+    assert index.add("b", b) == "a"
+
+
+def test_different_documents_are_kept():
+    index = NearDuplicateIndex()
+    assert index.add("a", fingerprint(_document(3))) is None
+    assert index.add("b", fingerprint(_document(4))) is None
+    assert index.stats()["collapsed"] == 0
+
+
+def test_same_template_with_different_numbers_is_kept():
+    # 各地区的规制页模板相同、只有数值不同，不能合并
+    template = _document(5)
+    index = NearDuplicateIndex()
+    assert index.add("a", fingerprint(template + " 建蔽率 60% 容積率 200%")) is None
+    assert index.add("b", fingerprint(template + " 建蔽率 50% 容積率 100%")) is None
+    assert index.add("c", fingerprint(template + " 建蔽率 60% 容積率 150.5%")) is None
+
+
+def test_re_adding_a_key_returns_its_canonical():
+    index = NearDuplicateIndex()
+    fp = fingerprint(_document(6))
+    assert index.add("a", fp) is None
+    assert index.add("b", fp) == "a"
+    assert index.add("a", fp) is None
+    assert index.add("b", None) == "a"
+    assert index.stats()["fingerprinted"] == 2
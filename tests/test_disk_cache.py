@@ -0,0 +1,56 @@
+import time
+
+from backend_logic.disk_cache import DiskCache
+
+
+def test_roundtrip_and_stats(tmp_path):
+    cache = DiskCache(tmp_path / "c.sqlite3", table="t")
+    assert cache.get("k") is None
+    cache.set("k", {"a": [1, "建蔽率"]})
+    assert cache.get("k") == {"a": [1, "建蔽率"]}
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5, "entries": 1}
+
+
+def test_ttl_expires_entries(tmp_path, monkeypatch):
+    cache = DiskCache(tmp_path / "c.sqlite3", table="t", ttl=60)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now)
+    cache.set("old", 1)
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert cache.get("old") is None
+    assert len(cache) == 0
+    cache.set("new", 2)
+    assert cache.get("new") == 2
+
+
+def test_expired_values_are_not_listed(tmp_path, monkeypatch):
+    cache = DiskCache(tmp_path / "c.sqlite3", table="t", ttl=60)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now)
+    cache.set("a", 1)
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert cache.values() == []
+
+
+def test_lru_eviction_keeps_recently_read(tmp_path, monkeypatch):
+    cache = DiskCache(tmp_path / "c.sqlite3", table="t", max_entries=2)
+    clock = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: clock[0])
+    cache.set("a", 1)
+    clock[0] += 1
+    cache.set("b", 2)
+    clock[0] += 1
+    assert cache.get("a") == 1          # a 变为最近使用
+    clock[0] += 1
+    cache.set("c", 3)
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+
+def test_tables_share_one_file(tmp_path):
+    a = DiskCache(tmp_path / "c.sqlite3", table="a")
+    b = DiskCache(tmp_path / "c.sqlite3", table="b")
+    a.set("k", "from a")
+    b.set("k", "from b")
+    assert a.get("k") == "from a" and b.get("k") == "from b"
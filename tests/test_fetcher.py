@@ -0,0 +1,143 @@
+import os
+import threading
+import time
+
+import httpx
+import pytest
+
+from backend_logic import fetcher as fetcher_module
+from backend_logic.disk_cache import DiskCache
+from backend_logic.fetcher import Fetcher
+
+
+class Origin:
+    """httpx.MockTransport 的处理函数：按 ETag 返回 304，记录收到的请求。"""
+
+    def __init__(self):
+        self.bodies = {}
+        self.requests = []
+        self.gate = None
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        if self.gate is not None:
+            self.gate.wait(5)
+        body = self.bodies[str(request.url)]
+        etag = f'"{hash(body) & 0xffff:x}"'
+        if request.headers.get("If-None-Match") == etag:
+            return httpx.Response(304, headers={"ETag": etag})
+        return httpx.Response(200, content=body, headers={"ETag": etag, "Content-Type": "text/html; charset=utf-8"})
+
+
+@pytest.fixture
+def origin():
+    return Origin()
+
+
+def _fetcher(tmp_path, origin, **kwargs) -> Fetcher:
+    f = Fetcher(store_dir=tmp_path / "bodies", index=DiskCache(tmp_path / "index.sqlite3", table="fetch_index"),
+                **kwargs)
+    f._client = httpx.Client(transport=httpx.MockTransport(origin))
+    return f
+
+
+URL = "https://www.city.example.lg.jp/toshi/a.html"
+
+
+def test_fresh_store_is_served_without_a_request(tmp_path, origin):
+    origin.bodies[URL] = "建蔽率 60%".encode()
+    f = _fetcher(tmp_path, origin, max_age=3600)
+    first = f.fetch(URL)
+    second = f.fetch(URL)
+    assert len(origin.requests) == 1
+    assert not first.from_store and second.from_store
+    assert first.sha256 == second.sha256
+    assert first.path.read_bytes() == "建蔽率 60%".encode()
+    assert f.lookup(URL) is not None
+
+
+def test_stale_entry_sends_conditional_get(tmp_path, origin):
+    origin.bodies[URL] = b"v1"
+    f = _fetcher(tmp_path, origin, max_age=0)
+    first = f.fetch(URL)
+    second = f.fetch(URL)
+    assert origin.requests[1].headers["If-None-Match"] == first.etag
+    assert second.from_store and second.sha256 == first.sha256
+    assert f.counts["not_modified"] == 1
+
+    origin.bodies[URL] = b"v2"
+    third = f.fetch(URL)
+    assert not third.from_store and third.path.read_bytes() == b"v2"
+    assert f.counts["network"] == 2
+
+
+def test_identical_bodies_are_stored_once(tmp_path, origin):
+    other = URL.replace("a.html", "b.html")
+    origin.bodies[URL] = origin.bodies[other] = b"same"
+    f = _fetcher(tmp_path, origin)
+    assert f.fetch(URL).path == f.fetch(other).path
+    assert len(list((tmp_path / "bodies").glob("??/*"))) == 1
+
+
+def test_concurrent_fetches_are_coalesced(tmp_path, origin):
+    origin.bodies[URL] = b"body"
+    origin.gate = threading.Event()
+    f = _fetcher(tmp_path, origin)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(f.fetch(URL))) for _ in range(3)]
+    for t in threads:
+        t.start()
+    deadline = time.monotonic() + 5
+    while f.counts["coalesced"] < 2:
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+    origin.gate.set()
+    for t in threads:
+        t.join(5)
+    assert len(origin.requests) == 1
+    assert sorted(r.from_store for r in results) == [False, True, True]
+    assert f.stats()["in_flight"] == 0
+
+
+def test_http_errors_and_oversized_bodies_are_not_stored(tmp_path):
+    f = Fetcher(store_dir=tmp_path / "bodies", index=DiskCache(tmp_path / "index.sqlite3", table="fetch_index"))
+    f._client = httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(404)))
+    with pytest.raises(httpx.HTTPStatusError):
+        f.fetch(URL)
+
+    f._client = httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(200, content=b"x" * 100)))
+    with pytest.raises(ValueError):
+        f.fetch(URL, max_bytes=10)
+    assert f.lookup(URL) is None
+    assert not list((tmp_path / "bodies").glob(".part-*"))
+
+
+def test_collect_removes_unreferenced_then_least_recently_used(tmp_path, origin, monkeypatch):
+    monkeypatch.setattr(fetcher_module, "FETCH_GC_MIN_AGE", 0)
+    f = _fetcher(tmp_path, origin, max_store_bytes=10 ** 9)
+    urls = [URL.replace("a.html", f"{i}.html") for i in range(3)]
+    fetched = []
+    for i, url in enumerate(urls):
+        origin.bodies[url] = bytes([65 + i]) * 100
+        fetched.append(f.fetch(url))
+        os.utime(fetched[-1].path, (1000 + i, 1000 + i))
+    orphan = f.put("https://gone.example/", 200, {}, b"z" * 100)
+    f.index.delete("https://gone.example/")
+
+    result = f.collect(target=200)
+    assert result["removed"] == 2
+    assert not orphan.path.exists()
+    assert not fetched[0].path.exists()                 # 被引用的正文中最久未使用的
+    assert fetched[1].path.exists() and fetched[2].path.exists()
+    assert f.lookup(urls[0]) is None                    # 正文被删除后重新完整下载
+    assert not f.fetch(urls[0]).from_store
+
+
+def test_store_over_limit_triggers_collection(tmp_path, origin, monkeypatch):
+    monkeypatch.setattr(fetcher_module, "FETCH_GC_MIN_AGE", 0)
+    f = _fetcher(tmp_path, origin, max_store_bytes=250)
+    for i in range(4):
+        f.put(f"{URL}?{i}", 200, {}, bytes([65 + i]) * 100)
+        time.sleep(0.01)
+    assert f.counts["gc_removed"] >= 2
+    assert sum(p.stat().st_size for p in (tmp_path / "bodies").glob("??/*")) <= 250
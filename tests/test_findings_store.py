@@ -0,0 +1,73 @@
+import pytest
+
+from backend_logic.findings_store import FindingsStore, document_key
+
+
+@pytest.fixture
+def store(tmp_path):
+    return FindingsStore(tmp_path / "findings.sqlite3", flush_interval=0.01)
+
+
+def _finding(value, zone="第一種低層住居専用地域", kind="建蔽率", **extra):
+    return dict({"regulation_type": kind, "zone": zone, "value": value, "condition": None}, **extra)
+
+
+def test_document_key():
+    assert document_key("downloaded_pdfs/abc.pdf") == "abc.pdf"
+    assert document_key("/files/abc.pdf") == "abc.pdf"
+    assert document_key("https://x.jp/a.pdf") == "https://x.jp/a.pdf"
+
+
+def test_findings_are_queryable_with_provenance(store):
+    store.record_links("例市", [
+        {"url": "https://x.jp/a.pdf", "downloaded": True, "local_path": "/files/abc.pdf", "type": "pdf", "score": 3},
+        {"url": "https://x.jp/b.html", "type": "html", "score": 1},
+    ])
+    store.record_findings("例市", "/files/abc.pdf", [_finding("60%"), _finding("200%", kind="容積率")])
+    store.record_findings("例市", "https://x.jp/b.html", [_finding("10m", kind="高さ制限", zone=None)])
+    store.record_findings("別市", "https://y.jp/c.html", [_finding("50%")])
+    store.flush()
+
+    rows = store.query(city="例市", regulation_type="建蔽率")
+    assert len(rows) == 1
+    assert rows[0]["value"] == "60%"
+    assert rows[0]["source"] == {"key": "abc.pdf", "url": "https://x.jp/a.pdf",
+                                 "local_path": "/files/abc.pdf", "type": "pdf"}
+    assert [r["zone"] for r in store.query(source="https://x.jp/b.html")] == ["general"]
+    assert sorted(store.compare("建蔽率")) == ["例市", "別市"]
+    assert [d["key"] for d in store.documents("例市")] == ["abc.pdf", "https://x.jp/b.html"]
+    assert {c["city"]: c["findings"] for c in store.cities()} == {"例市": 3, "別市": 1}
+    assert store.stats()["pending_writes"] == 0
+
+
+def test_re_extraction_replaces_previous_findings(store):
+    store.record_findings("例市", "https://x.jp/b.html", [_finding("60%"), _finding("200%", kind="容積率")])
+    store.flush()
+    store.record_findings("例市", "https://x.jp/b.html", [_finding("80%")])
+    store.flush()
+    assert [(r["regulation_type"], r["value"]) for r in store.query(city="例市")] == [("建蔽率", "80%")]
+
+    store.record_findings("例市", "https://x.jp/b.html", [])
+    store.flush()
+    assert store.query(city="例市") == []
+
+
+def test_upsert_keeps_one_row_and_latest_condition(store):
+    store.record_findings("例市", "https://x.jp/b.html", [
+        _finding("60%", condition="角地"),
+        _finding("60%", condition="角地は 70%"),
+        {"zone": "x", "value": "no type"},
+    ])
+    store.flush()
+    rows = store.query(city="例市")
+    assert len(rows) == 1
+    assert rows[0]["condition"] == "角地は 70%"
+
+
+def test_query_pagination(store):
+    store.record_findings("例市", "https://x.jp/b.html", [_finding(f"{v}%") for v in range(10, 60, 10)])
+    store.flush()
+    page1 = store.query(city="例市", limit=2)
+    page2 = store.query(city="例市", limit=2, offset=2)
+    assert len(page1) == 2 and len(page2) == 2
+    assert not {r["value"] for r in page1} & {r["value"] for r in page2}
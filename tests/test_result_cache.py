@@ -0,0 +1,115 @@
+import threading
+import time
+
+import pytest
+
+from backend_logic import result_cache
+from backend_logic.disk_cache import DiskCache
+from backend_logic.result_cache import SingleFlight
+
+
+def _wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+    events = []
+
+    def fn(progress):
+        calls.append(1)
+        progress("step", n=1)
+        release.wait(5)
+        return {"value": 42}
+
+    results = []
+
+    def call():
+        results.append(flights.do("k", fn, progress=lambda event, **data: events.append(event)))
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    _wait_until(lambda: flights.in_flight() == 1)
+    follower = threading.Thread(target=call)
+    follower.start()
+    _wait_until(lambda: flights.coalesced == 1)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert len(calls) == 1
+    assert sorted(coalesced for _, coalesced in results) == [False, True]
+    assert all(result == {"value": 42} for result, _ in results)
+    assert "coalesced" in events
+    assert flights.in_flight() == 0
+
+
+def test_single_flight_shares_errors_and_forgets_key():
+    flights = SingleFlight()
+    release = threading.Event()
+    errors = []
+
+    def fn(progress):
+        release.wait(5)
+        raise RuntimeError("boom")
+
+    def call():
+        try:
+            flights.do("k", fn)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call)]
+    threads[0].start()
+    _wait_until(lambda: flights.in_flight() == 1)
+    threads.append(threading.Thread(target=call))
+    threads[1].start()
+    _wait_until(lambda: flights.coalesced == 1)
+    release.set()
+    for t in threads:
+        t.join(5)
+
+    assert errors == ["boom", "boom"]
+    # 失败后同一 key 可以重新执行
+    assert flights.do("k", lambda progress: "ok") == ("ok", False)
+
+
+@pytest.fixture
+def runs(tmp_path, monkeypatch):
+    calls = []
+
+    def fake_run(city, progress=None, fanout=None, politeness=None):
+        calls.append(city)
+        return {"city": city, "run": len(calls)}
+
+    monkeypatch.setattr(result_cache, "run_analysis_for_city", fake_run)
+    monkeypatch.setattr(result_cache, "result_cache", DiskCache(tmp_path / "results.sqlite3", table="results"))
+    return calls
+
+
+def test_analyze_city_caches_and_force_refresh_bypasses(runs):
+    first = result_cache.analyze_city("例市")
+    assert first["cache"]["hit"] is False and first["run"] == 1
+
+    cached = result_cache.analyze_city("例市")
+    assert cached["cache"]["hit"] is True and cached["run"] == 1
+    # 全角空格等经 NFKC 规范化后是同一个键
+    assert result_cache.analyze_city("例市　")["cache"]["hit"] is True
+
+    refreshed = result_cache.analyze_city("例市", force_refresh=True)
+    assert refreshed["cache"]["hit"] is False and refreshed["run"] == 2
+    assert result_cache.analyze_city("例市")["run"] == 2
+    assert runs == ["例市", "例市"]
+
+
+def test_error_results_are_not_cached(runs, monkeypatch):
+    monkeypatch.setattr(result_cache, "run_analysis_for_city",
+                        lambda city, **kwargs: runs.append(city) or {"error": "no seeds"})
+    result_cache.analyze_city("例市")
+    result_cache.analyze_city("例市")
+    assert runs == ["例市", "例市"]